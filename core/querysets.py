@@ -0,0 +1,64 @@
+from typing import Any, Callable, Iterable
+
+from django.db.models import Model, QuerySet
+from django.db.models.query import ModelIterable
+
+
+# returns primary keys of the objects, out of the given ones, for which the flag is set
+ViewerStateLoader = Callable[[list[Any]], Iterable[Any]]
+
+
+class ViewerStateQuerySet(QuerySet):
+    """
+    Queryset setting flags of the viewer on the objects it fetches, e.g. whether they liked each video.
+    Flags are looked up only for the fetched objects, one query per flag, so a page costs the same
+    whatever the history of the viewer. This covers querysets paginated or used in Prefetch.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._viewer_state_loaders: dict[str, ViewerStateLoader] = {}
+
+    def with_viewer_state(
+        self, name: str, loader: ViewerStateLoader
+    ) -> "ViewerStateQuerySet":
+        """
+        Returns queryset setting the flag on the objects it fetches.
+
+        Parameters:
+            name (str): Name of the attribute set on each object
+            loader (ViewerStateLoader): Function returning primary keys of the flagged objects out of the given ones
+        """
+
+        clone = self._chain()
+        clone._viewer_state_loaders = {**self._viewer_state_loaders, name: loader}
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._viewer_state_loaders = self._viewer_state_loaders
+        return clone
+
+    def _fetch_all(self):
+        is_fetching = self._result_cache is None
+        super()._fetch_all()
+
+        if (
+            is_fetching
+            and self._viewer_state_loaders
+            and issubclass(self._iterable_class, ModelIterable)
+        ):
+            load_viewer_state(self._result_cache, self._viewer_state_loaders)
+
+
+def load_viewer_state(
+    objects: list[Model], loaders: dict[str, ViewerStateLoader]
+) -> None:
+    """Set flags of the viewer on the objects, see ViewerStateQuerySet."""
+
+    primary_keys = [obj.pk for obj in objects]
+
+    for name, loader in loaders.items():
+        flagged = set(loader(primary_keys)) if primary_keys else set()
+        for obj in objects:
+            setattr(obj, name, obj.pk in flagged)
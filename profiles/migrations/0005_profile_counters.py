@@ -0,0 +1,49 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_follows(Follow, field):
+    return Coalesce(
+        Subquery(
+            Follow.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def fill_profile_counters(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    Follow = apps.get_model('profiles', 'Follow')
+
+    Profile.objects.update(
+        following_count=count_follows(Follow, 'follower'),
+        follower_count=count_follows(Follow, 'followed'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_profilenotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_profile_counters, migrations.RunPython.noop),
+    ]
@@ -2,15 +2,21 @@ from django.conf import settings
 from django.db import models, transaction
 from django_cleanup import cleanup
 
+from core.querysets import ViewerStateQuerySet
 from notifications.models import Notification
 
 
 @cleanup.select
 class Profile(models.Model):
+    objects = ViewerStateQuerySet.as_manager()
+
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=50)
     description = models.CharField(max_length=250, blank=True)
     avatar = models.ImageField(upload_to="avatars", null=True, blank=True)
+    # counts of follows, kept current by signal handlers and repaired by reconcile_profile_counters
+    following_count = models.IntegerField(default=0)
+    follower_count = models.IntegerField(default=0, db_index=True)
 
 
 class Follow(models.Model):
@@ -1,23 +1,18 @@
 from django.contrib.auth.models import AbstractUser
-from django.db.models import Model, Prefetch, QuerySet
+from django.db.models import Prefetch
 from django.db.models.aggregates import Count
-from django.db.models.expressions import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.expressions import OuterRef, Subquery, Value
 from django.db.models.manager import BaseManager
 from rest_framework.request import Request
 
-from .models import Profile, ProfileNotification
+from core.querysets import ViewerStateQuerySet
+
+from .models import Follow, Profile, ProfileNotification
 
 
 def get_profile_queryset(request: Request) -> BaseManager[Profile]:
-    queryset = (
-        Profile.objects.select_related("user")
-        .annotate(
-            following_count=count_related_objects_in_subquery(Profile, "following")
-        )
-        .annotate(
-            follower_count=count_related_objects_in_subquery(Profile, "followers")
-        )
-    )
+    queryset = Profile.objects.select_related("user")
     queryset = annotate_profiles_with_following_status(queryset, request.user)
     return queryset
 
@@ -30,29 +25,43 @@ def get_profilenotification_queryset(
     )
 
 
-def count_related_objects_in_subquery(model: Model, related_name: str) -> Subquery:
-    """Generate a subquery to count related objects for each instance of the given model."""
+def get_profile_counter_subqueries() -> dict[str, Coalesce]:
+    """Generate subqueries computing the counters of each profile from its follows."""
+
+    return {
+        "following_count": count_follows_in_subquery("follower"),
+        "follower_count": count_follows_in_subquery("followed"),
+    }
+
+
+def count_follows_in_subquery(field: str) -> Coalesce:
+    """Generate a subquery to count follows whose field is each profile."""
 
-    return Subquery(
-        model.objects.filter(pk=OuterRef("pk"))
-        .annotate(count=Count(related_name, distinct=True))
-        .values("count")
+    return Coalesce(
+        Subquery(
+            Follow.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
     )
 
 
 def annotate_profiles_with_following_status(
-    queryset: QuerySet, user: AbstractUser
-) -> QuerySet:
-    """Annotate the given profile queryset with a field indicating whether the user is following each profile."""
+    queryset: ViewerStateQuerySet, user: AbstractUser
+) -> ViewerStateQuerySet:
+    """Set a field indicating whether the user is following each profile on the profiles of the given queryset."""
 
     if not user.is_authenticated:
         return queryset.annotate(is_following=Value(False))
 
-    following_ids = user.profile.following.values_list("followed_id")
+    profile_id = user.profile.id
 
-    return queryset.annotate(
-        is_following=Case(
-            When(id__in=following_ids, then=Value(True)),
-            default=Value(False),
-        )
+    return queryset.with_viewer_state(
+        "is_following",
+        lambda profile_ids: Follow.objects.filter(
+            follower_id=profile_id, followed_id__in=profile_ids
+        ).values_list("followed_id", flat=True),
     )
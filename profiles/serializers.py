@@ -47,8 +47,6 @@ class ProfileSerializer(serializers.ModelSerializer):
         ]
 
     user = UserSerializer(read_only=True)
-    following_count = serializers.IntegerField()
-    follower_count = serializers.IntegerField()
     is_following = serializers.BooleanField()
 
     def update(self, instance, validated_data):
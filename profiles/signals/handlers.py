@@ -1,9 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from profiles.serializers import CreateProfileSerializer
 
-from ..models import Follow, ProfileNotification
+from ..models import Follow, Profile, ProfileNotification
 from . import user_created
 
 
@@ -21,3 +22,27 @@ def on_post_save_follow_notify_followed_profile(sender, instance: Follow, **kwar
         profile=instance.followed,
         related_profile=instance.follower,
     )
+
+
+@receiver(post_save, sender=Follow)
+def on_post_save_follow_update_profile_counters(
+    sender, instance: Follow, created: bool, **kwargs
+):
+    if created:
+        update_profile_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def on_post_delete_follow_update_profile_counters(sender, instance: Follow, **kwargs):
+    update_profile_counters(instance, -1)
+
+
+def update_profile_counters(follow: Follow, delta: int) -> None:
+    """Atomically add delta to the counters of both profiles of the follow, so concurrent updates aren't lost."""
+
+    Profile.objects.filter(id=follow.follower_id).update(
+        following_count=F("following_count") + delta
+    )
+    Profile.objects.filter(id=follow.followed_id).update(
+        follower_count=F("follower_count") + delta
+    )
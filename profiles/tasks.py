@@ -0,0 +1,29 @@
+from celery import shared_task
+from django.db.models import F
+
+from .models import Profile
+from .querysets import get_profile_counter_subqueries
+
+
+@shared_task
+def reconcile_profile_counters() -> None:
+    """
+    Repair counters of profiles that drifted from the counts of their follows, e.g. follows
+    created in bulk. The counters are recomputed in the update itself, so increments made
+    meanwhile aren't lost.
+    """
+
+    counts = get_profile_counter_subqueries()
+
+    drifted_profile_ids = list(
+        Profile.objects.annotate(
+            **{f"actual_{counter}": count for counter, count in counts.items()}
+        )
+        .exclude(**{counter: F(f"actual_{counter}") for counter in counts})
+        .values_list("id", flat=True)
+    )
+
+    if drifted_profile_ids:
+        Profile.objects.filter(id__in=drifted_profile_ids).update(
+            **get_profile_counter_subqueries()
+        )
@@ -534,9 +534,9 @@ class TestSearch:
     def test_profiles_ordered_by_follower_count(self, search):
         profile1 = baker.make(Profile, full_name="test")
         profile2 = baker.make(Profile, full_name="test")
-        baker.make(Follow, followed=profile2, _quantity=5, _bulk_create=True)
+        baker.make(Follow, followed=profile2, _quantity=5)
         profile3 = baker.make(Profile, full_name="test")
-        baker.make(Follow, followed=profile3, _quantity=3, _bulk_create=True)
+        baker.make(Follow, followed=profile3, _quantity=3)
 
         response = search("test")
 
@@ -587,6 +587,18 @@ class TestFollow:
             Follow.objects.filter(follower=own_profile, followed=profile).count() == 1
         )
 
+    def test_updates_profile_counters(self, authenticate, user, follow):
+        authenticate(user=user)
+        own_profile = baker.make(Profile, user=user)
+        profile = baker.make(Profile)
+
+        follow(profile.user.username)
+
+        own_profile.refresh_from_db()
+        profile.refresh_from_db()
+        assert own_profile.following_count == 1
+        assert profile.follower_count == 1
+
     def test_cannot_follow_profile_multiple_times(self, authenticate, user, follow):
         authenticate(user=user)
         baker.make(Profile, user=user)
@@ -641,6 +653,20 @@ class TestUnfollow:
             Follow.objects.filter(follower=own_profile, followed=profile).count() == 0
         )
 
+    def test_updates_profile_counters(self, authenticate, user, unfollow):
+        authenticate(user=user)
+        own_profile = baker.make(Profile, user=user)
+        profile = baker.make(Profile)
+        baker.make(Follow, follower=own_profile, followed=profile)
+        baker.make(Follow, followed=profile)
+
+        unfollow(profile.user.username)
+
+        own_profile.refresh_from_db()
+        profile.refresh_from_db()
+        assert own_profile.following_count == 0
+        assert profile.follower_count == 1
+
 
 @pytest.mark.django_db
 class TestFollowing:
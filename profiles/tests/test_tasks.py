@@ -0,0 +1,22 @@
+import pytest
+from model_bakery import baker
+
+from profiles.models import Follow, Profile
+from profiles.tasks import reconcile_profile_counters
+
+
+@pytest.mark.django_db
+class TestReconcileProfileCounters:
+    def test_drifted_counters_are_repaired(self):
+        profile = baker.make(Profile)
+        baker.make(Follow, followed=profile, _quantity=2)
+        baker.make(Follow, follower=profile)
+        Profile.objects.filter(id=profile.id).update(
+            following_count=3, follower_count=0
+        )
+
+        reconcile_profile_counters.apply()
+
+        profile.refresh_from_db()
+        assert profile.following_count == 1
+        assert profile.follower_count == 2
@@ -80,7 +80,7 @@ class ProfileViewSet(RetrieveModelMixin, GenericViewSet):
                 Q(user__username__icontains=normalized_query)
                 | Q(full_name__icontains=normalized_query)
             )
-            .order_by("-follower_count")
+            .order_by("-follower_count", "id")
         )
 
         pagination = ProfileSearchPagination()
@@ -14,6 +14,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from kombu import Queue
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -123,6 +125,62 @@ MEDIA_ROOT = BASE_DIR / "media"
 TEMP_DIR = Path("temp")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# HLS segment type, "mpegts" writes a file per segment, "fmp4" writes a single fragmented MP4 file
+# per rendition whose segments are addressed by byte ranges. Chunked transcoding always writes mpegts.
+HLS_SEGMENT_TYPE = "mpegts"
+# Encode each HLS rendition in a separate ffmpeg process
+HLS_PARALLEL_ENCODING = False
+# Maximum number of concurrent ffmpeg processes when encoding in parallel
+HLS_ENCODING_PROCESSES = os.cpu_count() or 1
+# Formats of responsive images of the first frame of videos, "avif" and "webp", AVIF requires ffmpeg with libaom
+IMAGE_FORMATS = ["avif", "webp"]
+
+# Uploads at least this long are split into chunks transcoded by separate Celery tasks
+TRANSCODE_CHUNKING_THRESHOLD_SECONDS = 60
+# Approximate duration of a chunk, chunks are cut at keyframes
+TRANSCODE_CHUNK_DURATION_SECONDS = 10
+# Pipe streamable uploads from the storage into ffmpeg instead of letting it read them by path or URL
+TRANSCODE_STREAMING_INGEST = False
+# Choose renditions and their bitrates per video from a quick encode of its beginning, see plan_renditions
+TRANSCODE_PER_TITLE_LADDER = True
+# Publish uploads of a file that was uploaded before with the files transcoded from it
+TRANSCODE_DEDUPLICATION = True
+# Publish videos once their smallest rendition is encoded, encode the other renditions afterwards
+TRANSCODE_PROGRESSIVE_PUBLISH = True
+# Celery queue of transcoding tasks, consumed by dedicated workers so they don't starve light tasks
+TRANSCODE_QUEUE = "transcode"
+# Threads per ffmpeg process, derived from CPU cores and worker concurrency if None
+FFMPEG_THREADS = None
+# The process group of an ffmpeg process is killed once it runs longer than the base plus this many seconds per second of the video
+MEDIA_COMMAND_TIME_LIMIT_BASE_SECONDS = 60
+MEDIA_COMMAND_TIME_LIMIT_SECONDS_PER_SECOND = 10
+# CPU time of an ffmpeg process is limited to the base plus this many seconds per second of the video, summed over its threads
+MEDIA_COMMAND_CPU_TIME_LIMIT_SECONDS_PER_SECOND = 40
+# Address space of ffmpeg and ffprobe processes is limited to this many bytes
+MEDIA_COMMAND_MEMORY_LIMIT_BYTES = 4 * 1024 * 1024 * 1024
+# ffprobe and ffmpeg processes extracting a single frame are killed after this many seconds
+PROBE_COMMAND_TIME_LIMIT_SECONDS = 10
+
+# Buffer views in the cache and store them in batches with flush_buffered_views, instead of in the request
+VIEW_WRITE_BEHIND = True
+
+# Maximum number of files written to the storage concurrently
+STORAGE_MAX_CONCURRENCY = 16
+# Files larger than this are uploaded to S3 in multiple parts
+STORAGE_MULTIPART_THRESHOLD = 8 * 1024**2
+STORAGE_MULTIPART_CHUNKSIZE = 8 * 1024**2
+# Maximum number of parts of a single file uploaded concurrently
+STORAGE_MULTIPART_CONCURRENCY = 4
+# Size of byte ranges read from the storage when streaming a file
+STORAGE_READ_BLOCK_SIZE = 8 * 1024**2
+# Number of blocks read ahead of the consumer when streaming a file
+STORAGE_READ_AHEAD_BLOCKS = 4
+
+# Size of parts of presigned multipart uploads, S3 requires at least 5 MB except for the last part
+PRESIGNED_UPLOAD_PART_SIZE = 8 * 1024**2
+# Presigned upload URLs stop working after this many seconds
+PRESIGNED_UPLOAD_EXPIRATION_SECONDS = 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -151,11 +209,38 @@ DJOSER = {
 
 AUTH_USER_MODEL = "core.User"
 
+# The default queue runs light tasks
+CELERY_TASK_QUEUES = (
+    Queue("celery"),
+    Queue(TRANSCODE_QUEUE),
+)
+CELERY_TASK_ROUTES = {
+    "videos.tasks.transcode_upload": {"queue": TRANSCODE_QUEUE},
+    "videos.tasks.transcode_chunk": {"queue": TRANSCODE_QUEUE},
+    "videos.tasks.encode_remaining_renditions": {"queue": TRANSCODE_QUEUE},
+    # copies the whole file of the upload
+    "videos.tasks.assemble_upload_session": {"queue": TRANSCODE_QUEUE},
+}
+# Redis serves lower priorities first, see videos.scheduling.get_upload_priority
+CELERY_BROKER_TRANSPORT_OPTIONS = {"priority_steps": list(range(10))}
+
 CELERY_BEAT_SCHEDULE = {
     "update_comment_popularity_scores": {
         "task": "videos.tasks.update_comment_popularity_scores",
         "schedule": 60 * 60,
     },
+    "flush_buffered_views": {
+        "task": "videos.tasks.flush_buffered_views",
+        "schedule": 10,
+    },
+    "reconcile_video_counters": {
+        "task": "videos.tasks.reconcile_video_counters",
+        "schedule": 60 * 60,
+    },
+    "reconcile_profile_counters": {
+        "task": "profiles.tasks.reconcile_profile_counters",
+        "schedule": 60 * 60,
+    },
     "cleanup_expired_snapshots": {
         "task": "custompagination.tasks.cleanup_expired_snapshots",
         "schedule": 60,
@@ -168,6 +253,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "notifications.tasks.cleanup_seen_notifications",
         "schedule": 60 * 60,
     },
+    "cleanup_expired_upload_sessions": {
+        "task": "videos.tasks.cleanup_expired_upload_sessions",
+        "schedule": 60 * 60,
+    },
 }
 
 INTERNAL_IPS = [
@@ -34,6 +34,16 @@ DATABASES = {
 }
 
 CELERY_BROKER_URL = "redis://redis:6379/1"
+CELERY_RESULT_BACKEND = CELERY_BROKER_URL
+
+# Shared by web and worker processes, holds e.g. upload progress reported by the tasks
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CELERY_BROKER_URL,
+        "KEY_PREFIX": "cache",
+    }
+}
 
 GORSE_ENTRY_POINT = "http://gorse_server:8087"
 GORSE_API_KEY = ""
@@ -53,6 +53,17 @@ DATABASES = {
 
 CELERY_BROKER_URL = Path(os.environ["REDIS_URL_FILE"]).read_text()
 CELERY_BROKER_USE_SSL = {"ssl_cert_reqs": ssl.CERT_REQUIRED}
+CELERY_RESULT_BACKEND = CELERY_BROKER_URL
+CELERY_REDIS_BACKEND_USE_SSL = {"ssl_cert_reqs": ssl.CERT_REQUIRED}
+
+# Shared by web and worker processes, holds e.g. upload progress reported by the tasks
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CELERY_BROKER_URL,
+        "KEY_PREFIX": "cache",
+    }
+}
 
 GORSE_ENTRY_POINT = "http://gorse_server:8087"
 GORSE_API_KEY = Path(os.environ["GORSE_API_KEY_FILE"]).read_text()
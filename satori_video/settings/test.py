@@ -27,6 +27,16 @@ DATABASES = {
 }
 
 CELERY_BROKER_URL = "redis://localhost:16379/1"
+CELERY_RESULT_BACKEND = CELERY_BROKER_URL
+
+# S3-compatible storage used by tests of presigned uploads
+TEST_S3_STORAGE_OPTIONS = {
+    "access_key": "minioadmin",
+    "secret_key": "minioadmin",
+    "bucket_name": "test",
+    "endpoint_url": "http://localhost:19000",
+    "region_name": "us-east-1",
+}
 
 GORSE_ENTRY_POINT = "http://localhost:18087"
 GORSE_API_KEY = ""
@@ -5,7 +5,51 @@ SECONDS_IN_HOUR = 3600
 SECONDS_IN_DAY = SECONDS_IN_HOUR * 24
 
 ALLOWED_VIDEO_EXTENSIONS = ("MP4", "MOV", "MPEG", "3GP", "AVI")
+MAX_VIDEO_SIZE_MB = 50
+MAX_VIDEO_DURATION_SECONDS = 90
 VIEW_COUNT_COOLDOWN_SECONDS = 1 * SECONDS_IN_HOUR
+# views buffered in the cache, see VIEW_WRITE_BEHIND setting
+VIEW_BUFFER_BATCH_SIZE = 1000
+VIEW_BUFFER_EXPIRATION_SECONDS = SECONDS_IN_DAY
+VIEW_BUFFER_LOCK_EXPIRATION_SECONDS = 5 * 60
+# batches stored by a flush, so it finishes well before its lock expires
+VIEW_BUFFER_MAX_BATCHES_PER_FLUSH = 20
+
+HLS_PLAYLIST_FILENAME = "HLSPlaylist.m3u8"
+HLS_SEGMENT_DURATION_SECONDS = 10
+# segment types of ffmpeg's HLS muxer, see HLS_SEGMENT_TYPE setting
+HLS_SEGMENT_TYPE_MPEGTS = "mpegts"
+HLS_SEGMENT_TYPE_FMP4 = "fmp4"
+THUMBNAIL_FILENAME = "thumbnail.jpg"
+THUMBNAIL_WIDTH = 405  # 405px x 720px (9:16 ratio)
+FIRST_FRAME_FILENAME = "frame0.jpg"
+# responsive images of the first frame, in each of IMAGE_FORMATS setting
+IMAGE_WIDTHS = (180, 360, 720, 1080)
+IMAGE_FORMAT_AVIF = "avif"
+IMAGE_FORMAT_WEBP = "webp"
+IMAGE_AVIF_CRF = 32
+IMAGE_WEBP_QUALITY = 75
+# scrubbing preview: a frame every SPRITE_INTERVAL_SECONDS, tiled into sprite sheets indexed by a WebVTT file
+SPRITES_FILENAME = "sprites.vtt"
+SPRITE_INTERVAL_SECONDS = 2
+SPRITE_WIDTH = 108  # 108px x 192px (9:16 ratio)
+SPRITE_HEIGHT = 192
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 5
+
+# per-title ladder: the beginning of the video is encoded at constant quality in low resolution
+LADDER_ANALYSIS_DURATION_SECONDS = 10
+LADDER_ANALYSIS_HEIGHT = 360
+LADDER_ANALYSIS_CRF = 23
+# bitrate needed for the same quality grows slower than the number of pixels
+LADDER_BITRATE_SCALING_EXPONENT = 0.75
+# renditions for which the source has fewer bits per pixel are above its effective resolution
+LADDER_MIN_BITS_PER_PIXEL = 0.01
+
+UPLOAD_CHUNK_MAX_SIZE_BYTES = 5 * 1024**2
+UPLOAD_SESSION_EXPIRATION_TIME_HOURS = 24
+UPLOAD_PROGRESS_EXPIRATION_SECONDS = SECONDS_IN_DAY
+UPLOAD_PROGRESS_REPORT_INTERVAL_SECONDS = 1
 
 
 class CommentPopularityWeight(IntEnum):
@@ -0,0 +1,133 @@
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Generator
+
+
+# reads length bytes at offset, returning fewer bytes at the end of the file
+ReadRange = Callable[[int, int], bytes]
+
+
+@dataclass
+class Box:
+    """Box (atom) of ISO base media file format, used by MP4, MOV and 3GP."""
+
+    type: bytes
+    # offset of the box contents, after its header
+    start: int
+    # offset right after the box, None if the box extends to the end of the file
+    end: int | None
+
+
+def iter_boxes(
+    read: ReadRange, start: int = 0, end: int | None = None
+) -> Generator[Box, None, None]:
+    """
+    Iterate over the boxes between start and end offsets, reading only their headers.
+    Stops at the first malformed header.
+
+    Parameters:
+        read (ReadRange): Function reading a range of bytes of the file
+        start (int): Offset of the first box
+        end (int | None): Offset after the last box, the end of the file if not specified
+    """
+
+    offset = start
+
+    while end is None or offset + 8 <= end:
+        header = read(offset, 16)
+        if len(header) < 8:
+            return
+
+        size, type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+
+        if size == 1:
+            # 64-bit size follows the type
+            if len(header) < 16:
+                return
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            # the box extends to the end of the file
+            yield Box(type=type, start=offset + header_size, end=end)
+            return
+
+        if size < header_size:
+            return
+
+        yield Box(type=type, start=offset + header_size, end=offset + size)
+        offset += size
+
+
+def is_iso_media_file(read: ReadRange) -> bool:
+    """Check whether the file is an ISO base media file, i.e. starts with a ftyp box."""
+
+    return read(4, 4) == b"ftyp"
+
+
+def is_moov_before_mdat(read: ReadRange) -> bool:
+    """Check whether the movie header of ISO base media file precedes its media data."""
+
+    for box in iter_boxes(read):
+        if box.type == b"moov":
+            return True
+        if box.type == b"mdat":
+            return False
+
+    return False
+
+
+def get_iso_media_duration(read: ReadRange) -> float | None:
+    """
+    Get duration of ISO base media file in seconds from the mvhd box of its movie header,
+    wherever the movie header is in the file. Only box headers and the mvhd box are read.
+    Returns None if the file is not an ISO base media file or the duration isn't in the header,
+    e.g. in fragmented MP4 files.
+    """
+
+    if not is_iso_media_file(read):
+        return None
+
+    for box in iter_boxes(read):
+        if box.type != b"moov":
+            continue
+
+        for child in iter_boxes(read, box.start, box.end):
+            if child.type == b"mvhd":
+                return parse_mvhd_duration(read(child.start, 32))
+
+        return None
+
+    return None
+
+
+def parse_mvhd_duration(data: bytes) -> float | None:
+    """Parse duration in seconds from the contents of mvhd box."""
+
+    if not data:
+        return None
+
+    version = data[0]
+
+    # version and flags are followed by creation and modification times
+    if version == 0 and len(data) >= 20:
+        timescale, duration = struct.unpack(">II", data[12:20])
+    elif version == 1 and len(data) >= 32:
+        timescale, duration = struct.unpack(">IQ", data[20:32])
+    else:
+        return None
+
+    if timescale == 0 or duration in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        return None
+
+    return duration / timescale
+
+
+def get_file_reader(file: BinaryIO) -> ReadRange:
+    """Get function reading ranges of bytes of seekable file."""
+
+    def read(offset: int, length: int) -> bytes:
+        file.seek(offset)
+        return file.read(length)
+
+    return read
@@ -0,0 +1,99 @@
+import shutil
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import ffmpeg
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from videos.video_processing import (
+    encode_video,
+    get_vertical_renditions,
+    has_audio_stream_in_probe,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare wall-clock time of serial and parallel HLS encoding on synthetic videos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--width", type=int, default=1920)
+        parser.add_argument("--height", type=int, default=1080)
+        parser.add_argument("--duration", type=int, default=90)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--processes", type=int, default=settings.HLS_ENCODING_PROCESSES
+        )
+
+    def handle(self, *args, **options):
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            input = temp_dir / "input.mp4"
+
+            self.stdout.write(
+                f"Generating {options['width']}x{options['height']} "
+                f"{options['duration']}s test video"
+            )
+            generate_test_video(
+                input, options["width"], options["height"], options["duration"]
+            )
+
+            probe = ffmpeg.probe(str(input))
+            renditions = get_vertical_renditions(probe)
+            self.stdout.write(
+                "Renditions: " + ", ".join(f"{r.width}x{r.height}" for r in renditions)
+            )
+
+            results = {}
+
+            for parallel in (False, True):
+                timings = []
+
+                for _ in range(options["repeat"]):
+                    output_dir = temp_dir / "output"
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+                    start = perf_counter()
+                    encode_video(
+                        input,
+                        output_dir,
+                        renditions,
+                        has_audio=has_audio_stream_in_probe(probe),
+                        crop=True,
+                        thumbnail=True,
+                        first_frame=True,
+                        parallel=parallel,
+                        max_processes=options["processes"],
+                    )
+                    timings.append(perf_counter() - start)
+
+                mode = "parallel" if parallel else "serial"
+                results[mode] = min(timings)
+                self.stdout.write(
+                    f"{mode:>8}: best {min(timings):.2f}s, "
+                    f"mean {sum(timings) / len(timings):.2f}s"
+                )
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Speedup: {results['serial'] / results['parallel']:.2f}x"
+                )
+            )
+
+
+def generate_test_video(output: Path, width: int, height: int, duration: int) -> None:
+    """Generate test pattern video with a sine wave audio track."""
+
+    video = ffmpeg.input(f"testsrc2=size={width}x{height}:rate=30", f="lavfi")
+    audio = ffmpeg.input("sine=frequency=440", f="lavfi")
+
+    ffmpeg.output(
+        video,
+        audio,
+        str(output),
+        t=duration,
+        pix_fmt="yuv420p",
+        vcodec="libx264",
+        preset="ultrafast",
+    ).run(quiet=True)
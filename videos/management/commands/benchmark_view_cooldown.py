@@ -0,0 +1,150 @@
+import random
+from datetime import timedelta
+from statistics import mean, quantiles
+from time import perf_counter
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from videos.constants import VIEW_COUNT_COOLDOWN_SECONDS
+from videos.models import Video, View
+from videos.view_buffer import get_view_cooldown_key, start_view_cooldown
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare latency of the cache view cooldown with the View range query it replaced, "
+        "and measure how often the cooldown is wrong. Test data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--videos", type=int, default=100)
+        parser.add_argument("--viewers", type=int, default=1000)
+        parser.add_argument("--views", type=int, default=10000)
+        parser.add_argument("--checks", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        viewers = [uuid4().hex for _ in range(options["viewers"])]
+
+        with transaction.atomic():
+            video_ids = create_test_videos(options["videos"])
+            viewed = {
+                (random.choice(video_ids), random.choice(viewers))
+                for _ in range(options["views"])
+            }
+            View.objects.bulk_create(
+                View(video_id=video_id, session_id=session_id)
+                for video_id, session_id in viewed
+            )
+            for video_id, session_id in viewed:
+                start_view_cooldown(video_id, None, session_id)
+
+            self.stdout.write(
+                f"{len(viewed)} views of {len(video_ids)} videos by {len(viewers)} viewers"
+            )
+
+            # half of the checks are of viewers who viewed the video, each pair is checked once
+            # as the check itself starts the cooldown
+            checks = set(
+                random.sample(sorted(viewed), min(options["checks"] // 2, len(viewed)))
+            )
+            unviewed_left = len(video_ids) * len(viewers) - len(viewed)
+            while len(checks) < options["checks"] and unviewed_left > 0:
+                pair = (random.choice(video_ids), random.choice(viewers))
+                if pair not in viewed and pair not in checks:
+                    checks.add(pair)
+                    unviewed_left -= 1
+            checks = list(checks)
+            random.shuffle(checks)
+
+            try:
+                query_timings = [
+                    measure(has_viewed_video_in_database, video_id, session_id)[1]
+                    for video_id, session_id in checks
+                ]
+
+                cache_timings = []
+                false_positives = false_negatives = 0
+                for video_id, session_id in checks:
+                    is_counted, timing = measure(
+                        start_view_cooldown, video_id, None, session_id
+                    )
+                    cache_timings.append(timing)
+
+                    if (video_id, session_id) in viewed:
+                        false_negatives += is_counted
+                    else:
+                        false_positives += not is_counted
+            finally:
+                cache.delete_many(
+                    [
+                        get_view_cooldown_key(video_id, session_id)
+                        for video_id, session_id in viewed.union(checks)
+                    ]
+                )
+                transaction.set_rollback(True)
+
+        self.report("query", query_timings)
+        self.report("cache", cache_timings)
+
+        # false negatives let a view count twice, they happen when the cache evicts cooldowns
+        unviewed_count = len(checks) - sum(pair in viewed for pair in checks)
+        self.stdout.write(
+            f"False positives: {false_positives}/{unviewed_count} unviewed, "
+            f"false negatives: {false_negatives}/{len(checks) - unviewed_count} viewed"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Speedup: {mean(query_timings) / mean(cache_timings):.2f}x"
+            )
+        )
+
+    def report(self, name: str, timings: list[float]) -> None:
+        percentiles = quantiles(timings, n=100)
+        self.stdout.write(
+            f"{name:>5}: mean {mean(timings) * 1000:.3f}ms, "
+            f"p50 {percentiles[49] * 1000:.3f}ms, p99 {percentiles[98] * 1000:.3f}ms"
+        )
+
+
+def create_test_videos(count: int) -> list[int]:
+    """Create videos of a new profile, returns their ids."""
+
+    user = get_user_model().objects.create_user(
+        username=f"benchmark_{uuid4().hex[:8]}",
+        email=f"{uuid4().hex}@example.com",
+        password=None,
+    )
+    profile = apps.get_model(settings.PROFILE_MODEL).objects.create(user=user)
+    videos = Video.objects.bulk_create(
+        Video(profile=profile, title=f"Benchmark {i}") for i in range(count)
+    )
+    return [video.id for video in videos]
+
+
+def has_viewed_video_in_database(video_id: int, session_id: str) -> bool:
+    """The range query that checked the view cooldown before it was kept in the cache."""
+
+    now = timezone.now()
+    return View.objects.filter(
+        video_id=video_id,
+        session_id=session_id,
+        creation_date__range=(
+            now - timedelta(seconds=VIEW_COUNT_COOLDOWN_SECONDS),
+            now,
+        ),
+    ).exists()
+
+
+def measure(function, *args) -> tuple:
+    """Returns result of calling the function and the seconds it took."""
+
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from videos.supervisor import get_kill_counts
+
+
+class Command(BaseCommand):
+    help = "Show how many ffmpeg and ffprobe processes were killed for exceeding their resource limits."
+
+    def handle(self, *args, **options):
+        for reason, count in get_kill_counts().items():
+            self.stdout.write(f"{reason:>8}: {count} killed")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from videos.scheduling import get_queue_stats
+
+
+class Command(BaseCommand):
+    help = "Show depth of Celery queues and how long their oldest tasks have waited."
+
+    def handle(self, *args, **options):
+        for queue in settings.CELERY_TASK_QUEUES:
+            stats = get_queue_stats(queue.name)
+
+            wait = "-" if stats.oldest_wait is None else f"{stats.oldest_wait:.1f}s"
+            self.stdout.write(
+                f"{stats.name:>12}: {stats.depth} waiting, oldest waited {wait}"
+            )
@@ -0,0 +1,90 @@
+import ffmpeg
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.models import Upload
+from videos.tasks import get_upload_file_location
+from videos.video_processing import (
+    Rendition,
+    get_duration,
+    get_vertical_renditions,
+    plan_vertical_renditions,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare the default HLS ladder with the per-title one and estimate bytes saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help="Paths or URLs of videos")
+        parser.add_argument(
+            "--uploads",
+            type=int,
+            default=0,
+            help="Number of the most recent probed uploads to include",
+        )
+
+    def handle(self, *args, **options):
+        inputs = [(file, ffmpeg.probe(file)) for file in options["files"]]
+
+        uploads = (
+            Upload.objects.exclude(probe=None)
+            .exclude(file="")
+            .order_by("-id")[: options["uploads"]]
+        )
+        for upload in uploads:
+            inputs.append((get_upload_file_location(upload), upload.probe))
+
+        if not inputs:
+            raise CommandError("Specify video files or the number of uploads.")
+
+        total_default_bytes = 0
+        total_planned_bytes = 0
+
+        for input, probe in inputs:
+            duration = get_duration(probe)
+            default = get_vertical_renditions(probe)
+            planned = plan_vertical_renditions(input, probe)
+
+            default_bytes = get_estimated_bytes(default, duration)
+            planned_bytes = get_estimated_bytes(planned, duration)
+            total_default_bytes += default_bytes
+            total_planned_bytes += planned_bytes
+
+            self.stdout.write(f"{input} ({duration:.1f}s)")
+            self.stdout.write(f"   default: {format_renditions(default)}")
+            self.stdout.write(f"  per-title: {format_renditions(planned)}")
+            self.stdout.write(
+                f"  {format_bytes(default_bytes)} -> {format_bytes(planned_bytes)}, "
+                f"saved {format_savings(default_bytes, planned_bytes)}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Total: {format_bytes(total_default_bytes)} -> "
+                f"{format_bytes(total_planned_bytes)}, "
+                f"saved {format_savings(total_default_bytes, total_planned_bytes)}"
+            )
+        )
+
+
+def get_estimated_bytes(renditions: list[Rendition], duration: float) -> int:
+    """Estimate size of all renditions of the video from their bandwidth."""
+
+    return int(sum(rendition.bandwidth for rendition in renditions) * duration / 8)
+
+
+def format_renditions(renditions: list[Rendition]) -> str:
+    return ", ".join(
+        f"{rendition.height}p@{rendition.video_bitrate // 1000}k"
+        for rendition in renditions
+    )
+
+
+def format_bytes(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+def format_savings(default_bytes: int, planned_bytes: int) -> str:
+    saved = default_bytes - planned_bytes
+    percent = saved / default_bytes * 100 if default_bytes else 0
+    return f"{format_bytes(saved)} ({percent:.1f}%)"
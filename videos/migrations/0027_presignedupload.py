@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_profilenotification'),
+        ('videos', '0026_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresignedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('filename', models.CharField(max_length=100)),
+                ('size', models.PositiveBigIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('multipart_upload_id', models.CharField(max_length=1024)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.profile')),
+                ('upload', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='videos.upload')),
+            ],
+        ),
+    ]
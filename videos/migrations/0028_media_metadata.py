@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0027_presignedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='probe',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='duration',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='height',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='width',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:17
+
+from django.db import migrations, models
+
+
+def fill_upload_stages(apps, schema_editor):
+    Upload = apps.get_model('videos', 'Upload')
+
+    Upload.objects.filter(is_done=True).update(stage='published')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0028_media_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='processed',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='stage',
+            field=models.CharField(choices=[('pending', 'Pending'), ('probed', 'Probed'), ('transcoded', 'Transcoded'), ('published', 'Published')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(fill_upload_stages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0029_upload_stage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('dir', models.CharField(max_length=255, unique=True)),
+                ('processed', models.JSONField()),
+                ('reference_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0030_processed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='images',
+            field=models.JSONField(default=list),
+        ),
+    ]
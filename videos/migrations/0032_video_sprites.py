@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0031_video_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='sprites',
+            field=models.FileField(blank=True, default='', upload_to=''),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:11
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_video_objects(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(video=OuterRef('pk'))
+            .order_by()
+            .values('video')
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def fill_video_counters(apps, schema_editor):
+    Video = apps.get_model('videos', 'Video')
+
+    Video.objects.update(
+        view_count=count_video_objects(apps.get_model('videos', 'View')),
+        like_count=count_video_objects(apps.get_model('videos', 'Like')),
+        comment_count=count_video_objects(apps.get_model('videos', 'Comment')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0032_video_sprites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='like_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='view_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(fill_video_counters, migrations.RunPython.noop),
+    ]
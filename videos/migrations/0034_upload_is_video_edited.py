@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0033_video_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='is_video_edited',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-17 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0034_upload_is_video_edited'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='upload',
+            name='stage',
+            field=models.CharField(choices=[('pending', 'Pending'), ('probed', 'Probed'), ('chunked', 'Chunked'), ('transcoded', 'Transcoded'), ('published', 'Published')], default='pending', max_length=20),
+        ),
+    ]
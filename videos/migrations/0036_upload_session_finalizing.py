@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0035_upload_stage_chunked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='errors',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='is_finalizing',
+            field=models.BooleanField(default=False),
+        ),
+    ]
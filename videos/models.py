@@ -1,7 +1,9 @@
 from django.conf import settings
 from django.db import models, transaction
+from django.utils import timezone
 from django_cleanup import cleanup
 
+from core.querysets import ViewerStateQuerySet
 from notifications.models import Notification
 
 from .validators import (
@@ -12,6 +14,8 @@ from .validators import (
 
 
 class Video(models.Model):
+    objects = ViewerStateQuerySet.as_manager()
+
     profile = models.ForeignKey(
         settings.PROFILE_MODEL, on_delete=models.CASCADE, related_name="videos"
     )
@@ -21,6 +25,17 @@ class Video(models.Model):
     source = models.FileField()
     thumbnail = models.FileField()
     first_frame = models.FileField()
+    # responsive images of the first frame, see videos.video_processing.get_stored_images
+    images = models.JSONField(default=list)
+    # WebVTT index of the scrubbing preview sprite sheets, empty for videos without them
+    sprites = models.FileField(blank=True, default="")
+    duration = models.FloatField(null=True)
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+    # counts of related objects, kept current by signal handlers and repaired by reconcile_video_counters
+    view_count = models.IntegerField(default=0, db_index=True)
+    like_count = models.IntegerField(default=0, db_index=True)
+    comment_count = models.IntegerField(default=0)
 
     @transaction.atomic()
     def save(self, *args, **kwargs):
@@ -33,6 +48,14 @@ class Video(models.Model):
 
 @cleanup.select
 class Upload(models.Model):
+    class Stage(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROBED = "probed", "Probed"
+        # split into chunks transcoded by tasks of a chord, see start_chunked_transcoding
+        CHUNKED = "chunked", "Chunked"
+        TRANSCODED = "transcoded", "Transcoded"
+        PUBLISHED = "published", "Published"
+
     profile = models.ForeignKey(
         settings.PROFILE_MODEL, on_delete=models.CASCADE, related_name="uploads"
     )
@@ -50,12 +73,79 @@ class Upload(models.Model):
         Video, on_delete=models.CASCADE, null=True, related_name="+"
     )
     is_done = models.BooleanField(default=False)
+    # result of ffprobe on the file, captured once and reused by every processing stage
+    probe = models.JSONField(null=True)
+    # last completed processing stage, a retried handle_upload resumes after it
+    stage = models.CharField(
+        max_length=20, choices=Stage.choices, default=Stage.PENDING
+    )
+    # files and media metadata produced by transcoding, see ProcessedVideo
+    processed = models.JSONField(null=True)
+    # SHA-256 of the file, uploads of the same file reuse its ProcessedMedia
+    content_hash = models.CharField(max_length=64, null=True)
+    # the video was edited while encode_remaining_renditions still needed the file, which deletes the upload once done
+    is_video_edited = models.BooleanField(default=False)
 
     @transaction.atomic()
     def save(self, *args, **kwargs):
         return super().save(*args, **kwargs)
 
 
+class ProcessedMedia(models.Model):
+    """
+    Files transcoded from an uploaded file, shared by the videos of all uploads of that file.
+    The directory holding the files is removed once no video references it.
+    """
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    dir = models.CharField(max_length=255, unique=True)
+    # files and media metadata produced by transcoding, see ProcessedVideo
+    processed = models.JSONField()
+    # number of videos whose files are in dir
+    reference_count = models.PositiveIntegerField(default=0)
+
+
+class UploadSession(models.Model):
+    """
+    Resumable upload of a video file sent in consecutive chunks.
+    Finalizing the session validates the file and creates an Upload.
+    """
+
+    profile = models.ForeignKey(
+        settings.PROFILE_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    creation_date = models.DateTimeField(auto_now_add=True)
+    filename = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    upload = models.OneToOneField(
+        Upload, on_delete=models.CASCADE, null=True, related_name="+"
+    )
+    # finalizing was requested, assemble_upload_session then sets the upload or the errors
+    is_finalizing = models.BooleanField(default=False)
+    # validation errors of the assembled file, by field
+    errors = models.JSONField(null=True)
+
+
+class PresignedUpload(models.Model):
+    """
+    Multipart upload of a video file sent by the client straight to S3 storage
+    using presigned URLs. Finalizing it validates the file and creates an Upload.
+    """
+
+    profile = models.ForeignKey(
+        settings.PROFILE_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    creation_date = models.DateTimeField(auto_now_add=True)
+    filename = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    name = models.CharField(max_length=100)
+    multipart_upload_id = models.CharField(max_length=1024)
+    upload = models.OneToOneField(
+        Upload, on_delete=models.CASCADE, null=True, related_name="+"
+    )
+
+
 class View(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="views")
     profile = models.ForeignKey(
@@ -65,6 +155,20 @@ class View(models.Model):
         related_name="views",
     )
     session_id = models.UUIDField()
+    # time of the view, buffered views are stored later by flush_buffered_views
+    creation_date = models.DateTimeField(default=timezone.now)
+
+
+class StoredViewBatch(models.Model):
+    """
+    Batch of buffered views stored by flush_buffered_views. It is recorded along with the views,
+    so a batch stored by a flush that failed to remove it from the buffer isn't stored again.
+    """
+
+    # id of the first view of the batch, see BufferedView
+    key = models.UUIDField(unique=True)
+    # position of the buffer the batch ends at
+    end = models.PositiveBigIntegerField()
     creation_date = models.DateTimeField(auto_now_add=True)
 
 
@@ -78,7 +182,8 @@ class HistoryEntry(models.Model):
     profile = models.ForeignKey(
         settings.PROFILE_MODEL, on_delete=models.CASCADE, related_name="history"
     )
-    creation_date = models.DateTimeField(auto_now_add=True)
+    # time of the view, buffered views are stored later by flush_buffered_views
+    creation_date = models.DateTimeField(default=timezone.now)
 
 
 class Like(models.Model):
@@ -112,6 +217,8 @@ class Report(models.Model):
 
 
 class Comment(models.Model):
+    objects = ViewerStateQuerySet.as_manager()
+
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="comments")
     profile = models.ForeignKey(
         settings.PROFILE_MODEL, on_delete=models.CASCADE, related_name="comments"
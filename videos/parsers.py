@@ -0,0 +1,73 @@
+import hashlib
+
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .constants import UPLOAD_CHUNK_MAX_SIZE_BYTES
+
+
+class UploadChunkParser(BaseParser):
+    """Parses raw request body containing a chunk of an upload session."""
+
+    media_type = "application/octet-stream"
+
+    def parse(self, stream, media_type=None, parser_context=None) -> bytes:
+        if stream is None:
+            return b""
+
+        data = stream.read(UPLOAD_CHUNK_MAX_SIZE_BYTES + 1)
+        if len(data) > UPLOAD_CHUNK_MAX_SIZE_BYTES:
+            raise ParseError(
+                f"Chunk cannot be larger than {UPLOAD_CHUNK_MAX_SIZE_BYTES} bytes"
+            )
+
+        return data
+
+
+class HashingUploadHandlerMixin:
+    """
+    Upload handler setting SHA-256 of each uploaded file as its content_hash, updated with
+    every chunk as it streams in, so the file isn't read again to hash it.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        # chunks passed on to the next handler are hashed by it
+        if data is None:
+            self.content_hash.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.content_hash.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    pass
+
+
+def get_hashing_upload_handlers(request) -> list:
+    """Returns the default upload handlers, see FILE_UPLOAD_HANDLERS, setting content_hash of the files."""
+
+    return [
+        HashingMemoryFileUploadHandler(request),
+        HashingTemporaryFileUploadHandler(request),
+    ]
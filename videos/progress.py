@@ -0,0 +1,125 @@
+import logging
+from time import monotonic
+from typing import Callable
+
+from django.core.cache import cache
+
+from .constants import (
+    UPLOAD_PROGRESS_EXPIRATION_SECONDS,
+    UPLOAD_PROGRESS_REPORT_INTERVAL_SECONDS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# stage of the upload while it is being transcoded, the other stages are those of Upload.Stage
+TRANSCODING_STAGE = "transcoding"
+
+
+def get_upload_progress_key(upload_id: int) -> str:
+    return f"upload_progress:{upload_id}"
+
+
+def get_upload_chunks_transcoded_key(upload_id: int) -> str:
+    return f"upload_chunks_transcoded:{upload_id}"
+
+
+def get_upload_progress(upload_id: int) -> dict | None:
+    """Returns the last reported progress of the upload, None if there is none."""
+
+    return cache.get(get_upload_progress_key(upload_id))
+
+
+def set_upload_progress(
+    upload_id: int,
+    user_id: int,
+    stage: str,
+    percent: float,
+    video_id: int | None = None,
+) -> None:
+    """
+    Report progress of processing the upload, read by the upload status endpoint.
+    Progress is best effort, so failing to write it is only logged.
+
+    Parameters:
+        upload_id (int): Id of the upload
+        user_id (int): Id of the user owning the upload, the only one allowed to read its progress
+        stage (str): Stage of the upload, TRANSCODING_STAGE or one of Upload.Stage
+        percent (float): Percentage of the stage completed
+        video_id (int | None): Id of the video, once published
+    """
+
+    progress = {
+        "user_id": user_id,
+        "stage": stage,
+        "percent": round(min(max(percent, 0), 100), 1),
+        "video": video_id,
+    }
+
+    try:
+        cache.set(
+            get_upload_progress_key(upload_id),
+            progress,
+            UPLOAD_PROGRESS_EXPIRATION_SECONDS,
+        )
+    except Exception:
+        logger.warning("Could not report progress of upload %s", upload_id)
+
+
+def get_progress_reporter(
+    upload_id: int, user_id: int, duration: float
+) -> Callable[[float], None]:
+    """
+    Returns function reporting the transcoding progress of the upload from the number of seconds
+    of the video encoded so far. Progress is written at most every UPLOAD_PROGRESS_REPORT_INTERVAL_SECONDS.
+
+    Parameters:
+        upload_id (int): Id of the upload
+        user_id (int): Id of the user owning the upload
+        duration (float): Duration of the video in seconds
+    """
+
+    last_report = None
+
+    def report(seconds: float) -> None:
+        nonlocal last_report
+
+        now = monotonic()
+        if (
+            last_report is not None
+            and now - last_report < UPLOAD_PROGRESS_REPORT_INTERVAL_SECONDS
+        ):
+            return
+
+        last_report = now
+        percent = seconds / duration * 100 if duration > 0 else 0
+        set_upload_progress(upload_id, user_id, TRANSCODING_STAGE, percent)
+
+    return report
+
+
+def report_chunk_transcoded(upload_id: int, chunk_count: int) -> None:
+    """
+    Report progress of the upload transcoded in chunks from the number of its transcoded chunks.
+    Nothing is reported if the upload has no progress yet, as the owner of the upload is not known.
+    """
+
+    key = get_upload_chunks_transcoded_key(upload_id)
+
+    try:
+        progress = get_upload_progress(upload_id)
+        if progress is None:
+            return
+
+        cache.add(key, 0, UPLOAD_PROGRESS_EXPIRATION_SECONDS)
+        transcoded = cache.incr(key)
+    except Exception:
+        logger.warning("Could not report progress of upload %s", upload_id)
+        return
+
+    set_upload_progress(
+        upload_id,
+        progress["user_id"],
+        TRANSCODING_STAGE,
+        transcoded / chunk_count * 100,
+    )
@@ -1,20 +1,14 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db.models import (
-    Case,
-    Model,
-    OuterRef,
-    Prefetch,
-    QuerySet,
-    Subquery,
-    Value,
-    When,
-)
+from django.db.models import Model, OuterRef, Prefetch, Subquery, Value
 from django.db.models.aggregates import Count
+from django.db.models.functions import Coalesce
 from django.db.models.manager import BaseManager
 from django.utils.module_loading import import_string
 from rest_framework.request import Request
 
+from core.querysets import ViewerStateQuerySet
+
 from .models import (
     Comment,
     CommentLike,
@@ -23,6 +17,7 @@ from .models import (
     SavedVideo,
     Video,
     VideoNotification,
+    View,
 )
 
 
@@ -30,13 +25,8 @@ PROFILE_QUERYSET_FACTORY = import_string(settings.PROFILE_QUERYSET_FACTORY)
 
 
 def get_video_queryset(request: Request) -> BaseManager[Video]:
-    queryset = (
-        Video.objects.prefetch_related(
-            Prefetch("profile", PROFILE_QUERYSET_FACTORY(request))
-        )
-        .annotate(view_count=count_related_objects_in_subquery(Video, "views"))
-        .annotate(like_count=count_related_objects_in_subquery(Video, "likes"))
-        .annotate(comment_count=count_related_objects_in_subquery(Video, "comments"))
+    queryset = Video.objects.prefetch_related(
+        Prefetch("profile", PROFILE_QUERYSET_FACTORY(request))
     )
     queryset = annotate_videos_with_like_status(queryset, request.user)
     queryset = annotate_videos_with_saved_status(queryset, request.user)
@@ -81,59 +71,80 @@ def count_related_objects_in_subquery(model: Model, related_name: str) -> Subque
     )
 
 
+def get_video_counter_subqueries() -> dict[str, Coalesce]:
+    """Generate subqueries computing the counters of each video from its related objects."""
+
+    return {
+        "view_count": count_video_objects_in_subquery(View),
+        "like_count": count_video_objects_in_subquery(Like),
+        "comment_count": count_video_objects_in_subquery(Comment),
+    }
+
+
+def count_video_objects_in_subquery(model: Model) -> Coalesce:
+    """Generate a subquery to count objects of the given model related to each video."""
+
+    return Coalesce(
+        Subquery(
+            model.objects.filter(video=OuterRef("pk"))
+            .order_by()
+            .values("video")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
 def annotate_videos_with_like_status(
-    queryset: QuerySet, user: AbstractUser
-) -> QuerySet:
-    """Annotate the given video queryset with a field indicating whether the user has liked each video."""
+    queryset: ViewerStateQuerySet, user: AbstractUser
+) -> ViewerStateQuerySet:
+    """Set a field indicating whether the user has liked each video on the videos of the given queryset."""
 
     if not user.is_authenticated:
         return queryset.annotate(is_liked=Value(False))
 
-    liked_video_ids = Like.objects.filter(profile=user.profile).values_list("video_id")
+    profile_id = user.profile.id
 
-    return queryset.annotate(
-        is_liked=Case(
-            When(id__in=liked_video_ids, then=Value(True)),
-            default=Value(False),
-        )
+    return queryset.with_viewer_state(
+        "is_liked",
+        lambda video_ids: Like.objects.filter(
+            profile_id=profile_id, video_id__in=video_ids
+        ).values_list("video_id", flat=True),
     )
 
 
 def annotate_videos_with_saved_status(
-    queryset: QuerySet, user: AbstractUser
-) -> QuerySet:
-    """Annotate the given video queryset with a field indicating whether the user has saved each video."""
+    queryset: ViewerStateQuerySet, user: AbstractUser
+) -> ViewerStateQuerySet:
+    """Set a field indicating whether the user has saved each video on the videos of the given queryset."""
 
     if not user.is_authenticated:
         return queryset.annotate(is_saved=Value(False))
 
-    saved_video_ids = SavedVideo.objects.filter(profile=user.profile).values_list(
-        "video_id"
-    )
+    profile_id = user.profile.id
 
-    return queryset.annotate(
-        is_saved=Case(
-            When(id__in=saved_video_ids, then=Value(True)),
-            default=Value(False),
-        )
+    return queryset.with_viewer_state(
+        "is_saved",
+        lambda video_ids: SavedVideo.objects.filter(
+            profile_id=profile_id, video_id__in=video_ids
+        ).values_list("video_id", flat=True),
     )
 
 
 def annotate_comments_with_like_status(
-    queryset: QuerySet, user: AbstractUser
-) -> QuerySet:
-    """Annotate the given comment queryset with a field indicating whether the user has liked each comment."""
+    queryset: ViewerStateQuerySet, user: AbstractUser
+) -> ViewerStateQuerySet:
+    """Set a field indicating whether the user has liked each comment on the comments of the given queryset."""
 
     if not user.is_authenticated:
         return queryset.annotate(is_liked=Value(False))
 
-    liked_comment_ids = CommentLike.objects.filter(profile=user.profile).values_list(
-        "comment_id"
-    )
+    profile_id = user.profile.id
 
-    return queryset.annotate(
-        is_liked=Case(
-            When(id__in=liked_comment_ids, then=Value(True)),
-            default=Value(False),
-        )
+    return queryset.with_viewer_state(
+        "is_liked",
+        lambda comment_ids: CommentLike.objects.filter(
+            profile_id=profile_id, comment_id__in=comment_ids
+        ).values_list("comment_id", flat=True),
     )
@@ -0,0 +1,97 @@
+import json
+import os
+from dataclasses import dataclass
+from time import time
+
+from celery import current_app
+from django.conf import settings
+from kombu.exceptions import ChannelError
+
+from .constants import MAX_VIDEO_DURATION_SECONDS
+
+
+# name of the message header holding the time the task was sent to its queue
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+# concurrency of the Celery worker running in this process, set when the worker starts
+worker_concurrency: int | None = None
+
+
+@dataclass
+class QueueStats:
+    name: str
+    # number of messages waiting in the queue
+    depth: int
+    # seconds the oldest waiting message has spent in the queue, None if unknown
+    oldest_wait: float | None
+
+
+def get_upload_priority(duration: float) -> int:
+    """
+    Returns priority of transcoding tasks of the upload, so that shorter uploads are
+    transcoded first. The Redis broker serves lower priorities first.
+
+    Parameters:
+        duration (float): Duration of the upload in seconds
+    """
+
+    steps = len(settings.CELERY_BROKER_TRANSPORT_OPTIONS["priority_steps"])
+    priority = int(duration / MAX_VIDEO_DURATION_SECONDS * steps)
+    return max(0, min(priority, steps - 1))
+
+
+def get_lowest_priority() -> int:
+    """Returns priority of tasks that should only run when no other task is waiting."""
+
+    return len(settings.CELERY_BROKER_TRANSPORT_OPTIONS["priority_steps"]) - 1
+
+
+def get_ffmpeg_threads(processes: int = 1) -> int:
+    """
+    Returns number of threads each ffmpeg process may use, so that the processes of all tasks
+    running concurrently on the worker don't use more threads than there are CPU cores.
+
+    Parameters:
+        processes (int): Number of ffmpeg processes run concurrently by the task
+    """
+
+    if settings.FFMPEG_THREADS is not None:
+        return settings.FFMPEG_THREADS
+
+    cores = os.cpu_count() or 1
+    return max(1, cores // ((worker_concurrency or 1) * processes))
+
+
+def get_queue_stats(name: str) -> QueueStats:
+    """
+    Returns depth of the Celery queue and wait time of its oldest message.
+    The wait time is only known for the Redis broker.
+
+    Parameters:
+        name (str): Name of the queue
+    """
+
+    with current_app.connection_for_read() as connection:
+        channel = connection.default_channel
+
+        try:
+            depth = channel.queue_declare(name, passive=True).message_count
+        except ChannelError:
+            # the queue doesn't exist until a message is sent to it
+            return QueueStats(name=name, depth=0, oldest_wait=None)
+
+        if depth == 0 or not hasattr(channel, "priority_steps"):
+            return QueueStats(name=name, depth=depth, oldest_wait=None)
+
+        # messages are pushed to the left of Redis lists, one list per priority
+        enqueue_times = []
+        for priority in channel.priority_steps:
+            message = channel.client.lindex(channel._q_for_pri(name, priority), -1)
+            if message is None:
+                continue
+            enqueued_at = json.loads(message)["headers"].get(ENQUEUED_AT_HEADER)
+            if enqueued_at is not None:
+                enqueue_times.append(enqueued_at)
+
+    oldest_wait = time() - min(enqueue_times) if enqueue_times else None
+    return QueueStats(name=name, depth=depth, oldest_wait=oldest_wait)
@@ -1,4 +1,7 @@
+import ffmpeg
 from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from django.db import transaction
 from django.utils.module_loading import import_string
 from rest_framework import serializers
@@ -13,14 +16,30 @@ from .models import (
     Event,
     HistoryEntry,
     Like,
+    PresignedUpload,
     Report,
     SavedVideo,
     Upload,
+    UploadSession,
     Video,
     VideoNotification,
     View,
 )
 from .signals import video_updated
+from .tasks import get_unique_upload_name
+from .storage import (
+    create_multipart_upload,
+    generate_presigned_part_urls,
+    get_content_hash,
+)
+from .validators import (
+    validate_video_duration_in_seconds,
+    validate_video_extension,
+    validate_video_filename,
+    validate_video_size,
+    validate_video_size_in_bytes,
+)
+from .video_processing import get_duration, get_header_duration, probe_file
 
 
 PROFILE_SERIALIZER = import_string(settings.PROFILE_SERIALIZER)
@@ -38,6 +57,8 @@ class VideoSerializer(serializers.ModelSerializer):
             "source",
             "thumbnail",
             "first_frame",
+            "images",
+            "sprites",
             "view_count",
             "like_count",
             "is_liked",
@@ -50,6 +71,8 @@ class VideoSerializer(serializers.ModelSerializer):
             "source",
             "thumbnail",
             "first_frame",
+            "images",
+            "sprites",
             "view_count",
             "like_count",
             "is_liked",
@@ -58,11 +81,28 @@ class VideoSerializer(serializers.ModelSerializer):
         ]
 
     profile = PROFILE_SERIALIZER()
-    view_count = serializers.IntegerField()
-    like_count = serializers.IntegerField()
     is_liked = serializers.BooleanField()
-    comment_count = serializers.IntegerField()
     is_saved = serializers.BooleanField()
+    images = serializers.SerializerMethodField()
+
+    def get_images(self, video: Video) -> list[dict]:
+        """Images of the first frame, so clients can pick the smallest one fitting their screen."""
+
+        request = self.context.get("request")
+        images = []
+
+        for image in video.images:
+            url = default_storage.url(image["name"])
+            images.append(
+                {
+                    "url": request.build_absolute_uri(url) if request else url,
+                    "width": image["width"],
+                    "height": image["height"],
+                    "format": image["format"],
+                }
+            )
+
+        return images
 
     @transaction.atomic()
     def update(self, instance, validated_data):
@@ -83,6 +123,40 @@ class CreateUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Upload
         fields = ["id", "file"]
+        extra_kwargs = {
+            # the duration is validated in validate
+            "file": {"validators": [validate_video_extension, validate_video_size]}
+        }
+
+    def validate(self, attrs: dict):
+        file = attrs["file"]
+        probe = None
+
+        # reading the duration from the container header is much faster than running ffprobe,
+        # the upload is then probed by handle_upload
+        duration = get_header_duration(file)
+
+        if duration is None:
+            try:
+                probe = probe_file(file)
+            except ffmpeg.Error:
+                raise serializers.ValidationError(
+                    {"file": ["File is not a valid video."]}
+                )
+            duration = get_duration(probe)
+
+        try:
+            validate_video_duration_in_seconds(duration)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError({"file": error.messages})
+
+        return {
+            **attrs,
+            "probe": probe,
+            # set by the upload handlers as the file streamed in, see UploadViewSet.create
+            "content_hash": getattr(file, "content_hash", None)
+            or get_content_hash(file.chunks()),
+        }
 
     def create(self, validated_data: dict):
         return Upload.objects.create(
@@ -92,6 +166,82 @@ class CreateUploadSerializer(serializers.ModelSerializer):
         )
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            "id",
+            "creation_date",
+            "filename",
+            "size",
+            "offset",
+            "upload",
+            "is_finalizing",
+            "errors",
+        ]
+
+
+class CreateUploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "size"]
+        extra_kwargs = {
+            "filename": {"validators": [validate_video_filename]},
+            "size": {"validators": [validate_video_size_in_bytes]},
+        }
+
+    def create(self, validated_data: dict):
+        return UploadSession.objects.create(
+            **validated_data, profile_id=self.context["profile_id"]
+        )
+
+
+class PresignedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PresignedUpload
+        fields = ["id", "creation_date", "filename", "size", "part_size", "part_urls"]
+
+    part_size = serializers.SerializerMethodField()
+    part_urls = serializers.SerializerMethodField()
+
+    def get_part_size(self, presigned_upload: PresignedUpload) -> int:
+        return settings.PRESIGNED_UPLOAD_PART_SIZE
+
+    def get_part_urls(self, presigned_upload: PresignedUpload) -> list[str]:
+        return generate_presigned_part_urls(
+            presigned_upload.name,
+            presigned_upload.multipart_upload_id,
+            presigned_upload.size,
+            settings.PRESIGNED_UPLOAD_PART_SIZE,
+            default_storage,
+        )
+
+
+class CreatePresignedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PresignedUpload
+        fields = ["id", "filename", "size"]
+        extra_kwargs = {
+            "filename": {"validators": [validate_video_filename]},
+            "size": {"validators": [validate_video_size_in_bytes]},
+        }
+
+    def create(self, validated_data: dict):
+        # S3 storage overwrites files of the same name, so the client's filename is only kept as filename
+        name = get_unique_upload_name(validated_data["filename"])
+
+        return PresignedUpload.objects.create(
+            **validated_data,
+            profile_id=self.context["profile_id"],
+            name=name,
+            multipart_upload_id=create_multipart_upload(name, default_storage),
+        )
+
+
+class FinalizePresignedUploadSerializer(serializers.Serializer):
+    etags = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+
+
 class CreateViewSerializer(serializers.ModelSerializer):
     class Meta:
         model = View
@@ -1,41 +1,70 @@
+import logging
+from time import time
+
+from celery.signals import before_task_publish, task_prerun, worker_init
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.db import transaction
+from django.db.models import F
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from rest_framework.request import Request
 
+from .. import scheduling
 from ..models import (
     Comment,
     CommentLike,
     CommentNotification,
     Event,
+    Like,
+    PresignedUpload,
     Upload,
+    UploadSession,
     Video,
     VideoNotification,
+    View,
 )
 from ..serializers import CreateHistoryEntrySerializer
 from ..tasks import (
+    abort_presigned_upload,
+    delete_upload_session_dir,
     delete_user_from_recommender_system,
     delete_video_dir,
     delete_video_from_recommender_system,
+    get_video_source_dir,
     insert_feedback_in_recommender_system,
     insert_user_in_recommender_system,
     insert_video_in_recommender_system,
+    report_upload_stage,
 )
 from ..utils import update_comment_popularity_score
+from ..video_processing import ProcessedVideo
 from . import video_created, video_updated, view_created
 
 
 USER_MODEL = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 @receiver(video_updated)
 def on_video_updated(sender, video: Video, **kwargs):
-    try:
-        Upload.objects.get(video=video).delete()
-    except Upload.DoesNotExist:
-        pass
+    with transaction.atomic():
+        # the lock keeps encode_remaining_renditions from finishing unaware of the edit
+        upload = Upload.objects.select_for_update().filter(video=video).first()
+        if upload is None:
+            return
+
+        # deleting the upload deletes its file, which is read until all renditions are encoded
+        if (
+            upload.processed is not None
+            and not ProcessedVideo(**upload.processed).is_complete
+        ):
+            upload.is_video_edited = True
+            upload.save(update_fields=["is_video_edited"])
+            return
+
+        upload.delete()
 
 
 @receiver(post_save, sender=Comment)
@@ -64,6 +93,53 @@ def on_post_delete_comment_like(sender, instance: CommentLike, **kwargs):
     update_comment_popularity_score(instance.comment)
 
 
+@receiver(post_save, sender=View)
+def on_post_save_view_update_video_counter(
+    sender, instance: View, created: bool, **kwargs
+):
+    # views are only deleted along with their video or profile, the latter is repaired by reconcile_video_counters
+    if created:
+        update_video_counter(instance.video_id, "view_count", 1)
+
+
+@receiver(post_save, sender=Like)
+def on_post_save_like_update_video_counter(
+    sender, instance: Like, created: bool, **kwargs
+):
+    if created:
+        update_video_counter(instance.video_id, "like_count", 1)
+
+
+@receiver(post_delete, sender=Like)
+def on_post_delete_like_update_video_counter(
+    sender, instance: Like, origin=None, **kwargs
+):
+    if not isinstance(origin, Video):
+        update_video_counter(instance.video_id, "like_count", -1)
+
+
+@receiver(post_save, sender=Comment)
+def on_post_save_comment_update_video_counter(
+    sender, instance: Comment, created: bool, **kwargs
+):
+    if created:
+        update_video_counter(instance.video_id, "comment_count", 1)
+
+
+@receiver(post_delete, sender=Comment)
+def on_post_delete_comment_update_video_counter(
+    sender, instance: Comment, origin=None, **kwargs
+):
+    if not isinstance(origin, Video):
+        update_video_counter(instance.video_id, "comment_count", -1)
+
+
+def update_video_counter(video_id: int, field: str, delta: int) -> None:
+    """Atomically add delta to the counter of the video, so concurrent updates aren't lost."""
+
+    Video.objects.filter(id=video_id).update(**{field: F(field) + delta})
+
+
 @receiver(post_save, sender=USER_MODEL)
 def on_post_save_user_insert_into_recommender(
     sender, instance: AbstractUser, created: bool, **kwargs
@@ -192,4 +268,52 @@ def on_post_save_comment_like_notify_comment_owner(
 
 @receiver(post_delete, sender=Video)
 def on_post_delete_video_delete_video_dir(sender, instance: Video, **kwargs):
-    delete_video_dir.delay_on_commit(instance.id)
+    delete_video_dir.delay_on_commit(instance.id, get_video_source_dir(instance))
+
+
+@receiver(post_save, sender=Upload)
+def on_post_save_upload_report_progress(
+    sender, instance: Upload, created: bool, **kwargs
+):
+    if created:
+        transaction.on_commit(lambda: report_upload_stage(instance))
+
+
+@receiver(post_delete, sender=UploadSession)
+def on_post_delete_upload_session_delete_chunks(
+    sender, instance: UploadSession, **kwargs
+):
+    delete_upload_session_dir.delay_on_commit(instance.id)
+
+
+@receiver(post_delete, sender=PresignedUpload)
+def on_post_delete_presigned_upload_abort_multipart_upload(
+    sender, instance: PresignedUpload, **kwargs
+):
+    if instance.upload_id is None:
+        abort_presigned_upload.delay_on_commit(
+            instance.name, instance.multipart_upload_id
+        )
+
+
+@before_task_publish.connect
+def on_before_task_publish_record_enqueue_time(headers: dict, **kwargs):
+    headers.setdefault(scheduling.ENQUEUED_AT_HEADER, time())
+
+
+@task_prerun.connect
+def on_task_prerun_log_queue_wait(task, **kwargs):
+    enqueued_at = getattr(task.request, scheduling.ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        return
+
+    queue = (task.request.delivery_info or {}).get("routing_key")
+    logger.info(
+        "Task %s waited %.1fs in queue %s", task.name, time() - enqueued_at, queue
+    )
+
+
+@worker_init.connect
+def on_worker_init_record_concurrency(sender, **kwargs):
+    # pool processes are forked after this, so they inherit the value
+    scheduling.worker_concurrency = sender.concurrency
@@ -0,0 +1,523 @@
+import hashlib
+import io
+import logging
+import math
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from queue import Full, Queue
+from threading import Event, Thread
+from time import perf_counter
+from typing import Generator, Iterable, Iterator
+
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage, default_storage
+from django.utils.crypto import get_random_string
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of keys in a single S3 DeleteObjects request
+S3_DELETE_BATCH_SIZE = 1000
+
+
+@dataclass
+class StoredFile:
+    """File written to the storage by save_files."""
+
+    name: str
+    size: int
+    seconds: float
+
+
+def save_files(
+    files: list[tuple[Path, str]], storage: Storage = default_storage
+) -> list[StoredFile]:
+    """
+    Save local files in the storage concurrently, using a bounded thread pool.
+    On S3 storage the files are uploaded through a single pooled client,
+    large files are uploaded in multiple parts.
+    Returns the saved files along with the time it took to save each of them.
+
+    Parameters:
+        files (list[tuple[Path, str]]): Pairs of local path and name in the storage
+        storage (Storage): Storage to save the files in
+    """
+
+    start = perf_counter()
+
+    with ThreadPoolExecutor(max_workers=settings.STORAGE_MAX_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(save_file, path, name, storage) for path, name in files
+        ]
+        stored_files = [future.result() for future in futures]
+
+    for stored_file in stored_files:
+        logger.debug(
+            "Saved %s (%d bytes) in %.3fs",
+            stored_file.name,
+            stored_file.size,
+            stored_file.seconds,
+        )
+
+    logger.info(
+        "Saved %d files (%d bytes) in %.3fs",
+        len(stored_files),
+        sum(stored_file.size for stored_file in stored_files),
+        perf_counter() - start,
+    )
+
+    return stored_files
+
+
+def save_file(path: Path, name: str, storage: Storage = default_storage) -> StoredFile:
+    """Save local file in the storage and measure the time it took."""
+
+    start = perf_counter()
+
+    if isinstance(storage, S3Storage):
+        name = upload_file_to_s3(path, name, storage)
+    else:
+        with open(path, "rb") as file:
+            name = storage.save(name, file)
+
+    return StoredFile(
+        name=name, size=path.stat().st_size, seconds=perf_counter() - start
+    )
+
+
+def upload_file_to_s3(path: Path, name: str, storage: S3Storage) -> str:
+    """
+    Upload local file to S3 storage, overwriting any existing file with the same name.
+    Files larger than STORAGE_MULTIPART_THRESHOLD are uploaded in multiple parts.
+    """
+
+    cleaned_name = clean_name(name)
+    key = storage._normalize_name(cleaned_name)
+
+    get_s3_client(storage).upload_file(
+        str(path),
+        storage.bucket_name,
+        key,
+        ExtraArgs=storage._get_write_parameters(key),
+        Config=get_transfer_config(),
+    )
+
+    return cleaned_name
+
+
+def replace_file(path: Path, name: str, storage: Storage = default_storage) -> None:
+    """
+    Replace file in the storage with local file, so that readers get either the old
+    or the new contents. S3 overwrites objects atomically, on the local filesystem
+    a copy is renamed over the existing file.
+
+    Parameters:
+        path (Path): Path to local file
+        name (str): Name of the file in the storage
+        storage (Storage): Storage to replace the file in
+    """
+
+    if isinstance(storage, S3Storage):
+        upload_file_to_s3(path, name, storage)
+        return
+
+    if isinstance(storage, FileSystemStorage):
+        target = Path(storage.path(name))
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        temp = target.with_name(f".{target.name}.{get_random_string(8)}")
+        try:
+            shutil.copyfile(path, temp)
+            os.replace(temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+        return
+
+    # other storages can't overwrite files, readers may briefly miss the file
+    storage.delete(name)
+    with open(path, "rb") as file:
+        storage.save(name, file)
+
+
+def delete_dir(dir: str, storage: Storage = default_storage) -> int:
+    """
+    Delete directory with all its contents from the storage, returns the number of deleted files.
+    On S3 storage the keys are listed by prefix and deleted in batches, batches are deleted concurrently.
+    Deleting a missing directory is a no-op, so an interrupted deletion can be safely repeated.
+
+    Parameters:
+        dir (str): Name of the directory in the storage
+        storage (Storage): Storage to delete the directory from
+    """
+
+    start = perf_counter()
+
+    if isinstance(storage, S3Storage):
+        count = delete_s3_prefix(dir, storage)
+    else:
+        count = delete_dir_contents(dir, storage)
+
+    logger.info("Deleted %d files from %s in %.3fs", count, dir, perf_counter() - start)
+
+    return count
+
+
+def delete_dir_contents(dir: str, storage: Storage) -> int:
+    """Delete directory from the storage file by file, recursing into subdirectories."""
+
+    dir_path = Path(dir)
+
+    try:
+        subdirs, files = storage.listdir(dir)
+    except FileNotFoundError:
+        return 0
+
+    for file in files:
+        storage.delete(str(dir_path / file))
+
+    count = len(files)
+
+    for subdir in subdirs:
+        count += delete_dir_contents(str(dir_path / subdir), storage)
+
+    storage.delete(dir)
+
+    return count
+
+
+def delete_s3_prefix(dir: str, storage: S3Storage) -> int:
+    """
+    Delete all keys under the directory prefix from S3 storage.
+    Listing pages hold at most S3_DELETE_BATCH_SIZE keys, so each page is deleted with a single request
+    while the next page is being listed.
+    """
+
+    prefix = storage._normalize_name(clean_name(dir)).rstrip("/") + "/"
+    client = get_s3_client(storage)
+    paginator = client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(
+        Bucket=storage.bucket_name,
+        Prefix=prefix,
+        PaginationConfig={"PageSize": S3_DELETE_BATCH_SIZE},
+    )
+
+    with ThreadPoolExecutor(max_workers=settings.STORAGE_MAX_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(
+                delete_s3_keys,
+                [object["Key"] for object in page["Contents"]],
+                storage,
+            )
+            for page in pages
+            if page.get("Contents")
+        ]
+        return sum(future.result() for future in futures)
+
+
+def delete_s3_keys(keys: list[str], storage: S3Storage) -> int:
+    """Delete up to S3_DELETE_BATCH_SIZE keys from S3 storage with a single request."""
+
+    response = get_s3_client(storage).delete_objects(
+        Bucket=storage.bucket_name,
+        Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+    )
+
+    if errors := response.get("Errors"):
+        # keys that were deleted are gone, a retry will only list the remaining ones
+        raise IOError(
+            f"Failed to delete {len(errors)} of {len(keys)} keys from S3, "
+            f"first error: {errors[0]['Key']}: {errors[0]['Message']}"
+        )
+
+    return len(keys)
+
+
+def read_file_range(
+    name: str, start: int, length: int, storage: Storage = default_storage
+) -> bytes:
+    """
+    Read length bytes of the file in the storage starting at start offset.
+    Returns fewer bytes if the range extends past the end of the file.
+    """
+
+    if isinstance(storage, S3Storage):
+        try:
+            response = get_s3_client(storage).get_object(
+                Bucket=storage.bucket_name,
+                Key=storage._normalize_name(clean_name(name)),
+                Range=f"bytes={start}-{start + length - 1}",
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "InvalidRange":
+                return b""
+            raise
+
+        return response["Body"].read()
+
+    with storage.open(name) as file:
+        file.seek(start)
+        return file.read(length)
+
+
+def stream_file(
+    name: str, storage: Storage = default_storage
+) -> Generator[bytes, None, None]:
+    """
+    Read the file in the storage sequentially in blocks of STORAGE_READ_BLOCK_SIZE bytes,
+    without writing it to local disk. On S3 storage each block is fetched with a separate byte range request.
+    A background thread reads up to STORAGE_READ_AHEAD_BLOCKS blocks ahead of the consumer.
+
+    Parameters:
+        name (str): Name of the file in the storage
+        storage (Storage): Storage to read the file from
+    """
+
+    blocks = Queue(maxsize=settings.STORAGE_READ_AHEAD_BLOCKS)
+    stopped = Event()
+
+    def put(item) -> None:
+        while not stopped.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def read_ahead() -> None:
+        try:
+            for block in read_file_blocks(name, storage):
+                put(block)
+                if stopped.is_set():
+                    return
+            put(None)
+        except Exception as error:
+            put(error)
+
+    thread = Thread(target=read_ahead, daemon=True)
+    thread.start()
+
+    try:
+        while (block := blocks.get()) is not None:
+            if isinstance(block, Exception):
+                raise block
+            yield block
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def read_file_blocks(
+    name: str, storage: Storage = default_storage
+) -> Generator[bytes, None, None]:
+    """Read the file in the storage sequentially in blocks of STORAGE_READ_BLOCK_SIZE bytes."""
+
+    block_size = settings.STORAGE_READ_BLOCK_SIZE
+
+    if isinstance(storage, S3Storage):
+        offset = 0
+        while block := read_file_range(name, offset, block_size, storage):
+            yield block
+            if len(block) < block_size:
+                return
+            offset += len(block)
+    else:
+        with storage.open(name) as file:
+            while block := file.read(block_size):
+                yield block
+
+
+def concatenate_files(
+    names: list[str], name: str, storage: Storage = default_storage, hash=None
+) -> str:
+    """
+    Save concatenation of the files in the storage as a new file, returns the name of the saved file.
+    The files are streamed block by block, so the result is never held in memory or on local disk.
+
+    Parameters:
+        names (list[str]): Names of the files to concatenate, in order
+        name (str): Name of the new file
+        storage (Storage): Storage holding the files
+        hash (hashlib hash object | None): Hash updated with the contents of the new file as it is saved
+    """
+
+    blocks = (block for part in names for block in stream_file(part, storage))
+    if hash is not None:
+        blocks = hash_blocks(blocks, hash)
+
+    reader = io.BufferedReader(BlockReader(blocks), settings.STORAGE_READ_BLOCK_SIZE)
+
+    return storage.save(name, File(reader, name=name))
+
+
+def get_content_hash(blocks: Iterable[bytes]) -> str:
+    """Returns SHA-256 of the contents read in blocks, identifying uploads of the same file."""
+
+    hash = hashlib.sha256()
+    for block in blocks:
+        hash.update(block)
+
+    return hash.hexdigest()
+
+
+def hash_blocks(blocks: Iterable[bytes], hash) -> Generator[bytes, None, None]:
+    """Yield the blocks, updating the hash with each of them."""
+
+    for block in blocks:
+        hash.update(block)
+        yield block
+
+
+class BlockReader(io.RawIOBase):
+    """Non-seekable binary file reading from an iterable of byte blocks."""
+
+    def __init__(self, blocks: Iterable[bytes]):
+        self.blocks: Iterator[bytes] = iter(blocks)
+        self.remainder = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.remainder:
+            self.remainder = next(self.blocks, b"")
+
+        size = min(len(buffer), len(self.remainder))
+        buffer[:size] = self.remainder[:size]
+        self.remainder = self.remainder[size:]
+        return size
+
+
+def create_multipart_upload(name: str, storage: S3Storage) -> str:
+    """Start multipart upload of the file to S3 storage, returns the id of the upload."""
+
+    key = storage._normalize_name(clean_name(name))
+
+    response = get_s3_client(storage).create_multipart_upload(
+        Bucket=storage.bucket_name, Key=key, **storage._get_write_parameters(key)
+    )
+
+    return response["UploadId"]
+
+
+def generate_presigned_part_urls(
+    name: str, upload_id: str, size: int, part_size: int, storage: S3Storage
+) -> list[str]:
+    """
+    Generate presigned URLs for uploading parts of the multipart upload directly to S3 storage.
+    Each URL is signed with the length of its part, so the client can't upload more than the size.
+    The URLs expire after PRESIGNED_UPLOAD_EXPIRATION_SECONDS.
+
+    Parameters:
+        name (str): Name of the uploaded file
+        upload_id (str): Id of the multipart upload
+        size (int): Size of the uploaded file in bytes
+        part_size (int): Size of each part in bytes, except for the last one
+        storage (S3Storage): Storage the file is uploaded to
+    """
+
+    key = storage._normalize_name(clean_name(name))
+    # only signature version 4 signs the Content-Length header
+    client = get_s3_client(storage, Config(signature_version="s3v4"))
+    part_count = max(math.ceil(size / part_size), 1)
+
+    return [
+        client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": storage.bucket_name,
+                "Key": key,
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+                "ContentLength": min(part_size, size - (part_number - 1) * part_size),
+            },
+            ExpiresIn=settings.PRESIGNED_UPLOAD_EXPIRATION_SECONDS,
+            HttpMethod="PUT",
+        )
+        for part_number in range(1, part_count + 1)
+    ]
+
+
+def complete_multipart_upload(
+    name: str, upload_id: str, etags: list[str], storage: S3Storage
+) -> int:
+    """
+    Complete multipart upload to S3 storage from the ETags of its parts in order,
+    returns the size of the uploaded file. Raises ClientError if the file doesn't exist afterwards.
+    """
+
+    key = storage._normalize_name(clean_name(name))
+    client = get_s3_client(storage)
+
+    try:
+        client.complete_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": etag, "PartNumber": part_number}
+                    for part_number, etag in enumerate(etags, start=1)
+                ]
+            },
+        )
+    except ClientError as error:
+        # the upload might have been completed by a previous attempt
+        if error.response["Error"]["Code"] != "NoSuchUpload":
+            raise
+
+    return client.head_object(Bucket=storage.bucket_name, Key=key)["ContentLength"]
+
+
+def abort_multipart_upload(name: str, upload_id: str, storage: S3Storage) -> None:
+    """Abort multipart upload to S3 storage, deleting its uploaded parts."""
+
+    try:
+        get_s3_client(storage).abort_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+        )
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "NoSuchUpload":
+            raise
+
+
+@cache
+def get_s3_client(storage: S3Storage, config: Config | None = None):
+    """
+    Get S3 client for the storage with a connection pool large enough for concurrent requests.
+    Unlike the storage's own connection, the client is created once and shared between threads.
+    The given config overrides that of the storage.
+    """
+
+    session = storage._create_session()
+
+    return session.client(
+        "s3",
+        region_name=storage.region_name,
+        use_ssl=storage.use_ssl,
+        endpoint_url=storage.endpoint_url,
+        config=storage.client_config.merge(
+            Config(max_pool_connections=settings.STORAGE_MAX_CONCURRENCY)
+        ).merge(config or Config()),
+        verify=storage.verify,
+    )
+
+
+@cache
+def get_transfer_config() -> TransferConfig:
+    return TransferConfig(
+        multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.STORAGE_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.STORAGE_MULTIPART_CONCURRENCY,
+    )
@@ -0,0 +1,286 @@
+import logging
+import math
+import os
+import signal
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from inspect import isgenerator
+from threading import Event, Timer
+from typing import IO, Any, Callable, Generator, Iterable
+
+import ffmpeg
+from django.conf import settings
+from django.core.cache import cache
+
+from .constants import MAX_VIDEO_DURATION_SECONDS
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+# reasons for killing a media command, see get_kill_counts
+TIMEOUT = "timeout"
+CPU_TIME = "cpu_time"
+KILLED = "killed"
+KILL_REASONS = (TIMEOUT, CPU_TIME, KILLED)
+
+# seconds between the soft CPU time limit sending SIGXCPU and the hard one sending SIGKILL
+CPU_TIME_LIMIT_GRACE_SECONDS = 5
+
+
+@dataclass
+class ResourceLimits:
+    """Resource limits of a media command, None for no limit."""
+
+    # seconds of wall-clock time, the process group is killed once they run out
+    wall_time: float | None
+    # seconds of CPU time of the process, enforced by the kernel with RLIMIT_CPU
+    cpu_time: int | None
+    # bytes of address space of the process, enforced by the kernel with RLIMIT_AS
+    memory: int | None
+
+
+class CommandKilled(ffmpeg.Error):
+    """Media command killed for exceeding its resource limits."""
+
+    def __init__(self, cmd: str, reason: str, stderr: bytes | None = None):
+        super().__init__(cmd, None, stderr)
+        self.reason = reason
+
+
+def get_media_limits(duration: float | None = None) -> ResourceLimits:
+    """
+    Returns resource limits of ffmpeg processing video of the given duration.
+    The time limits grow with the duration, see MEDIA_COMMAND_* settings.
+
+    Parameters:
+        duration (float | None): Duration of the video in seconds, the longest duration of uploads if not known
+    """
+
+    if duration is None:
+        duration = MAX_VIDEO_DURATION_SECONDS
+
+    return ResourceLimits(
+        wall_time=settings.MEDIA_COMMAND_TIME_LIMIT_BASE_SECONDS
+        + settings.MEDIA_COMMAND_TIME_LIMIT_SECONDS_PER_SECOND * duration,
+        cpu_time=math.ceil(
+            settings.MEDIA_COMMAND_TIME_LIMIT_BASE_SECONDS
+            + settings.MEDIA_COMMAND_CPU_TIME_LIMIT_SECONDS_PER_SECOND * duration
+        ),
+        memory=settings.MEDIA_COMMAND_MEMORY_LIMIT_BYTES,
+    )
+
+
+def get_probe_limits() -> ResourceLimits:
+    """
+    Returns resource limits of ffprobe and of commands reading only the first frames of the video,
+    which take about as long whatever the duration of the video.
+    """
+
+    return ResourceLimits(
+        wall_time=settings.PROBE_COMMAND_TIME_LIMIT_SECONDS,
+        cpu_time=settings.PROBE_COMMAND_TIME_LIMIT_SECONDS,
+        memory=settings.MEDIA_COMMAND_MEMORY_LIMIT_BYTES,
+    )
+
+
+def run_supervised(
+    args: list[str],
+    limits: ResourceLimits,
+    *,
+    input_stream: Iterable[bytes] | None = None,
+    read_stdout: Callable[[IO[bytes]], Any] | None = None,
+) -> Any:
+    """
+    Run the command under supervision, see supervise, raising ffmpeg.Error if it fails.
+    Returns the result of read_stdout, or None if it isn't specified.
+
+    Parameters:
+        args (list[str]): Command and its arguments
+        limits (ResourceLimits): Resource limits of the command
+        input_stream (Iterable[bytes] | None): Blocks written to stdin of the process
+        read_stdout (Callable[[IO[bytes]], Any] | None): Function reading stdout of the process
+    """
+
+    with supervise(
+        args,
+        limits,
+        pipe_stdin=input_stream is not None,
+        pipe_stdout=read_stdout is not None,
+    ) as process:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # stderr is drained concurrently, otherwise the process blocks once the pipe is full
+            stderr = executor.submit(process.stderr.read)
+            stdout = (
+                executor.submit(read_stdout, process.stdout)
+                if read_stdout is not None
+                else None
+            )
+
+            try:
+                if input_stream is not None:
+                    write_input(process, input_stream)
+            finally:
+                process.wait()
+
+    if process.returncode != 0:
+        raise ffmpeg.Error(args[0], None, stderr.result())
+
+    return stdout.result() if stdout is not None else None
+
+
+@contextmanager
+def supervise(
+    args: list[str],
+    limits: ResourceLimits,
+    *,
+    pipe_stdin: bool = False,
+    pipe_stdout: bool = False,
+) -> Generator[subprocess.Popen, None, None]:
+    """
+    Start the command in a new process group with its CPU time and memory limited, and yield
+    the process. A watchdog kills the process group once the wall-clock time limit runs out.
+    When the block exits, whatever is left of the process group is killed. If the command was
+    killed for exceeding its limits, the kill is recorded and CommandKilled is raised.
+
+    Parameters:
+        args (list[str]): Command and its arguments
+        limits (ResourceLimits): Resource limits of the command
+        pipe_stdin (bool): Whether to connect a pipe to stdin of the process
+        pipe_stdout (bool): Whether to connect a pipe to stdout of the process
+    """
+
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE if pipe_stdin else subprocess.DEVNULL,
+        stdout=subprocess.PIPE if pipe_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    set_process_limits(process.pid, limits)
+
+    timed_out = Event()
+
+    def on_timeout() -> None:
+        timed_out.set()
+        kill_process_group(process)
+
+    watchdog = None
+    if limits.wall_time is not None:
+        watchdog = Timer(limits.wall_time, on_timeout)
+        watchdog.daemon = True
+        watchdog.start()
+
+    try:
+        yield process
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        kill_process_group(process)
+        process.wait()
+
+    reason = get_kill_reason(process.returncode, timed_out.is_set())
+    if reason is not None:
+        record_kill(args[0], reason)
+        raise CommandKilled(args[0], reason)
+
+
+def set_process_limits(pid: int, limits: ResourceLimits) -> None:
+    """
+    Limit CPU time and memory of the running process. The limits are set right after the process
+    starts rather than before it, as setting them in the forked child isn't safe in threaded programs.
+    """
+
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+
+    try:
+        if limits.cpu_time is not None:
+            resource.prlimit(
+                pid,
+                resource.RLIMIT_CPU,
+                (limits.cpu_time, limits.cpu_time + CPU_TIME_LIMIT_GRACE_SECONDS),
+            )
+        if limits.memory is not None:
+            resource.prlimit(pid, resource.RLIMIT_AS, (limits.memory, limits.memory))
+    except ProcessLookupError:
+        # the process has already exited
+        pass
+
+
+def kill_process_group(process: subprocess.Popen) -> None:
+    """Kill all processes of the group led by the process, including the processes it started."""
+
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # the group has no processes left
+        pass
+
+
+def get_kill_reason(returncode: int, timed_out: bool) -> str | None:
+    """Returns why the process was killed, None if it exited on its own."""
+
+    if timed_out:
+        return TIMEOUT
+    if returncode == -signal.SIGXCPU:
+        return CPU_TIME
+    if returncode == -signal.SIGKILL:
+        # the hard CPU time limit or the OOM killer
+        return KILLED
+
+    return None
+
+
+def get_kill_count_key(reason: str) -> str:
+    return f"media_command_kills:{reason}"
+
+
+def record_kill(cmd: str, reason: str) -> None:
+    """Log the killed command and count the kill in the cache, shared by all workers."""
+
+    logger.warning("Killed %s for exceeding its resource limits: %s", cmd, reason)
+
+    key = get_kill_count_key(reason)
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception:
+        logger.warning("Could not count kill of %s", cmd)
+
+
+def get_kill_counts() -> dict[str, int]:
+    """Returns number of media commands killed for each reason."""
+
+    counts = cache.get_many([get_kill_count_key(reason) for reason in KILL_REASONS])
+    return {
+        reason: counts.get(get_kill_count_key(reason), 0) for reason in KILL_REASONS
+    }
+
+
+def write_input(process: subprocess.Popen, input_stream: Iterable[bytes]) -> None:
+    """Write blocks of the input stream to stdin of the process, then close it."""
+
+    try:
+        for block in input_stream:
+            process.stdin.write(block)
+    except BrokenPipeError:
+        # the process exited before reading the whole input, its exit code tells why
+        pass
+    except BaseException:
+        # don't let the process finish with a truncated input
+        kill_process_group(process)
+        raise
+    finally:
+        if isgenerator(input_stream):
+            input_stream.close()
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
@@ -1,72 +1,657 @@
+import hashlib
+import shutil
+from collections import Counter
+from dataclasses import asdict, replace
+from datetime import timedelta
 from pathlib import Path
+from uuid import uuid4
 
-from celery import shared_task
+import ffmpeg
+from celery import chord, shared_task
+from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.db import transaction
+from django.db.models import Case, F, Value, When
 from django.db.models.fields.files import FieldFile
+from django.utils import timezone
 from django.utils.crypto import get_random_string
+from storages.backends.s3 import S3Storage
 
 from gorse_client import get_gorse_client
 
-from .models import Comment, Event, Upload, Video
+from .constants import (
+    FIRST_FRAME_FILENAME,
+    HLS_PLAYLIST_FILENAME,
+    SPRITES_FILENAME,
+    THUMBNAIL_FILENAME,
+    UPLOAD_SESSION_EXPIRATION_TIME_HOURS,
+    VIEW_BUFFER_BATCH_SIZE,
+    VIEW_BUFFER_EXPIRATION_SECONDS,
+    VIEW_BUFFER_MAX_BATCHES_PER_FLUSH,
+)
+from .models import (
+    Comment,
+    Event,
+    HistoryEntry,
+    PresignedUpload,
+    ProcessedMedia,
+    StoredViewBatch,
+    Upload,
+    UploadSession,
+    Video,
+    View,
+)
+from .progress import (
+    get_progress_reporter,
+    report_chunk_transcoded,
+    set_upload_progress,
+)
+from .querysets import get_video_counter_subqueries
+from .scheduling import get_lowest_priority, get_upload_priority
+from .storage import (
+    abort_multipart_upload,
+    concatenate_files,
+    get_content_hash,
+    stream_file,
+)
 from .signals import video_created
-from .utils import remove_dir, update_comment_popularity_score
+from .utils import remove_dir, save_dir, update_comment_popularity_score
+from .validators import validate_video_duration_in_seconds
 from .video_processing import (
-    create_thumbnail,
-    create_vertical_video,
-    extract_first_frame,
-    make_hls,
+    ImageVariant,
+    ProcessedVideo,
+    Rendition,
+    VideoChunk,
+    add_renditions,
+    encode_chunk,
+    get_duration,
+    get_largest_rendition,
+    get_smallest_rendition,
+    get_sprite_cues,
+    get_stored_images,
+    get_vertical_images,
+    get_vertical_renditions,
+    has_audio_stream_in_probe,
+    is_streamable,
+    plan_vertical_renditions,
+    probe_video,
+    process_video,
+    split_video_into_chunks,
+    write_chunked_hls_playlists,
+    write_sprites_index,
+)
+from .view_buffer import (
+    BufferedView,
+    get_buffered_views,
+    lock_view_buffer,
+    remove_buffered_views,
+    settle_view_buffer,
 )
 
 
 @shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
-@transaction.atomic()
 def handle_upload(upload_id: int, profile_id: int) -> None:
+    """
+    Process the upload in stages: probe, transcode and publish. Each completed stage
+    is recorded on the upload along with its outputs, so a retry resumes after the last one.
+    Only publishing runs in a transaction.
+
+    The upload is probed by this light task, then transcoded by transcode_upload
+    on the transcode queue, shorter uploads first. If the same file was uploaded before,
+    the video is published right away with the files transcoded from it. Uploads not hashed
+    when they were created are only checked for that by transcode_upload, once it hashed them.
+    """
+
     upload = Upload.objects.get(id=upload_id)
 
-    title = Path(upload.filename).stem
+    if upload.stage == Upload.Stage.PENDING:
+        probe_upload(upload)
 
-    video = Video.objects.create(
-        profile_id=profile_id,
-        title=title,
-        description="",
-        source="",
-        thumbnail="",
+    if upload.stage == Upload.Stage.PROBED:
+        if reuse_processed_media(upload, profile_id):
+            return
+
+        transcode_upload.apply_async(
+            (upload.id, profile_id),
+            priority=get_upload_priority(get_duration(upload.probe)),
+        )
+
+    if upload.stage == Upload.Stage.TRANSCODED:
+        publish_upload(upload.id, profile_id)
+
+
+def probe_upload(upload: Upload) -> None:
+    """Probe the upload, unless that was done when it was created, and record the probe stage."""
+
+    if upload.probe is None:
+        upload.probe = probe_video(get_upload_file_location(upload))
+
+    upload.stage = Upload.Stage.PROBED
+    upload.save(update_fields=["probe", "stage"])
+    report_upload_stage(upload)
+
+
+@transaction.atomic()
+def reuse_processed_media(upload: Upload, profile_id: int) -> bool:
+    """
+    Publish the upload with the files transcoded from an earlier upload of the same file,
+    if all renditions of those are encoded. Returns whether the upload was published.
+    """
+
+    if not settings.TRANSCODE_DEDUPLICATION or upload.content_hash is None:
+        return False
+
+    # the lock keeps the files from being removed before the video referencing them is published
+    media = (
+        ProcessedMedia.objects.select_for_update()
+        .filter(content_hash=upload.content_hash)
+        .first()
     )
+    if media is None or not ProcessedVideo(**media.processed).is_complete:
+        return False
+
+    upload.processed = media.processed
+    upload.stage = Upload.Stage.TRANSCODED
+    upload.save(update_fields=["processed", "stage"])
+
+    publish_upload(upload.id, profile_id)
+    return True
+
 
-    output_dir = get_video_dir(video.id)
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def transcode_upload(upload_id: int, profile_id: int) -> None:
+    """
+    Crop the upload, package it for HLS and create its images in a single ffmpeg pass,
+    record the transcode stage and publish the video. Long uploads are transcoded in chunks.
+    Files uploaded straight to the storage are hashed here rather than by the light handle_upload,
+    as the whole file is read, and published with the files of an earlier upload if there is one.
+    """
+
+    upload = Upload.objects.get(id=upload_id)
+
+    if upload.stage != Upload.Stage.PROBED:
+        return
+
+    if upload.content_hash is None:
+        upload.content_hash = get_content_hash(stream_file(upload.file.name))
+        upload.save(update_fields=["content_hash"])
+
+        if reuse_processed_media(upload, profile_id):
+            return
+
+    if get_duration(upload.probe) >= settings.TRANSCODE_CHUNKING_THRESHOLD_SECONDS:
+        # finish_chunked_transcoding publishes the video
+        start_chunked_transcoding(upload, profile_id)
+        return
+
+    output_dir = get_upload_output_dir(upload.id)
+    remove_dir(output_dir)
+
+    renditions = get_upload_renditions(upload)
+    # only the smallest rendition is encoded before publishing,
+    # encode_remaining_renditions adds the others afterwards
+    progressive = settings.TRANSCODE_PROGRESSIVE_PUBLISH and len(renditions) > 1
+
+    input, stream = get_ffmpeg_input(upload.file.name)
+    processed = process_video(
+        input,
+        output_dir,
+        upload.probe,
+        stream=stream,
+        renditions=[get_smallest_rendition(renditions)] if progressive else renditions,
+        on_progress=get_progress_reporter(
+            upload.id, upload.profile.user_id, get_duration(upload.probe)
+        ),
+    )
+
+    upload.processed = asdict(replace(processed, is_complete=not progressive))
+    upload.stage = Upload.Stage.TRANSCODED
+    upload.save(update_fields=["processed", "stage"])
+    report_upload_stage(upload)
+
+    publish_upload(upload.id, profile_id, renditions)
+
+
+def start_chunked_transcoding(upload: Upload, profile_id: int) -> None:
+    """
+    Split the upload into chunks at keyframes and transcode each of them in a separate task.
+    When all chunks are transcoded, finish_chunked_transcoding publishes the video.
+    """
+
+    output_dir = get_upload_output_dir(upload.id)
     remove_dir(output_dir)
 
-    video_path = settings.TEMP_DIR / f"{get_random_string(20)}-{upload.filename}"
-    upload_location = get_upload_file_location(upload)
+    chunks_dir = get_upload_chunks_dir(upload.id)
+    remove_dir(chunks_dir)
+
+    has_audio = has_audio_stream_in_probe(upload.probe)
+    renditions = [asdict(rendition) for rendition in get_upload_renditions(upload)]
+    images = [asdict(image) for image in get_vertical_images(upload.probe)]
+
+    temp_dir: Path = settings.TEMP_DIR / get_random_string(20)
+    shutil.rmtree(temp_dir, ignore_errors=True)
 
     try:
-        create_vertical_video(upload_location, video_path)
+        chunks = split_video_into_chunks(
+            get_upload_file_location(upload),
+            temp_dir,
+            settings.TRANSCODE_CHUNK_DURATION_SECONDS,
+            has_audio=has_audio,
+            duration=get_duration(upload.probe),
+        )
+        save_dir(temp_dir, chunks_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-        hls_playlist_path = make_hls(video_path, output_dir)
-        video.source = FieldFile(video, video.source, hls_playlist_path)
+    chunks = [
+        asdict(replace(chunk, path=str(Path(chunks_dir) / Path(chunk.path).name)))
+        for chunk in chunks
+    ]
 
-        thumbnail_path = create_thumbnail(video_path, output_dir)
-        video.thumbnail = FieldFile(video, video.thumbnail, thumbnail_path)
+    # chunks of the upload keep its priority on the transcode queue
+    priority = get_upload_priority(get_duration(upload.probe))
 
-        first_frame_path = extract_first_frame(video_path, output_dir)
-        video.first_frame = FieldFile(video, video.first_frame, first_frame_path)
+    # a retried or redelivered transcode_upload returns once the chunks are dispatched,
+    # instead of removing the chunks and output the dispatched tasks still use
+    if not Upload.objects.filter(id=upload.id, stage=Upload.Stage.PROBED).update(
+        stage=Upload.Stage.CHUNKED
+    ):
+        return
+
+    try:
+        chord(
+            transcode_chunk.si(
+                chunk,
+                renditions,
+                has_audio,
+                output_dir,
+                upload.id,
+                len(chunks),
+                # images are created from the first frame of the video
+                images if chunk["index"] == 0 else None,
+            ).set(priority=priority)
+            for chunk in chunks
+        )(
+            finish_chunked_transcoding.si(
+                upload.id, profile_id, chunks, renditions, output_dir
+            )
+        )
+    except Exception:
+        # nothing was dispatched, the retry splits the upload again
+        Upload.objects.filter(id=upload.id).update(stage=Upload.Stage.PROBED)
+        raise
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def transcode_chunk(
+    chunk: dict,
+    renditions: list[dict],
+    has_audio: bool,
+    output_dir: str,
+    upload_id: int | None = None,
+    chunk_count: int | None = None,
+    images: list[dict] | None = None,
+) -> None:
+    chunk = VideoChunk(**chunk)
+
+    temp_dir: Path = settings.TEMP_DIR / get_random_string(20)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+    try:
+        encode_chunk(
+            get_storage_file_location(chunk.path),
+            temp_dir,
+            [Rendition(**rendition) for rendition in renditions],
+            chunk,
+            has_audio=has_audio,
+            thumbnail=chunk.index == 0,
+            first_frame=chunk.index == 0,
+            images=[ImageVariant(**image) for image in images or []],
+            sprites=True,
+        )
+        save_dir(temp_dir, output_dir)
     finally:
-        video_path.unlink(missing_ok=True)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if upload_id is not None:
+        report_chunk_transcoded(upload_id, chunk_count)
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def finish_chunked_transcoding(
+    upload_id: int,
+    profile_id: int,
+    chunks: list[dict],
+    renditions: list[dict],
+    output_dir: str,
+) -> None:
+    upload = Upload.objects.get(id=upload_id)
+
+    if upload.stage == Upload.Stage.CHUNKED:
+        temp_dir: Path = settings.TEMP_DIR / get_random_string(20)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+        try:
+            write_chunked_hls_playlists(
+                temp_dir,
+                [Rendition(**rendition) for rendition in renditions],
+                [VideoChunk(**chunk) for chunk in chunks],
+            )
+            write_sprites_index(
+                temp_dir / SPRITES_FILENAME,
+                [
+                    cue
+                    for chunk in chunks
+                    for cue in get_sprite_cues(chunk["duration"], VideoChunk(**chunk))
+                ],
+            )
+            save_dir(temp_dir, output_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        output_dir_path = Path(output_dir)
+        largest_rendition = get_largest_rendition(
+            [Rendition(**rendition) for rendition in renditions]
+        )
+        processed = ProcessedVideo(
+            source=str(output_dir_path / HLS_PLAYLIST_FILENAME),
+            thumbnail=str(output_dir_path / THUMBNAIL_FILENAME),
+            first_frame=str(output_dir_path / FIRST_FRAME_FILENAME),
+            width=largest_rendition.width,
+            height=largest_rendition.height,
+            duration=sum(chunk["duration"] for chunk in chunks),
+            images=get_stored_images(get_vertical_images(upload.probe), output_dir),
+            sprites=str(output_dir_path / SPRITES_FILENAME),
+        )
+
+        upload.processed = asdict(processed)
+        upload.stage = Upload.Stage.TRANSCODED
+        upload.save(update_fields=["processed", "stage"])
+
+    if upload.stage == Upload.Stage.TRANSCODED:
+        publish_upload(upload.id, profile_id)
+
+    remove_dir(get_upload_chunks_dir(upload_id))
+
+
+@transaction.atomic()
+def publish_upload(
+    upload_id: int, profile_id: int, renditions: list[Rendition] | None = None
+) -> None:
+    """
+    Create the video from the transcoded upload and record the publish stage.
+    If only some of the renditions are transcoded, the others are encoded afterwards,
+    planned again if the renditions of the first pass are not given.
+    """
+
+    # the lock keeps duplicate deliveries of the task from publishing the upload twice
+    upload = Upload.objects.select_for_update().get(id=upload_id)
+    if upload.stage != Upload.Stage.TRANSCODED:
+        return
+
+    processed = ProcessedVideo(**upload.processed)
+
+    video = create_video(upload, profile_id)
+    publish_video(upload, video, processed)
+    share_processed_media(upload, processed)
+
+    if not processed.is_complete:
+        if renditions is not None:
+            renditions = [asdict(rendition) for rendition in renditions]
+
+        encode_remaining_renditions.apply_async_on_commit(
+            (upload.id, video.id, upload.file.name, upload.probe, renditions),
+            priority=get_lowest_priority(),
+        )
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def encode_remaining_renditions(
+    upload_id: int,
+    video_id: int,
+    name: str,
+    probe: dict,
+    renditions: list[dict] | None = None,
+) -> None:
+    """
+    Encode the renditions left out when the video was published with its smallest rendition,
+    then record the full size of the video. Editing the video doesn't delete the upload
+    and its file until then, the upload is deleted here instead.
+    """
+
+    upload = Upload.objects.filter(id=upload_id).first()
+    if upload is not None and ProcessedVideo(**upload.processed).is_complete:
+        return
+
+    video = Video.objects.filter(id=video_id).first()
+    if video is None:
+        return
+
+    if renditions is None:
+        renditions = get_file_renditions(name, probe)
+    else:
+        renditions = [Rendition(**rendition) for rendition in renditions]
+
+    input, stream = get_ffmpeg_input(name)
+    add_renditions(
+        input,
+        get_video_source_dir(video),
+        probe,
+        renditions,
+        encoded_renditions=[get_smallest_rendition(renditions)],
+        stream=stream,
+    )
+
+    largest_rendition = get_largest_rendition(renditions)
+    Video.objects.filter(id=video_id).update(
+        width=largest_rendition.width, height=largest_rendition.height
+    )
+
+    def complete(processed: dict) -> dict:
+        return asdict(
+            replace(
+                ProcessedVideo(**processed),
+                width=largest_rendition.width,
+                height=largest_rendition.height,
+                is_complete=True,
+            )
+        )
+
+    if upload is not None:
+        with transaction.atomic():
+            upload = Upload.objects.select_for_update().filter(id=upload_id).first()
+            if upload is not None and upload.is_video_edited:
+                upload.delete()
+            elif upload is not None:
+                upload.processed = complete(upload.processed)
+                upload.save(update_fields=["processed"])
+
+    media = ProcessedMedia.objects.filter(dir=get_video_source_dir(video)).first()
+    if media is not None:
+        media.processed = complete(media.processed)
+        media.save(update_fields=["processed"])
+
+
+def share_processed_media(upload: Upload, processed: ProcessedVideo) -> None:
+    """
+    Add a reference to the processed media of the upload's file, registering the files
+    transcoded from the upload as that media if there is none yet.
+    """
+
+    if not settings.TRANSCODE_DEDUPLICATION or upload.content_hash is None:
+        return
+
+    dir = get_source_dir(processed.source)
+    media, created = ProcessedMedia.objects.select_for_update().get_or_create(
+        content_hash=upload.content_hash,
+        defaults={"dir": dir, "processed": asdict(processed), "reference_count": 1},
+    )
+
+    # the same file uploaded while the first upload was transcoded keeps its own files
+    if not created and media.dir == dir:
+        media.reference_count = F("reference_count") + 1
+        media.save(update_fields=["reference_count"])
+
+
+@transaction.atomic()
+def release_processed_media(dir: str) -> bool:
+    """
+    Remove a reference to the processed media stored in the directory.
+    Returns whether the directory is no longer referenced by any video and can be removed.
+    """
+
+    media = ProcessedMedia.objects.select_for_update().filter(dir=dir).first()
+    if media is None:
+        return True
+
+    if media.reference_count > 1:
+        media.reference_count = F("reference_count") - 1
+        media.save(update_fields=["reference_count"])
+        return False
+
+    media.delete()
+    return True
+
+
+def create_video(upload: Upload, profile_id: int) -> Video:
+    """Create video for the upload. Its files are set by publish_video."""
+
+    return Video.objects.create(
+        profile_id=profile_id,
+        title=Path(upload.filename).stem,
+        description="",
+        source="",
+        thumbnail="",
+    )
+
+
+def publish_video(upload: Upload, video: Video, processed: ProcessedVideo) -> None:
+    """Attach processed files to the video and mark the upload as done."""
+
+    video.source = FieldFile(video, video.source, processed.source)
+    video.thumbnail = FieldFile(video, video.thumbnail, processed.thumbnail)
+    video.first_frame = FieldFile(video, video.first_frame, processed.first_frame)
+    video.images = processed.images
+    video.sprites = FieldFile(video, video.sprites, processed.sprites)
+    video.width = processed.width
+    video.height = processed.height
+    video.duration = processed.duration
 
     video.save()
     video_created.send(handle_upload, video=video)
 
     upload.video = video
     upload.is_done = True
+    upload.stage = Upload.Stage.PUBLISHED
     upload.save()
 
+    transaction.on_commit(lambda: report_upload_stage(upload, video.id))
+
+
+def report_upload_stage(upload: Upload, video_id: int | None = None) -> None:
+    """Report the last completed stage of the upload as its progress, see set_upload_progress."""
+
+    set_upload_progress(
+        upload.id,
+        upload.profile.user_id,
+        upload.stage,
+        0 if upload.stage == Upload.Stage.PENDING else 100,
+        video_id,
+    )
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def delete_video_dir(video_id: int, dir: str | None = None) -> None:
+    """Remove the directory of the deleted video, unless videos of other uploads share it."""
+
+    if dir is None:
+        dir = get_video_dir(video_id)
+
+    if release_processed_media(dir):
+        remove_dir(dir)
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def assemble_upload_session(session_id: int) -> None:
+    """
+    Concatenate chunks of the finalized upload session into the file of a new upload and handle it.
+    If the file is not a valid video, it is deleted and the errors are recorded on the session.
+    """
+
+    session = UploadSession.objects.get(id=session_id)
+
+    if session.upload_id is not None or session.errors is not None:
+        return
+
+    _, chunk_names = default_storage.listdir(get_upload_session_dir(session.id))
+    content_hash = hashlib.sha256()
+    name = concatenate_files(
+        [
+            get_upload_session_chunk_name(session.id, int(chunk_name))
+            for chunk_name in sorted(chunk_names)
+        ],
+        get_unique_upload_name(session.filename),
+        hash=content_hash,
+    )
+
+    try:
+        probe = probe_video(get_storage_file_location(name))
+        validate_video_duration_in_seconds(get_duration(probe))
+    except ffmpeg.Error:
+        errors = {"file": ["File is not a valid video."]}
+    except ValidationError as error:
+        errors = {"file": error.messages}
+    else:
+        errors = None
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+
+        if session.upload_id is None and errors is None:
+            upload = Upload.objects.create(
+                profile_id=session.profile_id,
+                file=name,
+                filename=session.filename,
+                probe=probe,
+                content_hash=content_hash.hexdigest(),
+            )
+            session.upload = upload
+            session.save()
+
+            handle_upload.delay_on_commit(upload.id, session.profile_id)
+            delete_upload_session_dir.delay_on_commit(session.id)
+            return
+
+        if session.upload_id is None:
+            session.errors = errors
+            session.save()
+
+    # the file is invalid, or another run of the task created the upload from a file of its own
+    default_storage.delete(name)
+
 
 @shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
-def delete_video_dir(video_id: int) -> None:
-    dir = get_video_dir(video_id)
-    remove_dir(dir)
+def delete_upload_session_dir(session_id: int) -> None:
+    remove_dir(get_upload_session_dir(session_id))
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=10)
+def abort_presigned_upload(name: str, multipart_upload_id: str) -> None:
+    if isinstance(default_storage, S3Storage):
+        abort_multipart_upload(name, multipart_upload_id, default_storage)
+
+
+@shared_task
+def cleanup_expired_upload_sessions() -> None:
+    expiration_date = timezone.now() - timedelta(
+        hours=UPLOAD_SESSION_EXPIRATION_TIME_HOURS
+    )
+
+    UploadSession.objects.filter(creation_date__lt=expiration_date).delete()
+    PresignedUpload.objects.filter(creation_date__lt=expiration_date).delete()
 
 
 @shared_task()
@@ -79,6 +664,136 @@ def update_comment_popularity_scores() -> None:
     Comment.objects.bulk_update(comments, ["popularity_score"])
 
 
+@shared_task
+def reconcile_video_counters() -> None:
+    """
+    Repair counters of videos that drifted from the counts of their related objects,
+    e.g. views deleted along with their profiles or objects created in bulk.
+    The counters are recomputed in the update itself, so increments made meanwhile aren't lost.
+    """
+
+    counts = get_video_counter_subqueries()
+
+    drifted_video_ids = list(
+        Video.objects.annotate(
+            **{f"actual_{counter}": count for counter, count in counts.items()}
+        )
+        .exclude(**{counter: F(f"actual_{counter}") for counter in counts})
+        .values_list("id", flat=True)
+    )
+
+    if drifted_video_ids:
+        Video.objects.filter(id__in=drifted_video_ids).update(
+            **get_video_counter_subqueries()
+        )
+
+
+@shared_task
+def flush_buffered_views() -> None:
+    """
+    Store views buffered by the view endpoint in batches, see VIEW_WRITE_BEHIND setting.
+    A batch is removed from the buffer only once it's stored, so a failed flush is retried by the next one.
+    At most VIEW_BUFFER_MAX_BATCHES_PER_FLUSH are stored, the views left are flushed by the next run.
+    """
+
+    with lock_view_buffer() as locked:
+        if not locked:
+            return
+
+        settled = settle_view_buffer()
+
+        for _ in range(VIEW_BUFFER_MAX_BATCHES_PER_FLUSH):
+            views, position = get_buffered_views(VIEW_BUFFER_BATCH_SIZE, settled)
+            if position is None:
+                break
+
+            remove_buffered_views(store_buffered_views(views, position))
+
+        # views expire from the buffer before their batches are forgotten
+        StoredViewBatch.objects.filter(
+            creation_date__lt=timezone.now()
+            - timedelta(seconds=VIEW_BUFFER_EXPIRATION_SECONDS)
+        ).delete()
+
+
+def store_buffered_views(views: list[BufferedView], end: int) -> int:
+    """
+    Insert views and history entries of buffered views, and add the counted views to the counters of their videos.
+    Views of videos or profiles deleted since they were buffered are dropped. Returns the position to remove
+    the views from the buffer up to, that of the batch stored before if it was, see StoredViewBatch.
+
+    Parameters:
+        views (list[BufferedView]): Views read from the buffer
+        end (int): Position of the buffer the views end at
+    """
+
+    if not views:
+        return end
+
+    batch_key = views[0].id
+    video_ids = set(
+        Video.objects.filter(id__in={view.video_id for view in views}).values_list(
+            "id", flat=True
+        )
+    )
+    profile_ids = set(
+        apps.get_model(settings.PROFILE_MODEL)
+        .objects.filter(
+            id__in={view.profile_id for view in views if view.profile_id is not None}
+        )
+        .values_list("id", flat=True)
+    )
+    views = [
+        view
+        for view in views
+        if view.video_id in video_ids
+        and (view.profile_id is None or view.profile_id in profile_ids)
+    ]
+    counted_views = [view for view in views if view.is_counted]
+    view_counts = Counter(view.video_id for view in counted_views)
+
+    with transaction.atomic():
+        batch, is_created = StoredViewBatch.objects.get_or_create(
+            key=batch_key, defaults={"end": end}
+        )
+        if not is_created:
+            return batch.end
+
+        # bulk_create doesn't send post_save, so the counters are updated here
+        View.objects.bulk_create(
+            View(
+                video_id=view.video_id,
+                profile_id=view.profile_id,
+                session_id=view.session_id,
+                creation_date=view.creation_date,
+            )
+            for view in counted_views
+        )
+        HistoryEntry.objects.bulk_create(
+            HistoryEntry(
+                video_id=view.video_id,
+                profile_id=view.profile_id,
+                creation_date=view.creation_date,
+            )
+            for view in views
+            if view.profile_id is not None
+        )
+
+        if view_counts:
+            Video.objects.filter(id__in=view_counts).update(
+                view_count=F("view_count")
+                + Case(
+                    *(
+                        When(id=video_id, then=Value(count))
+                        for video_id, count in view_counts.items()
+                    ),
+                    default=Value(0),
+                )
+            )
+
+    return end
+
+
 @shared_task
 def sync_recommender_system_data() -> None:
     gorse = get_gorse_client()
@@ -202,7 +917,101 @@ def get_upload_file_location(upload: Upload) -> str:
         return upload.file.url
 
 
+def get_upload_renditions(upload: Upload) -> list[Rendition]:
+    return get_file_renditions(upload.file.name, upload.probe)
+
+
+def get_file_renditions(name: str, probe: dict) -> list[Rendition]:
+    """
+    Returns HLS renditions of the file in the default storage, planned per title
+    if TRANSCODE_PER_TITLE_LADDER is enabled, see plan_renditions.
+    """
+
+    if settings.TRANSCODE_PER_TITLE_LADDER:
+        return plan_vertical_renditions(get_storage_file_location(name), probe)
+
+    return get_vertical_renditions(probe)
+
+
+def get_ffmpeg_input(name: str) -> tuple[str, bool]:
+    """
+    Returns the input of ffmpeg for the file in the default storage and whether it is
+    piped from the storage, see TRANSCODE_STREAMING_INGEST and is_streamable.
+    """
+
+    if settings.TRANSCODE_STREAMING_INGEST and is_streamable(name):
+        return name, True
+
+    return get_storage_file_location(name), False
+
+
+def get_storage_file_location(name: str) -> str:
+    """
+    Returns the location of the file in the default storage. If the file is stored locally,
+    the function returns the filesystem path. If the file is stored in cloud storage,
+    it returns the file's URL.
+    """
+
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return default_storage.url(name)
+
+
 def get_video_dir(video_id: int) -> str:
     """Returns the path to the folder storing the video's associated files."""
 
     return f"videos/{video_id}/"
+
+
+def get_upload_output_dir(upload_id: int) -> str:
+    """Returns the path to the folder storing the files of the upload transcoded in chunks."""
+
+    return f"videos/uploads/{upload_id}/"
+
+
+def get_upload_chunks_dir(upload_id: int) -> str:
+    """Returns the path to the folder storing the chunks of the upload being transcoded."""
+
+    return f"chunks/{upload_id}/"
+
+
+def get_upload_session_dir(session_id: int) -> str:
+    """Returns the path to the folder storing the chunks received by the upload session."""
+
+    return f"upload_sessions/{session_id}/"
+
+
+def get_upload_session_chunk_name(session_id: int, start: int) -> str:
+    """
+    Returns the name of the upload session's chunk starting at the given offset.
+    Names are zero-padded, so sorting them sorts the chunks by offset.
+    """
+
+    return f"{get_upload_session_dir(session_id)}{start:012d}"
+
+
+def get_unique_upload_name(filename: str) -> str:
+    """
+    Returns name of a new file of an upload, unique even on storages overwriting files of the same name.
+    The filename of the client is kept in Upload.filename.
+    """
+
+    return Upload._meta.get_field("file").generate_filename(
+        None, f"{uuid4().hex}{Path(filename).suffix}"
+    )
+
+
+def get_video_source_dir(video: Video) -> str | None:
+    """Returns the path to the folder containing the video's source, if it has one."""
+
+    if not video.source:
+        return None
+
+    return get_source_dir(video.source.name)
+
+
+def get_source_dir(source: str) -> str:
+    """Returns the path to the folder containing the HLS master playlist and the files next to it."""
+
+    return str(Path(source).parent) + "/"
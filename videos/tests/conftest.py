@@ -6,6 +6,8 @@ from typing import BinaryIO, Generator
 import ffmpeg
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.db.models import signals
 
 from videos.models import Event, Video
@@ -17,13 +19,20 @@ from videos.signals.handlers import (
     on_post_save_user_insert_into_recommender,
     on_video_created_insert_into_recommender,
 )
+from videos.storage import delete_dir, get_s3_client
 
 
 @pytest.fixture
 def generate_blank_video(generate_blank_image):
     @contextmanager
     def do_generate_blank_video(
-        *, width: int, height: int, duration: int, format: str, add_audio: bool = False
+        *,
+        width: int,
+        height: int,
+        duration: int,
+        format: str,
+        add_audio: bool = False,
+        keyframe_interval: int | None = None,
     ) -> Generator[BinaryIO, None, None]:
         image = generate_blank_image(width=width, height=height, format="PNG")
 
@@ -39,12 +48,15 @@ def generate_blank_video(generate_blank_image):
                 audio = ffmpeg.input("anullsrc", f="lavfi")
                 streams.append(audio)
 
+            options = {"g": keyframe_interval} if keyframe_interval else {}
+
             ffmpeg.output(
                 *streams,
                 str(output_path),
                 t=duration,
                 pix_fmt="yuv420p",
                 r=1,
+                **options,
             ).run(input=image.read())
 
             with open(output_path, "rb") as file:
@@ -59,6 +71,34 @@ def temp_dir():
         yield Path(temp_dir)
 
 
+@pytest.fixture
+def s3_storage(settings):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "storages.backends.s3.S3Storage",
+            "OPTIONS": settings.TEST_S3_STORAGE_OPTIONS,
+        },
+    }
+
+    client = get_s3_client(default_storage)
+    try:
+        client.create_bucket(Bucket=default_storage.bucket_name)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    yield default_storage
+
+    delete_dir("uploads")
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # upload progress is kept in the cache, whose contents would leak between tests
+    yield
+    cache.clear()
+
+
 @pytest.fixture(autouse=True)
 def disconnect_recommender_signal_receivers(request):
     if "recommender" in request.keywords:
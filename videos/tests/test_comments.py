@@ -426,6 +426,19 @@ class TestDeleteComment:
         assert initial_count == 3
         assert Comment.objects.count() == 0
 
+    def test_decrements_video_comment_count(self, authenticate, user, delete_comment):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+        video = baker.make(Video)
+        comment = baker.make(Comment, profile=profile, video=video)
+        baker.make(Comment, parent=comment, video=video)
+        baker.make(Comment, video=video)
+
+        delete_comment(comment.id)
+
+        video.refresh_from_db()
+        assert video.comment_count == 1
+
 
 @pytest.mark.django_db
 class TestListComments:
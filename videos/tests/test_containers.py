@@ -0,0 +1,104 @@
+import struct
+from io import BytesIO
+
+from videos.containers import (
+    get_file_reader,
+    get_iso_media_duration,
+    is_moov_before_mdat,
+    iter_boxes,
+)
+
+
+def make_box(type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), type) + payload
+
+
+def make_mvhd(timescale: int, duration: int, version: int = 0) -> bytes:
+    if version == 0:
+        payload = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration)
+    else:
+        payload = struct.pack(">B3xQQIQ", 1, 0, 0, timescale, duration)
+    return make_box(b"mvhd", payload + b"\x00" * 80)
+
+
+def get_reader(content: bytes):
+    return get_file_reader(BytesIO(content))
+
+
+class TestIterBoxes:
+    def test_yields_top_level_boxes(self):
+        content = make_box(b"ftyp", b"isom") + make_box(b"free") + make_box(b"mdat")
+
+        types = [box.type for box in iter_boxes(get_reader(content))]
+
+        assert types == [b"ftyp", b"free", b"mdat"]
+
+    def test_box_with_64_bit_size(self):
+        content = struct.pack(">I4sQ", 1, b"mdat", 20) + b"x" * 4 + make_box(b"moov")
+
+        boxes = list(iter_boxes(get_reader(content)))
+
+        assert [box.type for box in boxes] == [b"mdat", b"moov"]
+        assert boxes[0].start == 16
+        assert boxes[0].end == 20
+
+    def test_stops_at_malformed_header(self):
+        content = make_box(b"ftyp") + struct.pack(">I4s", 4, b"free")
+
+        types = [box.type for box in iter_boxes(get_reader(content))]
+
+        assert types == [b"ftyp"]
+
+
+class TestIsMoovBeforeMdat:
+    def test_moov_before_mdat(self):
+        content = make_box(b"ftyp") + make_box(b"moov") + make_box(b"mdat")
+
+        assert is_moov_before_mdat(get_reader(content))
+
+    def test_moov_after_mdat(self):
+        content = make_box(b"ftyp") + make_box(b"mdat") + make_box(b"moov")
+
+        assert not is_moov_before_mdat(get_reader(content))
+
+
+class TestGetIsoMediaDuration:
+    def test_moov_at_start(self):
+        content = (
+            make_box(b"ftyp", b"isom")
+            + make_box(b"moov", make_mvhd(1000, 90500))
+            + make_box(b"mdat", b"x" * 1000)
+        )
+
+        assert get_iso_media_duration(get_reader(content)) == 90.5
+
+    def test_moov_at_end(self):
+        content = (
+            make_box(b"ftyp", b"isom")
+            + make_box(b"mdat", b"x" * 1000)
+            + make_box(b"moov", make_box(b"free") + make_mvhd(600, 1200))
+        )
+
+        assert get_iso_media_duration(get_reader(content)) == 2
+
+    def test_mvhd_version_1(self):
+        content = make_box(b"ftyp", b"isom") + make_box(
+            b"moov", make_mvhd(90000, 2**32 + 90000, version=1)
+        )
+
+        assert get_iso_media_duration(get_reader(content)) == (2**32 + 90000) / 90000
+
+    def test_if_duration_is_not_in_header_returns_none(self):
+        content = make_box(b"ftyp", b"isom") + make_box(b"moov", make_mvhd(1000, 0))
+
+        assert get_iso_media_duration(get_reader(content)) is None
+
+    def test_if_file_is_not_iso_media_returns_none(self):
+        content = b"RIFF" + b"\x00" * 100
+
+        assert get_iso_media_duration(get_reader(content)) is None
+
+    def test_if_moov_is_missing_returns_none(self):
+        content = make_box(b"ftyp", b"isom") + make_box(b"mdat", b"x" * 100)
+
+        assert get_iso_media_duration(get_reader(content)) is None
@@ -207,6 +207,8 @@ class TestGroupedByDate:
                             if entry.video.first_frame
                             else None
                         ),
+                        "images": [],
+                        "sprites": None,
                         "view_count": 0,
                         "like_count": 0,
                         "is_liked": False,
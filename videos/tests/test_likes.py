@@ -89,6 +89,16 @@ class TestCreateLike:
         assert response.status_code == status.HTTP_201_CREATED
         assert response.data["id"] > 0
 
+    def test_increments_video_like_count(self, authenticate, user, create_like):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        video = baker.make(Video)
+
+        create_like({"video": video.id})
+
+        video.refresh_from_db()
+        assert video.like_count == 1
+
     def test_cannot_create_duplicate_like(self, authenticate, user, create_like):
         authenticate(user=user)
         baker.make(settings.PROFILE_MODEL, user=user)
@@ -154,6 +164,8 @@ class TestRetrieveLike:
                 "first_frame": (
                     like.video.first_frame.url if like.video.first_frame else None
                 ),
+                "images": [],
+                "sprites": None,
                 "view_count": 0,
                 "like_count": 1,
                 "is_liked": False,
@@ -245,6 +257,8 @@ class TestListLikes:
                 "source": video.source.url if video.source else None,
                 "thumbnail": video.thumbnail.url if video.thumbnail else None,
                 "first_frame": video.first_frame.url if video.first_frame else None,
+                "images": [],
+                "sprites": None,
                 "view_count": 0,
                 "like_count": 1,
                 "is_liked": False,
@@ -407,3 +421,15 @@ class TestRemoveLike:
         assert response1.status_code == status.HTTP_200_OK
         assert response2.status_code == status.HTTP_200_OK
         assert response3.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_decrements_video_like_count(self, authenticate, user, remove_like):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+        video = baker.make(Video)
+        baker.make(Like, video=video, profile=profile)
+        baker.make(Like, video=video)
+
+        remove_like(video.id)
+
+        video.refresh_from_db()
+        assert video.like_count == 1
@@ -71,6 +71,8 @@ class TestListNotifications:
                     if notification.video.first_frame
                     else None
                 ),
+                "images": [],
+                "sprites": None,
                 "view_count": 0,
                 "like_count": 0,
                 "is_liked": False,
@@ -162,6 +164,8 @@ class TestListNotifications:
                     if notification.video.first_frame
                     else None
                 ),
+                "images": [],
+                "sprites": None,
                 "view_count": 0,
                 "like_count": 0,
                 "is_liked": False,
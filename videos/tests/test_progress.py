@@ -0,0 +1,53 @@
+from videos import progress
+from videos.progress import (
+    TRANSCODING_STAGE,
+    get_progress_reporter,
+    get_upload_progress,
+    report_chunk_transcoded,
+    set_upload_progress,
+)
+
+
+class TestSetUploadProgress:
+    def test_percent_is_clamped(self):
+        set_upload_progress(1, 2, TRANSCODING_STAGE, 120)
+
+        assert get_upload_progress(1) == {
+            "user_id": 2,
+            "stage": TRANSCODING_STAGE,
+            "percent": 100,
+            "video": None,
+        }
+
+
+class TestGetProgressReporter:
+    def test_reports_are_throttled(self, monkeypatch):
+        now = 0.0
+        monkeypatch.setattr(progress, "monotonic", lambda: now)
+        report = get_progress_reporter(1, 2, duration=10)
+
+        report(1)
+        now = 0.5
+        report(2)
+
+        assert get_upload_progress(1)["percent"] == 10
+
+        now = 1.5
+        report(3)
+
+        assert get_upload_progress(1)["percent"] == 30
+
+
+class TestReportChunkTranscoded:
+    def test_reports_share_of_transcoded_chunks(self):
+        set_upload_progress(1, 2, TRANSCODING_STAGE, 0)
+
+        report_chunk_transcoded(1, 4)
+        report_chunk_transcoded(1, 4)
+
+        assert get_upload_progress(1)["percent"] == 50
+
+    def test_if_upload_has_no_progress_does_nothing(self):
+        report_chunk_transcoded(1, 4)
+
+        assert get_upload_progress(1) is None
@@ -182,6 +182,8 @@ class TestRetrieveSavedVideo:
                     if saved_video.video.first_frame
                     else None
                 ),
+                "images": [],
+                "sprites": None,
                 "view_count": 0,
                 "like_count": 0,
                 "is_liked": False,
@@ -266,6 +268,8 @@ class TestListSavedVideos:
                     if saved_video.video.first_frame
                     else None
                 ),
+                "images": [],
+                "sprites": None,
                 "view_count": 0,
                 "like_count": 0,
                 "is_liked": False,
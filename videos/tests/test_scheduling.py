@@ -0,0 +1,53 @@
+import pytest
+
+from videos import scheduling
+from videos.constants import MAX_VIDEO_DURATION_SECONDS
+from videos.scheduling import (
+    get_ffmpeg_threads,
+    get_lowest_priority,
+    get_upload_priority,
+)
+
+
+class TestGetUploadPriority:
+    def test_shorter_uploads_have_lower_priority(self):
+        assert get_upload_priority(1) < get_upload_priority(30)
+        assert get_upload_priority(30) < get_upload_priority(60)
+
+    @pytest.mark.parametrize(
+        "duration, priority", [(0, 0), (MAX_VIDEO_DURATION_SECONDS, 9), (10**6, 9)]
+    )
+    def test_priority_is_within_priority_steps(self, duration, priority):
+        assert get_upload_priority(duration) == priority
+
+
+class TestGetLowestPriority:
+    def test_is_served_after_all_uploads(self):
+        assert get_lowest_priority() >= get_upload_priority(10**6)
+
+
+class TestGetFfmpegThreads:
+    @pytest.fixture(autouse=True)
+    def cpu_count(self, monkeypatch):
+        monkeypatch.setattr(scheduling.os, "cpu_count", lambda: 8)
+
+    def test_divides_cores_between_concurrent_tasks(self, monkeypatch):
+        monkeypatch.setattr(scheduling, "worker_concurrency", 2)
+
+        assert get_ffmpeg_threads() == 4
+        assert get_ffmpeg_threads(processes=4) == 1
+
+    def test_uses_at_least_one_thread(self, monkeypatch):
+        monkeypatch.setattr(scheduling, "worker_concurrency", 16)
+
+        assert get_ffmpeg_threads() == 1
+
+    def test_if_outside_worker_uses_all_cores(self, monkeypatch):
+        monkeypatch.setattr(scheduling, "worker_concurrency", None)
+
+        assert get_ffmpeg_threads() == 8
+
+    def test_setting_overrides_budget(self, settings):
+        settings.FFMPEG_THREADS = 3
+
+        assert get_ffmpeg_threads() == 3
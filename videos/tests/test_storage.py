@@ -0,0 +1,166 @@
+import hashlib
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from videos.storage import (
+    concatenate_files,
+    delete_dir,
+    get_content_hash,
+    read_file_range,
+    replace_file,
+    save_files,
+    stream_file,
+)
+from videos.utils import remove_dir, save_dir
+
+
+class TestSaveFiles:
+    def test_files_are_saved(self, temp_dir):
+        paths = []
+        for index in range(20):
+            path = temp_dir / f"segment_{index}.ts"
+            path.write_bytes(b"x" * index)
+            paths.append(path)
+
+        stored_files = save_files([(path, f"output/{path.name}") for path in paths])
+
+        assert len(stored_files) == 20
+        for path in paths:
+            assert (settings.MEDIA_ROOT / "output" / path.name).read_bytes() == (
+                path.read_bytes()
+            )
+
+    def test_reports_size_and_time_of_each_file(self, temp_dir):
+        path = temp_dir / "file.ts"
+        path.write_bytes(b"x" * 100)
+
+        stored_files = save_files([(path, "output/file.ts")])
+
+        assert stored_files[0].name == "output/file.ts"
+        assert stored_files[0].size == 100
+        assert stored_files[0].seconds >= 0
+
+
+class TestSaveDir:
+    def test_directory_is_saved_recursively(self, temp_dir):
+        (temp_dir / "subdir").mkdir()
+        (temp_dir / "file1.txt").write_text("1")
+        (temp_dir / "subdir" / "file2.txt").write_text("2")
+
+        save_dir(temp_dir, "output")
+
+        assert default_storage.exists("output/file1.txt")
+        assert default_storage.exists("output/subdir/file2.txt")
+        assert (
+            settings.MEDIA_ROOT / "output" / "subdir" / "file2.txt"
+        ).read_text() == "2"
+
+
+class TestReplaceFile:
+    def test_file_is_replaced(self, temp_dir):
+        name = default_storage.save("output/playlist.m3u8", ContentFile(b"old"))
+        path = temp_dir / "playlist.m3u8"
+        path.write_bytes(b"new")
+
+        replace_file(path, name)
+
+        assert (settings.MEDIA_ROOT / name).read_bytes() == b"new"
+        assert default_storage.listdir("output") == ([], ["playlist.m3u8"])
+
+    def test_missing_file_is_created(self, temp_dir):
+        path = temp_dir / "playlist.m3u8"
+        path.write_bytes(b"new")
+
+        replace_file(path, "output/playlist.m3u8")
+
+        assert (settings.MEDIA_ROOT / "output" / "playlist.m3u8").read_bytes() == b"new"
+
+
+class TestDeleteDir:
+    def test_directory_is_deleted_recursively(self, temp_dir):
+        (temp_dir / "subdir").mkdir()
+        (temp_dir / "file1.txt").write_text("1")
+        (temp_dir / "subdir" / "file2.txt").write_text("2")
+        save_dir(temp_dir, "output")
+
+        count = delete_dir("output")
+
+        assert count == 2
+        assert not (settings.MEDIA_ROOT / "output").exists()
+
+    def test_missing_directory_is_ignored(self):
+        assert delete_dir("missing") == 0
+
+
+class TestRemoveDir:
+    def test_directory_is_removed(self, temp_dir):
+        (temp_dir / "file.txt").write_text("1")
+        save_dir(temp_dir, "output")
+
+        remove_dir("output")
+        remove_dir("output")
+
+        assert not default_storage.exists("output/file.txt")
+
+
+class TestReadFileRange:
+    def test_reads_range(self):
+        name = default_storage.save("file.bin", ContentFile(bytes(range(100))))
+
+        assert read_file_range(name, 10, 5) == bytes(range(10, 15))
+
+    def test_range_past_end_of_file_is_truncated(self):
+        name = default_storage.save("file.bin", ContentFile(bytes(range(100))))
+
+        assert read_file_range(name, 95, 10) == bytes(range(95, 100))
+
+
+class TestStreamFile:
+    def test_file_is_read_in_blocks(self, settings):
+        settings.STORAGE_READ_BLOCK_SIZE = 10
+        settings.STORAGE_READ_AHEAD_BLOCKS = 2
+        content = bytes(range(256)) * 4
+        name = default_storage.save("file.bin", ContentFile(content))
+
+        blocks = list(stream_file(name))
+
+        assert b"".join(blocks) == content
+        assert all(len(block) <= 10 for block in blocks)
+
+    def test_stream_can_be_closed_early(self, settings):
+        settings.STORAGE_READ_BLOCK_SIZE = 10
+        settings.STORAGE_READ_AHEAD_BLOCKS = 1
+        name = default_storage.save("file.bin", ContentFile(b"x" * 1000))
+
+        stream = stream_file(name)
+        next(stream)
+        stream.close()
+
+    def test_missing_file_raises_error(self):
+        stream = stream_file("missing.bin")
+
+        with pytest.raises(FileNotFoundError):
+            next(stream)
+
+
+class TestConcatenateFiles:
+    def test_hash_of_concatenated_file_is_computed(self, settings):
+        settings.STORAGE_READ_BLOCK_SIZE = 10
+        first = default_storage.save("part1.bin", ContentFile(b"a" * 25))
+        second = default_storage.save("part2.bin", ContentFile(b"b" * 25))
+        hash = hashlib.sha256()
+
+        name = concatenate_files([first, second], "file.bin", hash=hash)
+
+        with default_storage.open(name) as file:
+            content = file.read()
+        assert content == b"a" * 25 + b"b" * 25
+        assert hash.hexdigest() == hashlib.sha256(content).hexdigest()
+
+
+class TestGetContentHash:
+    def test_hash_does_not_depend_on_blocks(self):
+        assert get_content_hash([b"ab", b"c"]) == get_content_hash([b"a", b"bc"])
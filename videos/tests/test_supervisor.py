@@ -0,0 +1,93 @@
+import sys
+from time import monotonic
+
+import ffmpeg
+import pytest
+
+from videos.supervisor import (
+    CPU_TIME,
+    TIMEOUT,
+    CommandKilled,
+    ResourceLimits,
+    get_kill_counts,
+    get_media_limits,
+    run_supervised,
+)
+
+
+def read_output(output):
+    return output.read()
+
+
+class TestGetMediaLimits:
+    def test_time_limits_grow_with_duration(self, settings):
+        settings.MEDIA_COMMAND_TIME_LIMIT_BASE_SECONDS = 60
+        settings.MEDIA_COMMAND_TIME_LIMIT_SECONDS_PER_SECOND = 10
+        settings.MEDIA_COMMAND_CPU_TIME_LIMIT_SECONDS_PER_SECOND = 40
+
+        limits = get_media_limits(10)
+
+        assert limits.wall_time == 160
+        assert limits.cpu_time == 460
+        assert get_media_limits(20).wall_time > limits.wall_time
+
+    def test_unknown_duration_gets_limits_of_longest_video(self):
+        assert get_media_limits().wall_time >= get_media_limits(60).wall_time
+
+
+class TestRunSupervised:
+    def test_output_is_returned(self):
+        output = run_supervised(
+            [sys.executable, "-c", "import sys; sys.stdout.write(sys.stdin.read())"],
+            ResourceLimits(wall_time=10, cpu_time=10, memory=None),
+            input_stream=[b"a", b"b"],
+            read_stdout=read_output,
+        )
+
+        assert output == b"ab"
+
+    def test_failure_raises_error_with_stderr(self):
+        with pytest.raises(ffmpeg.Error) as exc_info:
+            run_supervised(
+                [sys.executable, "-c", "import sys; sys.exit('failed')"],
+                ResourceLimits(wall_time=10, cpu_time=10, memory=None),
+            )
+
+        assert not isinstance(exc_info.value, CommandKilled)
+        assert b"failed" in exc_info.value.stderr
+
+    def test_process_group_is_killed_on_timeout(self):
+        start = monotonic()
+
+        # the shell waits for its child, which must be killed as well
+        with pytest.raises(CommandKilled) as exc_info:
+            run_supervised(
+                ["sh", "-c", "sleep 30 & wait"],
+                ResourceLimits(wall_time=0.5, cpu_time=None, memory=None),
+                read_stdout=read_output,
+            )
+
+        assert exc_info.value.reason == TIMEOUT
+        assert monotonic() - start < 10
+        assert get_kill_counts()[TIMEOUT] == 1
+
+    def test_process_is_killed_when_out_of_cpu_time(self):
+        with pytest.raises(CommandKilled) as exc_info:
+            run_supervised(
+                [sys.executable, "-c", "while True: pass"],
+                ResourceLimits(wall_time=30, cpu_time=1, memory=None),
+            )
+
+        assert exc_info.value.reason == CPU_TIME
+        assert get_kill_counts()[CPU_TIME] == 1
+
+    def test_memory_is_limited(self):
+        limit = 512 * 1024 * 1024
+
+        with pytest.raises(ffmpeg.Error) as exc_info:
+            run_supervised(
+                [sys.executable, "-c", f"bytearray({limit})"],
+                ResourceLimits(wall_time=30, cpu_time=None, memory=limit),
+            )
+
+        assert b"MemoryError" in exc_info.value.stderr
@@ -1,19 +1,44 @@
+import hashlib
 from datetime import datetime, timedelta
+from unittest.mock import Mock
 
 import pytest
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from model_bakery import baker
 
-from videos.models import Event, Video
+from videos.models import (
+    Comment,
+    Event,
+    HistoryEntry,
+    Like,
+    ProcessedMedia,
+    Upload,
+    Video,
+    View,
+)
 from videos.tasks import (
+    delete_video_dir,
     delete_user_from_recommender_system,
     delete_video_from_recommender_system,
+    encode_remaining_renditions,
+    flush_buffered_views,
+    handle_upload,
     insert_feedback_in_recommender_system,
     insert_user_in_recommender_system,
     insert_video_in_recommender_system,
+    probe_upload,
+    reconcile_video_counters,
     sync_recommender_system_data,
+    transcode_upload,
 )
+from videos.signals import video_updated
+from videos.video_processing import VideoChunk
+from videos.view_buffer import VIEW_BUFFER_TAIL_KEY, BufferedView, buffer_view
 
 
 USER_MODEL = get_user_model()
@@ -190,3 +215,397 @@ class TestInsertFeedbackInRecommenderSystem:
         assert len(initial_feedbacks) == 0
         assert len(feedbacks) == 1
         assert is_feedback_correctly_inserted_in_gorse(event, feedbacks[0])
+
+
+@pytest.mark.django_db
+class TestHandleUpload:
+    processed = {
+        "source": "videos/uploads/1/playlist.m3u8",
+        "thumbnail": "videos/uploads/1/thumbnail.jpg",
+        "first_frame": "videos/uploads/1/first_frame.jpg",
+        "width": 720,
+        "height": 1280,
+        "duration": 10.0,
+        "images": [
+            {
+                "name": "videos/uploads/1/image_180.webp",
+                "width": 180,
+                "height": 320,
+                "format": "webp",
+            }
+        ],
+        "sprites": "videos/uploads/1/sprites.vtt",
+    }
+
+    def test_if_upload_is_transcoded_publishes_video(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            filename="video.mp4",
+            stage=Upload.Stage.TRANSCODED,
+            processed=self.processed,
+        )
+
+        handle_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        assert upload.stage == Upload.Stage.PUBLISHED
+        assert upload.is_done == True
+        assert upload.video.title == "video"
+        assert upload.video.source.name == self.processed["source"]
+        assert upload.video.height == 1280
+        assert upload.video.duration == 10.0
+        assert upload.video.images == self.processed["images"]
+        assert upload.video.sprites.name == self.processed["sprites"]
+
+    def test_if_only_smallest_rendition_is_transcoded_encodes_others_later(
+        self, django_capture_on_commit_callbacks
+    ):
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            stage=Upload.Stage.TRANSCODED,
+            processed={**self.processed, "height": 256, "is_complete": False},
+        )
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            handle_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        assert upload.is_done == True
+        assert upload.video.height == 256
+        assert any(
+            getattr(getattr(callback, "func", None), "__self__", None)
+            == encode_remaining_renditions
+            for callback in callbacks
+        )
+
+    def test_if_video_is_edited_before_remaining_renditions_are_encoded_encodes_them(
+        self, generate_blank_video, django_capture_on_commit_callbacks, settings
+    ):
+        settings.TRANSCODE_PROGRESSIVE_PUBLISH = True
+        # a blank video could leave only the smallest rendition in a per-title ladder
+        settings.TRANSCODE_PER_TITLE_LADDER = False
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(Upload, profile=profile, filename="video.mp4")
+        with generate_blank_video(
+            width=320, height=240, duration=1, format="mp4"
+        ) as video:
+            upload.file.save("video.mp4", File(video))
+        probe_upload(upload)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            transcode_upload.apply([upload.id, profile.id])
+        upload.refresh_from_db()
+        video_updated.send(None, video=upload.video)
+        for callback in callbacks:
+            if (
+                getattr(callback, "func", None)
+                == encode_remaining_renditions.apply_async
+            ):
+                encode_remaining_renditions.apply(*callback.args)
+
+        upload.video.refresh_from_db()
+        assert upload.processed["is_complete"] == False
+        assert upload.video.height == 240
+        assert not Upload.objects.filter(id=upload.id).exists()
+
+    def test_if_chunks_are_dispatched_retried_transcoding_does_nothing(
+        self, monkeypatch, settings
+    ):
+        settings.TRANSCODE_CHUNKING_THRESHOLD_SECONDS = 30
+        settings.TRANSCODE_PER_TITLE_LADDER = False
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            file="uploads/video.mp4",
+            content_hash="a" * 64,
+            stage=Upload.Stage.PROBED,
+            probe={
+                "format": {"duration": "60", "bit_rate": "2000000"},
+                "streams": [{"codec_type": "video", "width": 720, "height": 1280}],
+            },
+        )
+        chunks = [VideoChunk(index=0, path="chunk_0.mp4", start=0, duration=60)]
+        dispatched = []
+        monkeypatch.setattr(
+            "videos.tasks.split_video_into_chunks", lambda *args, **kwargs: chunks
+        )
+        monkeypatch.setattr("videos.tasks.save_dir", lambda *args: None)
+        monkeypatch.setattr(
+            "videos.tasks.chord", lambda header: lambda body: dispatched.append(body)
+        )
+
+        transcode_upload.apply([upload.id, profile.id])
+        transcode_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        assert upload.stage == Upload.Stage.CHUNKED
+        assert len(dispatched) == 1
+
+    def test_if_upload_is_published_does_nothing(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        video = baker.make(Video, profile=profile)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            video=video,
+            is_done=True,
+            stage=Upload.Stage.PUBLISHED,
+            processed=self.processed,
+        )
+
+        handle_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        assert upload.video == video
+        assert Video.objects.count() == 1
+
+    def test_if_same_file_was_transcoded_publishes_its_files(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        media = baker.make(
+            ProcessedMedia,
+            content_hash="a" * 64,
+            dir="videos/uploads/1/",
+            processed=self.processed,
+            reference_count=1,
+        )
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            filename="video.mp4",
+            stage=Upload.Stage.PROBED,
+            probe={"format": {"duration": "10"}},
+            content_hash=media.content_hash,
+        )
+
+        handle_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        media.refresh_from_db()
+        assert upload.stage == Upload.Stage.PUBLISHED
+        assert upload.video.source.name == self.processed["source"]
+        assert media.reference_count == 2
+
+    def test_if_upload_is_not_hashed_it_is_hashed_by_transcoding(self, monkeypatch):
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            file="uploads/video.mp4",
+            probe={"format": {"duration": "10"}},
+        )
+        transcoded = []
+        monkeypatch.setattr(
+            "videos.tasks.stream_file",
+            lambda *args: pytest.fail("Upload was read by handle_upload"),
+        )
+        monkeypatch.setattr(
+            transcode_upload,
+            "apply_async",
+            lambda args, **kwargs: transcoded.append(args),
+        )
+
+        handle_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        assert upload.stage == Upload.Stage.PROBED
+        assert upload.content_hash is None
+        assert transcoded == [(upload.id, profile.id)]
+
+    def test_if_same_file_was_transcoded_transcoding_publishes_its_files(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            filename="video.mp4",
+            stage=Upload.Stage.PROBED,
+            probe={"format": {"duration": "10"}},
+        )
+        upload.file.save("video.mp4", ContentFile(b"video"))
+        media = baker.make(
+            ProcessedMedia,
+            content_hash=hashlib.sha256(b"video").hexdigest(),
+            dir="videos/uploads/1/",
+            processed=self.processed,
+            reference_count=1,
+        )
+
+        transcode_upload.apply([upload.id, profile.id])
+
+        upload.refresh_from_db()
+        media.refresh_from_db()
+        assert upload.content_hash == media.content_hash
+        assert upload.stage == Upload.Stage.PUBLISHED
+        assert media.reference_count == 2
+
+    def test_publishing_registers_processed_media(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            stage=Upload.Stage.TRANSCODED,
+            processed=self.processed,
+            content_hash="a" * 64,
+        )
+
+        handle_upload.apply([upload.id, profile.id])
+
+        media = ProcessedMedia.objects.get(content_hash=upload.content_hash)
+        assert media.dir == "videos/uploads/1/"
+        assert media.reference_count == 1
+
+
+@pytest.mark.django_db
+class TestDeleteVideoDir:
+    def test_shared_dir_is_removed_with_its_last_video(self):
+        default_storage.save("videos/uploads/1/playlist.m3u8", ContentFile(b"#EXTM3U"))
+        media = baker.make(ProcessedMedia, dir="videos/uploads/1/", reference_count=2)
+
+        delete_video_dir.apply([1, media.dir])
+
+        media.refresh_from_db()
+        assert media.reference_count == 1
+        assert default_storage.exists("videos/uploads/1/playlist.m3u8")
+
+        delete_video_dir.apply([2, media.dir])
+
+        assert not ProcessedMedia.objects.filter(id=media.id).exists()
+        assert not default_storage.exists("videos/uploads/1/playlist.m3u8")
+
+
+@pytest.mark.django_db
+class TestReconcileVideoCounters:
+    def test_drifted_counters_are_repaired(self):
+        video = baker.make(Video)
+        other_video = baker.make(Video)
+        baker.make(View, video=video, _quantity=3)
+        baker.make(Like, video=video, _quantity=2)
+        baker.make(Comment, video=video)
+        baker.make(View, video=other_video)
+        Video.objects.filter(id=video.id).update(
+            view_count=0, like_count=5, comment_count=1
+        )
+
+        reconcile_video_counters.apply()
+
+        video.refresh_from_db()
+        other_video.refresh_from_db()
+        assert video.view_count == 3
+        assert video.like_count == 2
+        assert video.comment_count == 1
+        assert other_video.view_count == 1
+
+
+@pytest.mark.django_db
+class TestFlushBufferedViews:
+    def test_stores_views_and_history_entries(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        video = baker.make(Video)
+        buffer_view(BufferedView(video.id, profile.id, "a" * 32, True))
+        buffer_view(BufferedView(video.id, profile.id, "a" * 32, False))
+        buffer_view(BufferedView(video.id, None, "b" * 32, True))
+
+        flush_buffered_views.apply()
+        flush_buffered_views.apply()
+
+        video.refresh_from_db()
+        assert View.objects.filter(video=video).count() == 2
+        assert View.objects.filter(video=video, profile=profile).count() == 1
+        assert HistoryEntry.objects.filter(video=video, profile=profile).count() == 2
+        assert video.view_count == 2
+
+    def test_views_keep_their_time(self):
+        profile = baker.make(settings.PROFILE_MODEL)
+        video = baker.make(Video)
+        creation_date = timezone.now() - timedelta(hours=1)
+        buffer_view(BufferedView(video.id, profile.id, "a" * 32, True, creation_date))
+
+        flush_buffered_views.apply()
+
+        assert View.objects.get(video=video).creation_date == creation_date
+        assert HistoryEntry.objects.get(video=video).creation_date == creation_date
+
+    def test_if_stored_views_are_not_removed_they_are_not_stored_again(
+        self, monkeypatch
+    ):
+        video = baker.make(Video)
+        buffer_view(BufferedView(video.id, None, "a" * 32, True))
+        with monkeypatch.context() as context:
+            context.setattr(
+                "videos.tasks.remove_buffered_views",
+                Mock(side_effect=ConnectionError),
+            )
+            flush_buffered_views.apply()
+
+        flush_buffered_views.apply()
+
+        video.refresh_from_db()
+        assert View.objects.filter(video=video).count() == 1
+        assert video.view_count == 1
+
+    def test_views_left_after_max_batches_are_stored_by_next_flush(self, monkeypatch):
+        monkeypatch.setattr("videos.tasks.VIEW_BUFFER_BATCH_SIZE", 1)
+        monkeypatch.setattr("videos.tasks.VIEW_BUFFER_MAX_BATCHES_PER_FLUSH", 1)
+        video = baker.make(Video)
+        buffer_view(BufferedView(video.id, None, "a" * 32, True))
+        buffer_view(BufferedView(video.id, None, "b" * 32, True))
+
+        flush_buffered_views.apply()
+        initial_view_count = View.objects.count()
+        flush_buffered_views.apply()
+
+        assert initial_view_count == 1
+        assert View.objects.count() == 2
+
+    def test_views_of_deleted_videos_are_dropped(self):
+        video = baker.make(Video)
+        deleted_video = baker.make(Video)
+        buffer_view(BufferedView(video.id, None, "a" * 32, True))
+        buffer_view(BufferedView(deleted_video.id, None, "a" * 32, True))
+        deleted_video.delete()
+
+        flush_buffered_views.apply()
+
+        assert View.objects.filter(video=video).count() == 1
+        assert View.objects.count() == 1
+
+    def test_entries_after_missing_entry_are_stored_by_next_flush(self):
+        video = baker.make(Video)
+        buffer_view(BufferedView(video.id, None, "a" * 32, True))
+        # the position of an entry is taken before the entry is written
+        cache.incr(VIEW_BUFFER_TAIL_KEY)
+        buffer_view(BufferedView(video.id, None, "b" * 32, True))
+
+        flush_buffered_views.apply()
+        initial_view_count = View.objects.count()
+        flush_buffered_views.apply()
+
+        assert initial_view_count == 1
+        assert View.objects.count() == 2
+
+    def test_if_tail_is_evicted_views_not_flushed_yet_are_kept(self):
+        video = baker.make(Video)
+        buffer_view(BufferedView(video.id, None, "a" * 32, True))
+        buffer_view(BufferedView(video.id, None, "b" * 32, True))
+        cache.delete(VIEW_BUFFER_TAIL_KEY)
+        buffer_view(BufferedView(video.id, None, "c" * 32, True))
+
+        flush_buffered_views.apply()
+
+        assert View.objects.filter(video=video).count() == 3
+
+    def test_if_tail_is_evicted_after_flush_next_views_are_stored(self):
+        video = baker.make(Video)
+        buffer_view(BufferedView(video.id, None, "a" * 32, True))
+        flush_buffered_views.apply()
+        cache.delete(VIEW_BUFFER_TAIL_KEY)
+        flush_buffered_views.apply()
+        buffer_view(BufferedView(video.id, None, "b" * 32, True))
+
+        flush_buffered_views.apply()
+
+        assert View.objects.filter(video=video).count() == 2
@@ -0,0 +1,292 @@
+import pytest
+from django.conf import settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+
+from videos.models import Upload, UploadSession
+from videos.tasks import assemble_upload_session
+
+
+LIST_VIEWNAME = "videos:upload_sessions-list"
+DETAIL_VIEWNAME = "videos:upload_sessions-detail"
+CHUNKS_VIEWNAME = "videos:upload_sessions-chunks"
+FINALIZE_VIEWNAME = "videos:upload_sessions-finalize"
+MAX_VIDEO_DURATION_SECONDS = 90
+
+
+@pytest.fixture
+def create_upload_session(create_object):
+    def _create_upload_session(upload_session):
+        return create_object(LIST_VIEWNAME, upload_session)
+
+    return _create_upload_session
+
+
+@pytest.fixture
+def retrieve_upload_session(retrieve_object):
+    def _retrieve_upload_session(pk):
+        return retrieve_object(DETAIL_VIEWNAME, pk)
+
+    return _retrieve_upload_session
+
+
+@pytest.fixture
+def put_chunk(api_client):
+    def _put_chunk(pk, data: bytes, start: int, size: int):
+        return api_client.put(
+            reverse(CHUNKS_VIEWNAME, kwargs={"pk": pk}),
+            data,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{start + len(data) - 1}/{size}",
+        )
+
+    return _put_chunk
+
+
+@pytest.fixture
+def finalize_upload_session(api_client):
+    def _finalize_upload_session(pk):
+        return api_client.post(reverse(FINALIZE_VIEWNAME, kwargs={"pk": pk}))
+
+    return _finalize_upload_session
+
+
+@pytest.fixture
+def upload_video_in_chunks(create_upload_session, put_chunk):
+    def _upload_video_in_chunks(content: bytes, filename: str, chunk_size: int):
+        response = create_upload_session({"filename": filename, "size": len(content)})
+        pk = response.data["id"]
+
+        for start in range(0, len(content), chunk_size):
+            put_chunk(pk, content[start : start + chunk_size], start, len(content))
+
+        return pk
+
+    return _upload_video_in_chunks
+
+
+@pytest.mark.django_db
+class TestCreateUploadSession:
+    def test_if_user_is_anonymous_returns_401(self, create_upload_session):
+        response = create_upload_session({"filename": "video.mp4", "size": 100})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_if_video_extension_is_not_supported_returns_400(
+        self, authenticate, user, create_upload_session
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload_session({"filename": "video.mkv", "size": 100})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["filename"] is not None
+
+    def test_if_video_is_too_large_returns_400(
+        self, authenticate, user, create_upload_session
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload_session(
+            {"filename": "video.mp4", "size": 51 * 1024**2}
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["size"] is not None
+
+    def test_if_data_is_valid_returns_201(
+        self, authenticate, user, create_upload_session
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload_session({"filename": "video.mp4", "size": 100})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["id"] > 0
+        assert response.data["offset"] == 0
+
+
+@pytest.mark.django_db
+class TestPutChunk:
+    def test_chunks_are_appended(
+        self, authenticate, user, create_upload_session, put_chunk
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_upload_session({"filename": "video.mp4", "size": 20})
+        pk = response.data["id"]
+
+        put_chunk(pk, b"x" * 10, 0, 20)
+        response = put_chunk(pk, b"y" * 10, 10, 20)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["offset"] == 20
+
+    def test_if_chunk_does_not_start_at_offset_returns_409(
+        self, authenticate, user, create_upload_session, put_chunk
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_upload_session({"filename": "video.mp4", "size": 20})
+        pk = response.data["id"]
+        put_chunk(pk, b"x" * 10, 0, 20)
+
+        response = put_chunk(pk, b"x" * 10, 0, 20)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.data["offset"] == 10
+
+    def test_if_chunk_exceeds_size_returns_400(
+        self, authenticate, user, create_upload_session, put_chunk
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_upload_session({"filename": "video.mp4", "size": 10})
+        pk = response.data["id"]
+
+        response = put_chunk(pk, b"x" * 20, 0, 10)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_session_belongs_to_other_user_returns_404(
+        self, authenticate, user, other_user, put_chunk
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        session = baker.make(
+            UploadSession,
+            profile=baker.make(settings.PROFILE_MODEL, user=other_user),
+            filename="video.mp4",
+            size=10,
+        )
+
+        response = put_chunk(session.id, b"x" * 10, 0, 10)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestRetrieveUploadSession:
+    def test_returns_offset_to_resume_from(
+        self,
+        authenticate,
+        user,
+        create_upload_session,
+        put_chunk,
+        retrieve_upload_session,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_upload_session({"filename": "video.mp4", "size": 20})
+        pk = response.data["id"]
+        put_chunk(pk, b"x" * 10, 0, 20)
+
+        response = retrieve_upload_session(pk)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["offset"] == 10
+
+
+@pytest.mark.django_db
+class TestFinalizeUploadSession:
+    def test_if_upload_is_incomplete_returns_409(
+        self,
+        authenticate,
+        user,
+        create_upload_session,
+        put_chunk,
+        finalize_upload_session,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_upload_session({"filename": "video.mp4", "size": 20})
+        pk = response.data["id"]
+        put_chunk(pk, b"x" * 10, 0, 20)
+
+        response = finalize_upload_session(pk)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.data["offset"] == 10
+
+    def test_if_video_is_too_long_returns_400(
+        self,
+        authenticate,
+        user,
+        generate_blank_video,
+        upload_video_in_chunks,
+        finalize_upload_session,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        with generate_blank_video(
+            width=320, height=240, duration=MAX_VIDEO_DURATION_SECONDS + 1, format="mp4"
+        ) as video:
+            pk = upload_video_in_chunks(video.read(), "video.mp4", 1024)
+        finalize_upload_session(pk)
+        assemble_upload_session.apply([pk])
+
+        response = finalize_upload_session(pk)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["file"] is not None
+        assert not Upload.objects.exists()
+
+    def test_if_video_is_valid_creates_upload(
+        self,
+        authenticate,
+        user,
+        generate_blank_video,
+        upload_video_in_chunks,
+        finalize_upload_session,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        with generate_blank_video(
+            width=320, height=240, duration=1, format="mp4"
+        ) as video:
+            content = video.read()
+        pk = upload_video_in_chunks(content, "video.mp4", 1024)
+
+        response = finalize_upload_session(pk)
+        assemble_upload_session.apply([pk])
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["is_finalizing"] == True
+        upload = Upload.objects.get(id=UploadSession.objects.get(id=pk).upload_id)
+        assert upload.filename == "video.mp4"
+        assert upload.file.read() == content
+
+    def test_if_session_is_finalizing_chunks_are_assembled_once(
+        self,
+        authenticate,
+        user,
+        finalize_upload_session,
+        django_capture_on_commit_callbacks,
+    ):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+        session = baker.make(UploadSession, profile=profile, size=10, offset=10)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            finalize_upload_session(session.id)
+            response = finalize_upload_session(session.id)
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert [callback.args for callback in callbacks] == [(session.id,)]
+
+    def test_if_session_is_finalizing_chunks_are_not_accepted(
+        self, authenticate, user, put_chunk
+    ):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+        session = baker.make(
+            UploadSession, profile=profile, size=10, offset=10, is_finalizing=True
+        )
+
+        response = put_chunk(session.id, b"x" * 10, 0, 10)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,16 +1,25 @@
+import hashlib
 from pathlib import Path
 from time import sleep, time
 
 import pytest
+import requests
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from model_bakery import baker
 from rest_framework import status
 
-from videos.models import Upload
+from videos.models import PresignedUpload, Upload
+from videos.progress import TRANSCODING_STAGE, set_upload_progress
 
 
 LIST_VIEWNAME = "videos:uploads-list"
 DETAIL_VIEWNAME = "videos:uploads-detail"
+PRESIGNED_VIEWNAME = "videos:uploads-presigned"
+FINALIZE_PRESIGNED_VIEWNAME = "videos:uploads-finalize-presigned"
+STATUS_VIEWNAME = "videos:uploads-upload-status"
 MAX_VIDEO_DURATION_SECONDS = 90
 CURRENT_FOLDER = Path(__file__).parent
 
@@ -43,6 +52,43 @@ def create_upload(create_object):
     return _create_upload
 
 
+@pytest.fixture
+def create_presigned_upload(create_object):
+    def _create_presigned_upload(presigned_upload):
+        return create_object(PRESIGNED_VIEWNAME, presigned_upload)
+
+    return _create_presigned_upload
+
+
+@pytest.fixture
+def finalize_presigned_upload(api_client):
+    def _finalize_presigned_upload(pk, etags):
+        return api_client.post(
+            reverse(FINALIZE_PRESIGNED_VIEWNAME, kwargs={"presigned_upload_id": pk}),
+            {"etags": etags},
+            format="json",
+        )
+
+    return _finalize_presigned_upload
+
+
+@pytest.fixture
+def upload_presigned_parts():
+    def _upload_presigned_parts(content: bytes, part_urls: list[str], part_size: int):
+        etags = []
+
+        for index, url in enumerate(part_urls):
+            response = requests.put(
+                url, data=content[index * part_size : (index + 1) * part_size]
+            )
+            response.raise_for_status()
+            etags.append(response.headers["ETag"])
+
+        return etags
+
+    return _upload_presigned_parts
+
+
 @pytest.fixture
 def retrieve_upload(retrieve_object):
     def _retrieve_upload(pk):
@@ -51,6 +97,14 @@ def retrieve_upload(retrieve_object):
     return _retrieve_upload
 
 
+@pytest.fixture
+def retrieve_upload_status(api_client):
+    def _retrieve_upload_status(pk):
+        return api_client.get(reverse(STATUS_VIEWNAME, kwargs={"pk": pk}))
+
+    return _retrieve_upload_status
+
+
 @pytest.fixture
 def update_upload(update_object):
     def _update_upload(pk, upload):
@@ -126,6 +180,71 @@ class TestCreateUpload:
         assert response.status_code == status.HTTP_201_CREATED
         assert response.data["id"] > 0
 
+    def test_if_duration_is_not_in_header_probe_is_stored(
+        self, authenticate, create_upload, generate_blank_video, user
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        with generate_blank_video(
+            width=320, height=240, duration=1, format="avi"
+        ) as video:
+            response = create_upload({"file": video})
+
+        upload = Upload.objects.get(id=response.data["id"])
+        assert float(upload.probe["format"]["duration"]) > 0
+        assert upload.probe["streams"][0]["width"] == 320
+
+    def test_if_duration_is_in_header_file_is_not_probed(
+        self, authenticate, create_upload, valid_video, user
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload({"file": valid_video})
+
+        upload = Upload.objects.get(id=response.data["id"])
+        assert response.status_code == status.HTTP_201_CREATED
+        assert upload.probe is None
+
+    def test_content_hash_is_stored(
+        self, authenticate, create_upload, valid_video, user
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload({"file": valid_video})
+
+        upload = Upload.objects.get(id=response.data["id"])
+        valid_video.seek(0)
+        assert upload.content_hash == hashlib.sha256(valid_video.read()).hexdigest()
+
+    @pytest.mark.parametrize("max_memory_size", [0, 10 * 1024**2])
+    def test_content_hash_is_computed_as_file_is_uploaded(
+        self,
+        authenticate,
+        create_upload,
+        valid_video,
+        user,
+        monkeypatch,
+        settings,
+        max_memory_size,
+    ):
+        # files larger than the max memory size are streamed to a temporary file
+        settings.FILE_UPLOAD_MAX_MEMORY_SIZE = max_memory_size
+        monkeypatch.setattr(
+            "videos.serializers.get_content_hash",
+            lambda blocks: pytest.fail("Uploaded file was read again to hash it"),
+        )
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload({"file": valid_video})
+
+        upload = Upload.objects.get(id=response.data["id"])
+        valid_video.seek(0)
+        assert upload.content_hash == hashlib.sha256(valid_video.read()).hexdigest()
+
     @pytest.mark.django_db(transaction=True)
     def test_if_video_is_valid_processing_succeeds(
         self, authenticate, create_upload, valid_video, user, celery_worker
@@ -143,6 +262,57 @@ class TestCreateUpload:
 
         assert upload.is_done == True
         assert upload.video.id > 0
+        assert upload.video.duration > 0
+
+    @pytest.mark.django_db(transaction=True)
+    def test_remaining_renditions_are_encoded_after_publishing(
+        self, authenticate, create_upload, valid_video, user, celery_worker
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_upload({"file": valid_video})
+        upload_id = response.data["id"]
+        upload = Upload.objects.get(id=upload_id)
+        timer = time() + 20
+        while (
+            not (upload.is_done and upload.processed["is_complete"]) and time() < timer
+        ):
+            upload.refresh_from_db()
+            sleep(0.1)
+
+        assert upload.processed["is_complete"] == True
+        assert upload.video.height == 240
+
+    @pytest.mark.django_db(transaction=True)
+    def test_if_video_is_long_processing_in_chunks_succeeds(
+        self,
+        authenticate,
+        create_upload,
+        generate_blank_video,
+        user,
+        celery_worker,
+        settings,
+    ):
+        settings.TRANSCODE_CHUNKING_THRESHOLD_SECONDS = 2
+        settings.TRANSCODE_CHUNK_DURATION_SECONDS = 1
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        with generate_blank_video(
+            width=320, height=240, duration=3, format="mp4", keyframe_interval=1
+        ) as video:
+            response = create_upload({"file": video})
+        upload_id = response.data["id"]
+        upload = Upload.objects.get(id=upload_id)
+        timer = time() + 20
+        while not upload.is_done and time() < timer:
+            upload.refresh_from_db()
+            sleep(0.1)
+
+        assert upload.is_done == True
+        assert upload.video.source.name.endswith(".m3u8")
+        assert (settings.MEDIA_ROOT / upload.video.source.name).exists()
 
     @pytest.mark.django_db(transaction=True)
     def test_derives_video_title_from_filename(
@@ -185,6 +355,146 @@ class TestCreateUpload:
         assert int(items[0]["ItemId"]) == upload.video.id
 
 
+@pytest.mark.django_db
+class TestCreatePresignedUpload:
+    def test_if_user_is_anonymous_returns_401(self, create_presigned_upload):
+        response = create_presigned_upload({"filename": "video.mp4", "size": 100})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_if_storage_is_not_s3_returns_501(
+        self, authenticate, user, create_presigned_upload
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_presigned_upload({"filename": "video.mp4", "size": 100})
+
+        assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+    def test_if_video_extension_is_not_supported_returns_400(
+        self, authenticate, user, create_presigned_upload, s3_storage
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_presigned_upload({"filename": "video.mkv", "size": 100})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["filename"] is not None
+
+    def test_returns_url_for_each_part(
+        self, authenticate, user, create_presigned_upload, s3_storage, settings
+    ):
+        settings.PRESIGNED_UPLOAD_PART_SIZE = 5 * 1024**2
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        response = create_presigned_upload(
+            {"filename": "video.mp4", "size": 12 * 1024**2}
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["part_size"] == 5 * 1024**2
+        assert len(response.data["part_urls"]) == 3
+
+    def test_uploads_of_same_filename_get_their_own_files(
+        self, authenticate, user, create_presigned_upload, s3_storage
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+
+        create_presigned_upload({"filename": "video.mp4", "size": 100})
+        create_presigned_upload({"filename": "video.mp4", "size": 100})
+
+        names = PresignedUpload.objects.values_list("name", flat=True)
+        assert len(set(names)) == 2
+        assert all(name.endswith(".mp4") for name in names)
+
+    def test_if_part_is_larger_than_its_length_it_is_rejected(
+        self, authenticate, user, create_presigned_upload, s3_storage, settings
+    ):
+        settings.PRESIGNED_UPLOAD_PART_SIZE = 5 * 1024**2
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_presigned_upload({"filename": "video.mp4", "size": 100})
+
+        response = requests.put(response.data["part_urls"][0], data=b"x" * 101)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestFinalizePresignedUpload:
+    def test_if_etags_are_invalid_returns_400(
+        self,
+        authenticate,
+        user,
+        create_presigned_upload,
+        finalize_presigned_upload,
+        s3_storage,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        response = create_presigned_upload({"filename": "video.mp4", "size": 100})
+
+        response = finalize_presigned_upload(response.data["id"], ['"invalid"'])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_video_is_too_long_returns_400(
+        self,
+        authenticate,
+        user,
+        create_presigned_upload,
+        upload_presigned_parts,
+        finalize_presigned_upload,
+        too_long_video,
+        s3_storage,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        content = too_long_video.read()
+        response = create_presigned_upload(
+            {"filename": "video.mp4", "size": len(content)}
+        )
+        etags = upload_presigned_parts(
+            content, response.data["part_urls"], response.data["part_size"]
+        )
+
+        response = finalize_presigned_upload(response.data["id"], etags)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["file"] is not None
+
+    def test_if_video_is_valid_creates_upload(
+        self,
+        authenticate,
+        user,
+        create_presigned_upload,
+        upload_presigned_parts,
+        finalize_presigned_upload,
+        valid_video,
+        s3_storage,
+    ):
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        content = valid_video.read()
+        response = create_presigned_upload(
+            {"filename": "video.mp4", "size": len(content)}
+        )
+        etags = upload_presigned_parts(
+            content, response.data["part_urls"], response.data["part_size"]
+        )
+
+        response = finalize_presigned_upload(response.data["id"], etags)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        upload = Upload.objects.get(id=response.data["id"])
+        assert upload.filename == "video.mp4"
+        assert s3_storage.open(upload.file.name).read() == content
+
+
 @pytest.mark.django_db
 class TestRetrieveUpload:
     def test_if_user_is_anonymous_returns_401(self, retrieve_upload):
@@ -234,6 +544,69 @@ class TestRetrieveUpload:
         }
 
 
+@pytest.mark.django_db
+class TestRetrieveUploadStatus:
+    def test_if_user_is_anonymous_returns_401(self, retrieve_upload_status):
+        response = retrieve_upload_status(1)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_if_progress_is_unknown_returns_404(
+        self, authenticate, user, retrieve_upload_status
+    ):
+        authenticate(user=user)
+
+        response = retrieve_upload_status(1)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_user_doesnt_own_upload_returns_404(
+        self, authenticate, user, other_user, retrieve_upload_status
+    ):
+        authenticate(user=user)
+        set_upload_progress(1, other_user.id, TRANSCODING_STAGE, 50)
+
+        response = retrieve_upload_status(1)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_returns_reported_progress_without_querying_videos(
+        self, authenticate, user, retrieve_upload_status
+    ):
+        authenticate(user=user)
+        set_upload_progress(1, user.id, TRANSCODING_STAGE, 42.25)
+
+        with CaptureQueriesContext(connection) as context:
+            response = retrieve_upload_status(1)
+
+        assert not any("videos_" in query["sql"] for query in context.captured_queries)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "stage": TRANSCODING_STAGE,
+            "percent": 42.2,
+            "video": None,
+        }
+
+    def test_creating_upload_reports_pending_stage(
+        self,
+        authenticate,
+        user,
+        retrieve_upload_status,
+        django_capture_on_commit_callbacks,
+    ):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            upload = baker.make(Upload, profile=profile)
+
+        response = retrieve_upload_status(upload.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["stage"] == Upload.Stage.PENDING
+        assert response.data["percent"] == 0
+
+
 @pytest.mark.django_db
 class TestUpdateUpload:
     def test_returns_405(self, authenticate, update_upload):
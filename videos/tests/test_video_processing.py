@@ -1,20 +1,46 @@
+import struct
+from io import BytesIO
 from pathlib import Path
 
 import ffmpeg
 import m3u8
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.utils.crypto import get_random_string
 from PIL import Image, UnidentifiedImageError
 
 from videos.video_processing import (
+    ComplexitySample,
+    VideoChunk,
+    Rendition,
+    add_renditions,
+    build_encoding_command,
     create_thumbnail,
     create_vertical_video,
+    encode_chunk,
     extract_first_frame,
     ffprobe,
+    fit_renditions,
+    get_crop_size,
+    get_display_size,
+    get_frame_rate,
+    get_hls_output_args,
+    get_images,
+    get_smallest_rendition,
+    get_sprite_cues,
+    get_video_bitrate,
     get_video_duration,
+    get_vertical_renditions,
     has_audio_stream,
+    is_streamable,
     make_hls,
+    plan_vertical_renditions,
+    probe_file,
+    process_video,
+    read_progress,
+    split_video_into_chunks,
+    write_chunked_hls_playlists,
 )
 
 
@@ -59,6 +85,556 @@ def is_valid_hls(playlist_path: Path) -> bool:
     return True
 
 
+def make_box(type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), type) + payload
+
+
+def save_in_storage(content: bytes) -> str:
+    return default_storage.save(get_random_string(10), ContentFile(content))
+
+
+def get_first_segment_path(playlist_path: Path) -> Path:
+    main_playlist = m3u8.loads(playlist_path.read_text())
+    path = playlist_path.parent / main_playlist.playlists[0].uri
+    playlist = m3u8.loads(path.read_text())
+    return playlist_path.parent / playlist.segments[0].uri
+
+
+class TestProcessVideo:
+    def test_hls_is_valid(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4", add_audio=True
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+
+            assert Path(result.source).suffix == ".m3u8"
+            assert is_valid_hls(settings.MEDIA_ROOT / result.source)
+
+    def test_video_is_cropped_to_9_16_ratio(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+            segment_path = get_first_segment_path(settings.MEDIA_ROOT / result.source)
+            probe = ffmpeg.probe(str(segment_path))
+            stream = probe["streams"][0]
+            width, height = stream["width"], stream["height"]
+
+            assert height == 720
+            assert has_9_16_ratio(width, height)
+
+    def test_audio_is_preserved(self, generate_blank_video):
+        with generate_blank_video(
+            width=360, height=720, duration=1, format="mp4", add_audio=True
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+            segment_path = get_first_segment_path(settings.MEDIA_ROOT / result.source)
+            probe = ffmpeg.probe(str(segment_path))
+            streams = probe["streams"]
+
+            assert any(stream["codec_type"] == "audio" for stream in streams)
+
+    def test_thumbnail_is_created(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+
+            assert Path(result.thumbnail).suffix == ".jpg"
+            assert is_valid_image(settings.MEDIA_ROOT / result.thumbnail)
+            with Image.open(settings.MEDIA_ROOT / result.thumbnail) as image:
+                assert image.width == 405
+
+    def test_first_frame_is_created(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+
+            assert Path(result.first_frame).suffix == ".jpg"
+            assert is_valid_image(settings.MEDIA_ROOT / result.first_frame)
+            with Image.open(settings.MEDIA_ROOT / result.first_frame) as image:
+                assert image.height == 720
+                assert has_9_16_ratio(image.width, image.height)
+
+    def test_images_are_created(self, generate_blank_video, settings):
+        settings.IMAGE_FORMATS = ["webp"]
+
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+
+            assert [image["width"] for image in result.images] == [180, 360, 404]
+            for image in result.images:
+                assert Path(image["name"]).suffix == ".webp"
+                with Image.open(settings.MEDIA_ROOT / image["name"]) as file:
+                    assert (file.width, file.height) == (
+                        image["width"],
+                        image["height"],
+                    )
+
+    def test_sprites_are_created(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=3, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+
+            index = (settings.MEDIA_ROOT / result.sprites).read_text()
+            assert index.startswith("WEBVTT")
+            assert index.count("sprites_0.jpg#xywh=") == 2
+            assert is_valid_image(settings.MEDIA_ROOT / output_dir / "sprites_0.jpg")
+
+    def test_returns_size_and_duration(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=2, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+
+            assert result.height == 720
+            assert has_9_16_ratio(result.width, result.height)
+            assert round(result.duration) == 2
+
+    def test_fmp4_renditions_are_single_files(self, generate_blank_video, settings):
+        settings.HLS_SEGMENT_TYPE = "fmp4"
+
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4", add_audio=True
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            result = process_video(video_path, output_dir)
+            master_playlist_path = settings.MEDIA_ROOT / result.source
+            files = list(master_playlist_path.parent.iterdir())
+            master_playlist = m3u8.loads(master_playlist_path.read_text())
+            segments = [
+                segment
+                for playlist in master_playlist.playlists
+                for segment in m3u8.loads(
+                    (master_playlist_path.parent / playlist.uri).read_text()
+                ).segments
+            ]
+
+            sprite_files = list(master_playlist_path.parent.glob("sprites*"))
+
+            # master playlist, thumbnail, first frame, images, sprites, and playlist and file of each rendition
+            assert len(files) == 3 + len(result.images) + len(sprite_files) + 2 * len(
+                master_playlist.playlists
+            )
+            assert all(segment.byterange for segment in segments)
+            assert is_valid_hls(master_playlist_path)
+
+    def test_input_is_streamed_from_storage(self, generate_blank_video, temp_dir):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4", add_audio=True
+        ) as video:
+            faststart_path = temp_dir / "faststart.mp4"
+            ffmpeg.input(video.name).output(
+                str(faststart_path), codec="copy", movflags="faststart"
+            ).run(quiet=True)
+            probe = ffmpeg.probe(str(faststart_path))
+            name = save_in_storage(faststart_path.read_bytes())
+            output_dir = get_random_string(10)
+
+            result = process_video(name, output_dir, probe, stream=True)
+
+            assert is_valid_hls(settings.MEDIA_ROOT / result.source)
+            assert is_valid_image(settings.MEDIA_ROOT / result.thumbnail)
+
+
+class TestAddRenditions:
+    def test_master_playlist_references_all_renditions(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+            probe = ffmpeg.probe(str(video_path))
+            renditions = get_vertical_renditions(probe)
+            smallest_rendition = get_smallest_rendition(renditions)
+
+            result = process_video(
+                video_path, output_dir, probe, renditions=[smallest_rendition]
+            )
+            master_playlist_path = settings.MEDIA_ROOT / result.source
+            initial_playlists = m3u8.loads(master_playlist_path.read_text()).playlists
+
+            add_renditions(
+                video_path,
+                output_dir,
+                probe,
+                renditions,
+                encoded_renditions=[smallest_rendition],
+            )
+            playlists = m3u8.loads(master_playlist_path.read_text()).playlists
+
+            assert len(renditions) > 1
+            assert len(initial_playlists) == 1
+            assert len(playlists) == len(renditions)
+            assert is_valid_hls(master_playlist_path)
+
+
+class TestSplitVideoIntoChunks:
+    def test_splits_video_at_keyframes(self, generate_blank_video, temp_dir):
+        with generate_blank_video(
+            width=320, height=240, duration=3, format="mp4", keyframe_interval=1
+        ) as video:
+            video_path = Path(video.name)
+
+            chunks = split_video_into_chunks(video_path, temp_dir, 1, has_audio=False)
+
+            assert len(chunks) == 3
+            assert [chunk.index for chunk in chunks] == [0, 1, 2]
+            assert chunks[0].start == 0
+            assert abs(sum(chunk.duration for chunk in chunks) - 3) < 0.1
+            for chunk in chunks:
+                assert is_valid_video(Path(chunk.path))
+
+
+class TestEncodeChunk:
+    def test_encoded_chunks_make_valid_hls(self, generate_blank_video, temp_dir):
+        with generate_blank_video(
+            width=320,
+            height=240,
+            duration=3,
+            format="mp4",
+            add_audio=True,
+            keyframe_interval=1,
+        ) as video:
+            video_path = Path(video.name)
+            probe = ffmpeg.probe(str(video_path))
+            renditions = get_vertical_renditions(probe)
+            chunks = split_video_into_chunks(
+                video_path, temp_dir / "chunks", 1, has_audio=True
+            )
+            output_dir = temp_dir / "output"
+
+            for chunk in chunks:
+                encode_chunk(
+                    chunk.path,
+                    output_dir,
+                    renditions,
+                    chunk,
+                    has_audio=True,
+                    thumbnail=chunk.index == 0,
+                    first_frame=chunk.index == 0,
+                )
+            write_chunked_hls_playlists(output_dir, renditions, chunks)
+
+            assert is_valid_hls(output_dir / "HLSPlaylist.m3u8")
+            assert is_valid_image(output_dir / "thumbnail.jpg")
+            assert is_valid_image(output_dir / "frame0.jpg")
+
+
+class TestBuildEncodingCommand:
+    def test_limits_threads(self, tmp_path):
+        rendition = Rendition(
+            width=360, height=640, video_bitrate=800_000, audio_bitrate=96_000
+        )
+
+        args = build_encoding_command(
+            "input.mp4",
+            tmp_path,
+            [rendition],
+            has_audio=True,
+            crop=True,
+            thumbnail=True,
+            first_frame=True,
+            threads=2,
+        ).get_args()
+
+        assert args[args.index("-filter_complex_threads") + 1] == "2"
+        assert args[args.index("-threads") + 1] == "2"
+
+
+class TestGetImages:
+    def test_images_are_not_scaled_up(self, settings):
+        settings.IMAGE_FORMATS = ["avif", "webp"]
+
+        images = get_images(540, 960)
+
+        assert [(image.width, image.height) for image in images[:3]] == [
+            (180, 320),
+            (360, 640),
+            (540, 960),
+        ]
+        assert [image.format for image in images] == ["avif"] * 3 + ["webp"] * 3
+
+    def test_heights_are_even(self, settings):
+        settings.IMAGE_FORMATS = ["webp"]
+
+        images = get_images(404, 720)
+
+        assert all(image.height % 2 == 0 for image in images)
+
+
+class TestGetSpriteCues:
+    def test_cues_reference_frames_in_sheet(self):
+        cues = get_sprite_cues(5)
+
+        assert cues == [
+            "00:00:00.000 --> 00:00:02.000\nsprites_0.jpg#xywh=0,0,108,192",
+            "00:00:02.000 --> 00:00:04.000\nsprites_0.jpg#xywh=108,0,108,192",
+            "00:00:04.000 --> 00:00:05.000\nsprites_0.jpg#xywh=216,0,108,192",
+        ]
+
+    def test_frames_beyond_sheet_go_to_next_sheet(self):
+        cues = get_sprite_cues(101)
+
+        assert cues[10].endswith("sprites_0.jpg#xywh=0,192,108,192")
+        assert cues[50].endswith("sprites_1.jpg#xywh=0,0,108,192")
+
+    def test_chunk_cues_start_at_chunk(self):
+        chunk = VideoChunk(index=3, path="chunk_0003.mkv", start=30.5, duration=3)
+
+        cues = get_sprite_cues(chunk.duration, chunk)
+
+        assert cues == [
+            "00:00:30.500 --> 00:00:32.500\nsprites_3_0.jpg#xywh=0,0,108,192",
+            "00:00:32.500 --> 00:00:33.500\nsprites_3_0.jpg#xywh=108,0,108,192",
+        ]
+
+
+class TestGetHlsOutputArgs:
+    rendition = Rendition(width=360, height=640, video_bitrate=800_000)
+
+    def test_mpegts_segments_are_separate_files(self, tmp_path):
+        args = get_hls_output_args(self.rendition, tmp_path)
+
+        assert args["hls_segment_filename"].endswith("_%04d.ts")
+        assert "hls_flags" not in args
+
+    def test_fmp4_segments_are_in_single_file(self, tmp_path, settings):
+        settings.HLS_SEGMENT_TYPE = "fmp4"
+
+        args = get_hls_output_args(self.rendition, tmp_path)
+
+        assert args["hls_segment_type"] == "fmp4"
+        assert args["hls_flags"] == "single_file"
+        assert args["hls_segment_filename"] == str(tmp_path / "HLSPlaylist_640p.mp4")
+
+
+class TestReadProgress:
+    def test_reports_encoded_seconds(self):
+        output = BytesIO(
+            b"frame=0\nout_time_us=N/A\nprogress=continue\n"
+            b"frame=30\nout_time_us=1000000\nprogress=continue\n"
+            b"frame=75\nout_time_us=2500000\nprogress=end\n"
+        )
+        reports = []
+
+        read_progress(output, reports.append)
+
+        assert reports == [1, 2.5]
+
+    def test_output_is_read_to_the_end_if_callback_fails(self):
+        output = BytesIO(b"out_time_us=1000000\nout_time_us=2000000\n")
+
+        def on_progress(seconds):
+            raise ValueError()
+
+        read_progress(output, on_progress)
+
+        assert output.read() == b""
+
+
+class TestIsStreamable:
+    def test_mp4_with_moov_before_mdat_is_streamable(self):
+        name = save_in_storage(
+            make_box(b"ftyp", b"isom") + make_box(b"moov") + make_box(b"mdat", b"x")
+        )
+
+        assert is_streamable(name)
+
+    def test_mp4_with_moov_after_mdat_is_not_streamable(self):
+        name = save_in_storage(
+            make_box(b"ftyp", b"isom") + make_box(b"mdat", b"x") + make_box(b"moov")
+        )
+
+        assert not is_streamable(name)
+
+    def test_boxes_with_64_bit_size_are_skipped(self):
+        large_box = struct.pack(">I4sQ", 1, b"free", 16)
+        name = save_in_storage(
+            make_box(b"ftyp", b"isom") + large_box + make_box(b"moov")
+        )
+
+        assert is_streamable(name)
+
+    def test_mpeg_program_stream_is_streamable(self):
+        name = save_in_storage(b"\x00\x00\x01\xba" + b"\x00" * 100)
+
+        assert is_streamable(name)
+
+    def test_unknown_format_is_not_streamable(self):
+        name = save_in_storage(b"RIFF" + b"\x00" * 100)
+
+        assert not is_streamable(name)
+
+
+class TestGetCropSize:
+    def test_horizontal_video(self):
+        width, height = get_crop_size(1280, 720)
+
+        assert height == 720
+        assert has_9_16_ratio(width, height)
+
+    def test_vertical_video_that_is_too_high(self):
+        width, height = get_crop_size(360, 720)
+
+        assert width == 360
+        assert has_9_16_ratio(width, height)
+
+    def test_dimensions_are_even(self):
+        width, height = get_crop_size(320, 240)
+
+        assert width % 2 == 0
+        assert height % 2 == 0
+
+
+class TestGetDisplaySize:
+    def test_returns_stream_size(self):
+        probe = {"streams": [{"codec_type": "video", "width": 1280, "height": 720}]}
+
+        assert get_display_size(probe) == (1280, 720)
+
+    def test_if_video_is_rotated_swaps_width_and_height(self):
+        probe = {
+            "streams": [
+                {
+                    "codec_type": "video",
+                    "width": 1280,
+                    "height": 720,
+                    "side_data_list": [{"rotation": -90}],
+                }
+            ]
+        }
+
+        assert get_display_size(probe) == (720, 1280)
+
+
+def make_probe(video_bitrate: int, frame_rate: str = "30/1") -> dict:
+    return {
+        "streams": [
+            {
+                "codec_type": "video",
+                "width": 1080,
+                "height": 1920,
+                "bit_rate": str(video_bitrate),
+                "avg_frame_rate": frame_rate,
+            }
+        ],
+        "format": {"duration": "10"},
+    }
+
+
+LADDER = [
+    Rendition(width=1080, height=1920, video_bitrate=6_000_000),
+    Rendition(width=720, height=1280, video_bitrate=3_000_000),
+    Rendition(width=360, height=640, video_bitrate=800_000),
+]
+
+
+class TestFitRenditions:
+    def test_simple_content_gets_lower_bitrates(self):
+        sample = ComplexitySample(width=360, height=640, bitrate=200_000)
+
+        renditions = fit_renditions(LADDER, make_probe(10_000_000), sample)
+
+        assert len(renditions) == len(LADDER)
+        for fitted, default in zip(renditions, LADDER):
+            assert fitted.video_bitrate < default.video_bitrate
+        assert renditions[2].video_bitrate == 200_000
+
+    def test_bitrates_are_never_raised(self):
+        sample = ComplexitySample(width=360, height=640, bitrate=50_000_000)
+
+        renditions = fit_renditions(LADDER, make_probe(100_000_000), sample)
+
+        assert renditions == LADDER
+
+    def test_renditions_above_effective_resolution_are_dropped(self):
+        sample = ComplexitySample(width=360, height=640, bitrate=200_000)
+
+        # enough bits for 720x1280 at 30 fps, but not for 1080x1920
+        renditions = fit_renditions(LADDER, make_probe(400_000), sample)
+
+        assert [rendition.height for rendition in renditions] == [1280, 640]
+
+    def test_smallest_rendition_is_always_kept(self):
+        sample = ComplexitySample(width=360, height=640, bitrate=200_000)
+
+        renditions = fit_renditions(LADDER, make_probe(1_000), sample)
+
+        assert [rendition.height for rendition in renditions] == [640]
+
+    def test_planned_renditions_do_not_exceed_default_ones(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            probe = ffmpeg.probe(video.name)
+            default_renditions = get_vertical_renditions(probe)
+
+            renditions = plan_vertical_renditions(video.name, probe)
+
+            default_bitrates = {
+                rendition.height: rendition.video_bitrate
+                for rendition in default_renditions
+            }
+            assert 0 < len(renditions) <= len(default_renditions)
+            for rendition in renditions:
+                assert rendition.video_bitrate <= default_bitrates[rendition.height]
+
+
+class TestGetVideoBitrate:
+    def test_returns_stream_bitrate(self):
+        assert get_video_bitrate(make_probe(1_000_000)) == 1_000_000
+
+    def test_if_stream_bitrate_is_unknown_subtracts_audio_from_overall_bitrate(self):
+        probe = {
+            "streams": [
+                {"codec_type": "video"},
+                {"codec_type": "audio", "bit_rate": "128000"},
+            ],
+            "format": {"bit_rate": "1128000"},
+        }
+
+        assert get_video_bitrate(probe) == 1_000_000
+
+
+class TestGetFrameRate:
+    def test_returns_average_frame_rate(self):
+        assert get_frame_rate(make_probe(0, "30000/1001")) == 30000 / 1001
+
+    def test_if_frame_rate_is_unknown_returns_30(self):
+        assert get_frame_rate(make_probe(0, "0/0")) == 30
+
+
 class TestCreateVerticalVideo:
     def test_created_video_is_valid(self, generate_blank_video, temp_dir):
         with generate_blank_video(
@@ -182,6 +758,38 @@ class TestMakeHls:
 
             assert is_valid_hls(settings.MEDIA_ROOT / playlist_path)
 
+    def test_hls_is_valid_in_parallel_mode(self, generate_blank_video):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4", add_audio=True
+        ) as video:
+            video_path = Path(video.name)
+            output_dir = get_random_string(10)
+
+            playlist_path = make_hls(video_path, output_dir, parallel=True)
+
+            assert is_valid_hls(settings.MEDIA_ROOT / playlist_path)
+
+    def test_parallel_mode_produces_same_renditions_as_serial_mode(
+        self, generate_blank_video
+    ):
+        with generate_blank_video(
+            width=1280, height=720, duration=1, format="mp4"
+        ) as video:
+            video_path = Path(video.name)
+
+            serial_path = make_hls(video_path, get_random_string(10), parallel=False)
+            parallel_path = make_hls(video_path, get_random_string(10), parallel=True)
+            serial_playlist = m3u8.loads(
+                (settings.MEDIA_ROOT / serial_path).read_text()
+            )
+            parallel_playlist = m3u8.loads(
+                (settings.MEDIA_ROOT / parallel_path).read_text()
+            )
+
+            assert [p.uri for p in serial_playlist.playlists] == [
+                p.uri for p in parallel_playlist.playlists
+            ]
+
 
 class TestCreateThumbnail:
     def test_thumbnail_is_created(self, generate_blank_video):
@@ -273,3 +881,25 @@ class TestFfprobe:
 
             assert isinstance(probe, dict)
             assert "format" in probe and isinstance(probe["format"], dict)
+
+    def test_streams_are_included(self, generate_blank_video):
+        with generate_blank_video(
+            width=320, height=240, duration=1, format="mp4"
+        ) as video:
+            probe = ffprobe(video.read())
+
+            assert probe["streams"][0]["codec_type"] == "video"
+
+
+class TestProbeFile:
+    def test_piped_file_has_size_and_bitrate(self, generate_blank_video):
+        with generate_blank_video(
+            width=320, height=240, duration=1, format="mp4"
+        ) as video:
+            file = ContentFile(video.read(), name="video.mp4")
+
+            probe = probe_file(file)
+
+            assert int(probe["format"]["size"]) == file.size
+            assert int(probe["format"]["bit_rate"]) > 0
+            assert probe["streams"][0]["width"] == 320
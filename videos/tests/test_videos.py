@@ -5,6 +5,8 @@ from time import sleep, time
 import pytest
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 from model_bakery import baker
@@ -145,6 +147,8 @@ class TestRetrieveVideo:
             "source": video.source.url if video.source else None,
             "thumbnail": video.thumbnail.url if video.thumbnail else None,
             "first_frame": video.first_frame.url if video.first_frame else None,
+            "images": [],
+            "sprites": None,
             "view_count": 0,
             "like_count": 0,
             "is_liked": False,
@@ -152,6 +156,31 @@ class TestRetrieveVideo:
             "is_saved": False,
         }
 
+    def test_images(self, retrieve_video):
+        video = baker.make(
+            Video,
+            images=[
+                {
+                    "name": "videos/1/image_180.webp",
+                    "width": 180,
+                    "height": 320,
+                    "format": "webp",
+                }
+            ],
+        )
+
+        response = retrieve_video(video.id)
+
+        assert response.data["images"] == [
+            {
+                "url": "http://testserver"
+                + default_storage.url("videos/1/image_180.webp"),
+                "width": 180,
+                "height": 320,
+                "format": "webp",
+            }
+        ]
+
     def test_view_count(self, retrieve_video):
         video = baker.make(Video)
         baker.make(View, video=video, _quantity=2)
@@ -342,6 +371,32 @@ class TestUpdateVideo:
 
         assert not Upload.objects.filter(id=upload.id).exists()
 
+    def test_if_renditions_are_being_encoded_keeps_upload(
+        self, authenticate, user, update_video
+    ):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+        video = baker.make(Video, profile=profile)
+        upload = baker.make(
+            Upload,
+            profile=profile,
+            video=video,
+            processed={
+                "source": "videos/uploads/1/playlist.m3u8",
+                "thumbnail": "videos/uploads/1/thumbnail.jpg",
+                "first_frame": "videos/uploads/1/first_frame.jpg",
+                "width": 180,
+                "height": 320,
+                "duration": 10.0,
+                "is_complete": False,
+            },
+        )
+
+        update_video(video.id, {})
+
+        upload.refresh_from_db()
+        assert upload.is_video_edited == True
+
     @pytest.mark.django_db(transaction=True)
     def test_deletes_upload_file(self, authenticate, user, update_video):
         authenticate(user=user)
@@ -444,6 +499,8 @@ class TestListVideos:
             "source": video.source.url if video.source else None,
             "thumbnail": video.thumbnail.url if video.thumbnail else None,
             "first_frame": video.first_frame.url if video.first_frame else None,
+            "images": [],
+            "sprites": None,
             "view_count": 0,
             "like_count": 0,
             "is_liked": False,
@@ -613,6 +670,28 @@ class TestListVideos:
         assert len(response2.data["results"]) == 1
         assert response2.data["results"][0]["id"] == videos[2].id
 
+    def test_like_status_is_looked_up_only_for_videos_on_page(
+        self, authenticate, user, list_videos, pagination
+    ):
+        authenticate(user=user)
+        profile = baker.make(settings.PROFILE_MODEL, user=user)
+        videos = [baker.make(Video) for i in range(3)]
+        baker.make(Like, video=videos[0], profile=profile)
+        baker.make(Like, video=videos[2], profile=profile)
+
+        with CaptureQueriesContext(connection) as context:
+            response = list_videos(pagination=pagination(type="limit_offset", limit=2))
+
+        like_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if '"videos_like"' in query["sql"]
+        ]
+        assert response.data["results"][0]["is_liked"] == True
+        assert response.data["results"][1]["is_liked"] == False
+        assert len(like_queries) == 1
+        assert f"IN ({videos[0].id}, {videos[1].id})" in like_queries[0]
+
 
 @pytest.mark.django_db
 @pytest.mark.recommender
@@ -669,6 +748,8 @@ class TestRecommendations:
             "source": video.source.url if video.source else None,
             "thumbnail": video.thumbnail.url if video.thumbnail else None,
             "first_frame": video.first_frame.url if video.first_frame else None,
+            "images": [],
+            "sprites": None,
             "view_count": 0,
             "like_count": 0,
             "is_liked": False,
@@ -822,6 +903,8 @@ class TestLatest:
             "source": video.source.url if video.source else None,
             "thumbnail": video.thumbnail.url if video.thumbnail else None,
             "first_frame": video.first_frame.url if video.first_frame else None,
+            "images": [],
+            "sprites": None,
             "view_count": 0,
             "like_count": 0,
             "is_liked": False,
@@ -902,6 +985,8 @@ class TestSearch:
             "source": video.source.url if video.source else None,
             "thumbnail": video.thumbnail.url if video.thumbnail else None,
             "first_frame": video.first_frame.url if video.first_frame else None,
+            "images": [],
+            "sprites": None,
             "view_count": 0,
             "like_count": 0,
             "is_liked": False,
@@ -1012,6 +1097,8 @@ class TestFollowing:
             "source": video.source.url if video.source else None,
             "thumbnail": video.thumbnail.url if video.thumbnail else None,
             "first_frame": video.first_frame.url if video.first_frame else None,
+            "images": [],
+            "sprites": None,
             "view_count": 0,
             "like_count": 0,
             "is_liked": False,
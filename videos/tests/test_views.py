@@ -1,9 +1,12 @@
 import pytest
 from django.conf import settings
+from django.db import DatabaseError
 from model_bakery import baker
 from rest_framework import status
 
 from videos.models import HistoryEntry, Video, View
+from videos.serializers import CreateViewSerializer
+from videos.tasks import flush_buffered_views
 
 
 LIST_VIEWNAME = "videos:views-list"
@@ -83,6 +86,7 @@ class TestCreateView:
 
         response1 = create_view({"video": video.id})
         response2 = create_view({"video": video.id})
+        flush_buffered_views.apply()
 
         assert response1.status_code == status.HTTP_200_OK
         assert response2.status_code == status.HTTP_200_OK
@@ -95,6 +99,7 @@ class TestCreateView:
         initial_entry_count = HistoryEntry.objects.filter(video=video).count()
 
         response = create_view({"video": video.id})
+        flush_buffered_views.apply()
 
         assert response.status_code == status.HTTP_200_OK
         assert initial_entry_count == 0
@@ -105,6 +110,7 @@ class TestCreateView:
         initial_entry_count = HistoryEntry.objects.filter(video=video).count()
 
         response = create_view({"video": video.id})
+        flush_buffered_views.apply()
 
         assert response.status_code == status.HTTP_200_OK
         assert initial_entry_count == 0
@@ -121,6 +127,7 @@ class TestCreateView:
 
         response1 = create_view({"video": video.id})
         response2 = create_view({"video": video.id})
+        flush_buffered_views.apply()
 
         assert response1.status_code == status.HTTP_200_OK
         assert response2.status_code == status.HTTP_200_OK
@@ -129,6 +136,55 @@ class TestCreateView:
         assert View.objects.filter(video=video).count() == 1
         assert HistoryEntry.objects.filter(video=video).count() == 2
 
+    def test_views_are_stored_when_buffer_is_flushed(self, create_view):
+        video = baker.make(Video)
+
+        response = create_view({"video": video.id})
+        initial_view_count = View.objects.filter(video=video).count()
+        flush_buffered_views.apply()
+
+        video.refresh_from_db()
+        assert response.status_code == status.HTTP_200_OK
+        assert initial_view_count == 0
+        assert View.objects.filter(video=video).count() == 1
+        assert video.view_count == 1
+
+    def test_if_view_is_not_stored_next_view_counts(
+        self, settings, monkeypatch, create_view
+    ):
+        settings.VIEW_WRITE_BEHIND = False
+        video = baker.make(Video)
+
+        def save(*args, **kwargs):
+            raise DatabaseError()
+
+        with monkeypatch.context() as patch:
+            patch.setattr(CreateViewSerializer, "save", save)
+            with pytest.raises(DatabaseError):
+                create_view({"video": video.id})
+        response = create_view({"video": video.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert View.objects.filter(video=video).count() == 1
+
+    def test_if_write_behind_is_disabled_stores_view_immediately(
+        self, settings, authenticate, user, create_view
+    ):
+        settings.VIEW_WRITE_BEHIND = False
+        authenticate(user=user)
+        baker.make(settings.PROFILE_MODEL, user=user)
+        video = baker.make(Video)
+
+        response1 = create_view({"video": video.id})
+        response2 = create_view({"video": video.id})
+
+        video.refresh_from_db()
+        assert response1.status_code == status.HTTP_200_OK
+        assert response2.status_code == status.HTTP_200_OK
+        assert View.objects.filter(video=video).count() == 1
+        assert HistoryEntry.objects.filter(video=video).count() == 2
+        assert video.view_count == 1
+
 
 @pytest.mark.django_db
 class TestRetrieveView:
@@ -9,6 +9,7 @@ from .views import (
     LikeViewSet,
     ReportViewSet,
     SavedVideoViewSet,
+    UploadSessionViewSet,
     UploadViewSet,
     VideoViewSet,
     ViewViewSet,
@@ -19,6 +20,7 @@ app_name = "videos"
 router = DefaultRouter()
 router.register("videos", VideoViewSet, basename="videos")
 router.register("uploads", UploadViewSet, basename="uploads")
+router.register("upload_sessions", UploadSessionViewSet, basename="upload_sessions")
 router.register("views", ViewViewSet, basename="views")
 router.register("history", HistoryViewSet, basename="history")
 router.register("likes", LikeViewSet, basename="likes")
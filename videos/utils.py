@@ -3,7 +3,6 @@ from datetime import datetime
 from pathlib import Path
 
 from django.core.files.base import File
-from django.core.files.storage import default_storage
 from django.db.models import QuerySet
 from django.db.models.sql.where import WhereNode
 from django.utils import timezone
@@ -15,45 +14,45 @@ from .constants import (
     SECONDS_IN_DAY,
     CommentPopularityWeight,
 )
+from .storage import StoredFile, delete_dir, save_files
 
 
 def get_file_extension(file: File) -> str:
     """Get extension of the Django File."""
 
-    return Path(file.name).suffix.upper()[1:]
+    return get_extension(file.name)
 
 
-def remove_dir(dir: str) -> None:
-    """Remove specified directory from the default storage."""
-
-    dir_path = Path(dir)
+def get_extension(filename: str) -> str:
+    """Get uppercase extension of the filename without the leading dot."""
 
-    try:
-        subdirs, files = default_storage.listdir(dir)
-    except FileNotFoundError:
-        return
+    return Path(filename).suffix.upper()[1:]
 
-    for file in files:
-        default_storage.delete(str(dir_path / file))
 
-    for subdir in subdirs:
-        remove_dir(str(dir_path / subdir))
+def remove_dir(dir: str) -> None:
+    """
+    Remove specified directory from the default storage.
+    On S3 storage the keys are deleted in concurrent batches, see delete_dir.
+    """
 
-    default_storage.delete(dir)
+    delete_dir(dir)
 
 
-def save_dir(dir: Path, storage_dir: str) -> None:
-    """Save specified directory in the default storage."""
+def save_dir(dir: Path, storage_dir: str) -> list[StoredFile]:
+    """
+    Save specified directory in the default storage.
+    Files are saved concurrently, returns the saved files along with per-file timings.
+    """
 
     storage_dir_path = Path(storage_dir)
 
-    for item in dir.iterdir():
-        if item.is_dir():
-            save_dir(item, str(storage_dir_path / item.name))
+    files = [
+        (path, str(storage_dir_path / path.relative_to(dir)))
+        for path in sorted(dir.rglob("*"))
+        if path.is_file()
+    ]
 
-        if item.is_file():
-            with open(item, "rb") as file:
-                default_storage.save(str(storage_dir_path / item.name), file)
+    return save_files(files)
 
 
 def has_any_filter_applied(
@@ -1,13 +1,21 @@
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
-from .constants import ALLOWED_VIDEO_EXTENSIONS
-from .utils import get_file_extension
-from .video_processing import get_video_duration
+from .constants import (
+    ALLOWED_VIDEO_EXTENSIONS,
+    MAX_VIDEO_DURATION_SECONDS,
+    MAX_VIDEO_SIZE_MB,
+)
+from .utils import get_extension, get_file_extension
+from .video_processing import get_duration, get_header_duration, probe_file
 
 
 def validate_video_extension(file: InMemoryUploadedFile):
-    extension = get_file_extension(file)
+    validate_video_filename(file.name)
+
+
+def validate_video_filename(filename: str):
+    extension = get_extension(filename)
     if extension not in ALLOWED_VIDEO_EXTENSIONS:
         raise ValidationError(
             f"Unsupported video format. Allowed formats: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
@@ -15,22 +23,29 @@ def validate_video_extension(file: InMemoryUploadedFile):
 
 
 def validate_video_size(file: InMemoryUploadedFile):
-    max_size_mb = 50
+    validate_video_size_in_bytes(file.size)
 
-    if file.size > max_size_mb * (1024**2):
-        raise ValidationError(f"Video cannot be larger than {max_size_mb} MB")
 
+def validate_video_size_in_bytes(size: int):
+    if size > MAX_VIDEO_SIZE_MB * (1024**2):
+        raise ValidationError(f"Video cannot be larger than {MAX_VIDEO_SIZE_MB} MB")
 
-def validate_video_duration(file: InMemoryUploadedFile):
-    max_duration_seconds = 90
 
+def validate_video_duration(file: InMemoryUploadedFile):
     # ignore this validator if the file is not a valid video
     extension = get_file_extension(file)
     if extension not in ALLOWED_VIDEO_EXTENSIONS:
         return
 
-    duration = get_video_duration(file.chunks())
-    if duration > max_duration_seconds:
+    duration = get_header_duration(file)
+    if duration is None:
+        duration = get_duration(probe_file(file))
+
+    validate_video_duration_in_seconds(duration)
+
+
+def validate_video_duration_in_seconds(duration: float):
+    if duration > MAX_VIDEO_DURATION_SECONDS:
         raise ValidationError(
-            f"Video cannot be longer than {max_duration_seconds} seconds"
+            f"Video cannot be longer than {MAX_VIDEO_DURATION_SECONDS} seconds"
         )
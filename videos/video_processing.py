@@ -1,46 +1,1252 @@
+import csv
 import json
+import math
 import shutil
-import subprocess
-from inspect import isgenerator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from functools import partial
 from io import BytesIO
 from pathlib import Path
-from typing import Generator
+from typing import IO, Callable, Generator, Iterable
 
 import ffmpeg
 import ffmpeg_streaming
 from django.conf import settings
+from django.core.files.base import File
 from django.core.files.storage import default_storage
 from django.utils.crypto import get_random_string
+from ffmpeg_streaming import Bitrate, Size
+from ffmpeg_streaming._reperesentation import MINIMUM_BITRATE, AutoRep
 
+from .constants import (
+    FIRST_FRAME_FILENAME,
+    HLS_PLAYLIST_FILENAME,
+    HLS_SEGMENT_DURATION_SECONDS,
+    HLS_SEGMENT_TYPE_FMP4,
+    IMAGE_AVIF_CRF,
+    IMAGE_FORMAT_AVIF,
+    IMAGE_FORMAT_WEBP,
+    IMAGE_WEBP_QUALITY,
+    IMAGE_WIDTHS,
+    LADDER_ANALYSIS_CRF,
+    LADDER_ANALYSIS_DURATION_SECONDS,
+    LADDER_ANALYSIS_HEIGHT,
+    LADDER_BITRATE_SCALING_EXPONENT,
+    LADDER_MIN_BITS_PER_PIXEL,
+    SPRITE_COLUMNS,
+    SPRITE_HEIGHT,
+    SPRITE_INTERVAL_SECONDS,
+    SPRITE_ROWS,
+    SPRITE_WIDTH,
+    SPRITES_FILENAME,
+    THUMBNAIL_FILENAME,
+    THUMBNAIL_WIDTH,
+)
+from .containers import (
+    get_file_reader,
+    get_iso_media_duration,
+    is_iso_media_file,
+    is_moov_before_mdat,
+)
+from .scheduling import get_ffmpeg_threads
+from .storage import read_file_range, replace_file, stream_file
+from .supervisor import (
+    ResourceLimits,
+    get_media_limits,
+    get_probe_limits,
+    run_supervised,
+)
 from .utils import save_dir
 
 
-def create_vertical_video(input: Path | str, output: Path) -> None:
+PIPE_INPUT = "pipe:"
+MPEG_PS_PACK_START_CODE = b"\x00\x00\x01\xba"
+
+
+@dataclass
+class Rendition:
+    """Single quality level of HLS stream."""
+
+    width: int
+    height: int
+    video_bitrate: int
+    audio_bitrate: int | None = None
+
+    @property
+    def bandwidth(self) -> int:
+        return self.video_bitrate + (self.audio_bitrate or 0)
+
+
+@dataclass
+class ImageVariant:
+    """Image of the first frame of the video in one of the responsive sizes and formats."""
+
+    width: int
+    height: int
+    format: str
+
+
+@dataclass
+class ProcessedVideo:
+    """Paths to the files produced by process_video in the default storage, with the video's size and duration."""
+
+    source: str
+    thumbnail: str
+    first_frame: str
+    width: int
+    height: int
+    duration: float
+    # whether all renditions are encoded, see add_renditions
+    is_complete: bool = True
+    # images of the first frame with their paths, see get_stored_images
+    images: list[dict] = field(default_factory=list)
+    # WebVTT index of the scrubbing preview sprite sheets, see write_sprites_index
+    sprites: str = ""
+
+
+@dataclass
+class ComplexitySample:
+    """Beginning of the video encoded at constant quality in low resolution, see measure_complexity."""
+
+    width: int
+    height: int
+    bitrate: int
+
+
+@dataclass
+class VideoChunk:
+    """Part of the video between two keyframes, stored as a separate file."""
+
+    index: int
+    path: str
+    start: float
+    duration: float
+
+
+def process_video(
+    input: Path | str,
+    output_dir: str,
+    probe: dict | None = None,
+    *,
+    stream: bool = False,
+    renditions: list[Rendition] | None = None,
+    on_progress: Callable[[float], None] | None = None,
+) -> ProcessedVideo:
     """
-    Creates vertical video with 9:16 aspect ratio by cropping it.
+    Creates vertical video with 9:16 aspect ratio, packages it for HLS streaming,
+    creates thumbnail, extracts first frame, creates its responsive images and
+    scrubbing preview sprite sheets. Unless HLS_PARALLEL_ENCODING is enabled,
+    the input is decoded only once: a single ffmpeg filter graph crops the video
+    and splits it between all outputs. All files are written to output_dir in the default storage.
 
     Parameters:
-        input (Path | str): Path or URL to original video
-        output (Path): Path to output video
+        input (Path | str): Path or URL to original video, or its name in the default storage if streaming
+        output_dir (str): Path to output directory
+        probe (dict | None): Result of ffprobe on the input, probed if not specified
+        stream (bool): Whether to pipe the input from the default storage into ffmpeg, see is_streamable
+        renditions (list[Rendition] | None): HLS renditions to encode, all vertical renditions if not specified
+        on_progress (Callable[[float], None] | None): Called with the number of seconds of the input encoded so far
+    """
+
+    if probe is None:
+        if stream:
+            raise ValueError("Probe must be specified when streaming the input.")
+        probe = probe_video(input)
+
+    if renditions is None:
+        renditions = get_vertical_renditions(probe)
+
+    images = get_vertical_images(probe)
+
+    temp_output_dir: Path = settings.TEMP_DIR / get_random_string(20)
+    shutil.rmtree(temp_output_dir, ignore_errors=True)
+
+    try:
+        encode_video(
+            input,
+            temp_output_dir,
+            renditions,
+            has_audio=has_audio_stream_in_probe(probe),
+            crop=True,
+            thumbnail=True,
+            first_frame=True,
+            images=images,
+            sprites=True,
+            parallel=settings.HLS_PARALLEL_ENCODING,
+            stream=stream,
+            on_progress=on_progress,
+            duration=get_duration(probe),
+        )
+        write_sprites_index(
+            temp_output_dir / SPRITES_FILENAME, get_sprite_cues(get_duration(probe))
+        )
+        save_dir(temp_output_dir, output_dir)
+    finally:
+        shutil.rmtree(temp_output_dir, ignore_errors=True)
+
+    output_dir_path = Path(output_dir)
+    largest_rendition = get_largest_rendition(renditions)
+
+    return ProcessedVideo(
+        source=str(output_dir_path / HLS_PLAYLIST_FILENAME),
+        thumbnail=str(output_dir_path / THUMBNAIL_FILENAME),
+        first_frame=str(output_dir_path / FIRST_FRAME_FILENAME),
+        width=largest_rendition.width,
+        height=largest_rendition.height,
+        duration=get_duration(probe),
+        images=get_stored_images(images, output_dir),
+        sprites=str(output_dir_path / SPRITES_FILENAME),
+    )
+
+
+def add_renditions(
+    input: Path | str,
+    output_dir: str,
+    probe: dict,
+    renditions: list[Rendition],
+    *,
+    encoded_renditions: list[Rendition],
+    stream: bool = False,
+) -> None:
+    """
+    Encodes renditions missing from the HLS stream in output_dir in the default storage,
+    then replaces its master playlist with one referencing all renditions. The master
+    playlist is replaced only after the new renditions are saved, atomically where the
+    storage allows it, so players never get a playlist referencing missing files.
+
+    Parameters:
+        input (Path | str): Path or URL to original video, or its name in the default storage if streaming
+        output_dir (str): Path to output directory of process_video
+        probe (dict): Result of ffprobe on the input
+        renditions (list[Rendition]): All renditions of the stream
+        encoded_renditions (list[Rendition]): Renditions already in the stream
+        stream (bool): Whether to pipe the input from the default storage into ffmpeg, see is_streamable
+    """
+
+    output_dir_path = Path(output_dir)
+    missing_renditions = [
+        rendition for rendition in renditions if rendition not in encoded_renditions
+    ]
+
+    temp_output_dir: Path = settings.TEMP_DIR / get_random_string(20)
+    shutil.rmtree(temp_output_dir, ignore_errors=True)
+
+    try:
+        if missing_renditions:
+            encode_video(
+                input,
+                temp_output_dir,
+                missing_renditions,
+                has_audio=has_audio_stream_in_probe(probe),
+                crop=True,
+                thumbnail=False,
+                first_frame=False,
+                parallel=settings.HLS_PARALLEL_ENCODING,
+                stream=stream,
+                duration=get_duration(probe),
+            )
+
+        master_playlist = temp_output_dir / HLS_PLAYLIST_FILENAME
+        master_playlist.unlink(missing_ok=True)
+        save_dir(temp_output_dir, output_dir)
+
+        temp_output_dir.mkdir(parents=True, exist_ok=True)
+        write_hls_master_playlist(master_playlist, renditions)
+        replace_file(master_playlist, str(output_dir_path / HLS_PLAYLIST_FILENAME))
+    finally:
+        shutil.rmtree(temp_output_dir, ignore_errors=True)
+
+
+def encode_video(
+    input: Path | str,
+    output_dir: Path,
+    renditions: list[Rendition],
+    *,
+    has_audio: bool,
+    crop: bool,
+    thumbnail: bool,
+    first_frame: bool,
+    images: list[ImageVariant] | None = None,
+    sprites: bool = False,
+    parallel: bool = False,
+    max_processes: int | None = None,
+    stream: bool = False,
+    on_progress: Callable[[float], None] | None = None,
+    duration: float | None = None,
+) -> None:
+    """
+    Encodes video and writes the results to local output_dir.
+    If renditions are specified, HLS master playlist is written as well.
+
+    By default everything is encoded in a single ffmpeg run. In parallel mode
+    each rendition is encoded by its own ffmpeg process, so the encoding takes
+    about as long as the slowest rendition rather than the sum of all of them.
+
+    When streaming, the input is read from the default storage and piped into
+    each ffmpeg process, so it is never written to local disk.
+
+    Parameters:
+        input (Path | str): Path or URL to video, or its name in the default storage if streaming
+        output_dir (Path): Path to local output directory
+        renditions (list[Rendition]): HLS renditions to encode
+        has_audio (bool): Whether the input has audio stream
+        crop (bool): Whether to crop the video to 9:16 aspect ratio
+        thumbnail (bool): Whether to create thumbnail
+        first_frame (bool): Whether to extract first frame
+        images (list[ImageVariant] | None): Images of the first frame to create
+        sprites (bool): Whether to create scrubbing preview sprite sheets
+        parallel (bool): Whether to encode each rendition in a separate process
+        max_processes (int | None): Maximum number of concurrent ffmpeg processes in parallel mode
+        stream (bool): Whether to pipe the input from the default storage into ffmpeg
+        on_progress (Callable[[float], None] | None): Called with the number of seconds of the input encoded so far
+        duration (float | None): Duration of the input in seconds, limits the time each ffmpeg process may take
+    """
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    command_input = PIPE_INPUT if stream else input
+    limits = get_media_limits(duration)
+
+    def run(command, on_command_progress=on_progress) -> None:
+        run_command(
+            command,
+            stream_file(input) if stream else None,
+            on_command_progress,
+            limits=limits,
+        )
+
+    if parallel and len(renditions) > 1:
+        max_workers = max_processes or settings.HLS_ENCODING_PROCESSES
+        threads = get_ffmpeg_threads(min(max_workers, len(renditions)))
+
+        # the lowest rendition is the cheapest to encode, so it also produces the images
+        commands = [
+            build_encoding_command(
+                command_input,
+                output_dir,
+                [rendition],
+                has_audio=has_audio,
+                crop=crop,
+                thumbnail=thumbnail and index == len(renditions) - 1,
+                first_frame=first_frame and index == len(renditions) - 1,
+                images=images if index == len(renditions) - 1 else None,
+                sprites=sprites and index == len(renditions) - 1,
+                threads=threads,
+            )
+            for index, rendition in enumerate(renditions)
+        ]
+
+        # the encoding is as far as the process furthest behind
+        encoded_seconds = [0.0] * len(commands)
+
+        def get_progress_callback(index: int) -> Callable[[float], None] | None:
+            if on_progress is None:
+                return None
+
+            def on_command_progress(seconds: float) -> None:
+                encoded_seconds[index] = seconds
+                on_progress(min(encoded_seconds))
+
+            return on_command_progress
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(run, command, get_progress_callback(index))
+                for index, command in enumerate(commands)
+            ]
+            for future in futures:
+                future.result()
+    else:
+        command = build_encoding_command(
+            command_input,
+            output_dir,
+            renditions,
+            has_audio=has_audio,
+            crop=crop,
+            thumbnail=thumbnail,
+            first_frame=first_frame,
+            images=images,
+            sprites=sprites,
+            threads=get_ffmpeg_threads(),
+        )
+        run(command)
+
+    if renditions:
+        write_hls_master_playlist(output_dir / HLS_PLAYLIST_FILENAME, renditions)
+
+
+def run_command(
+    command,
+    input_stream: Iterable[bytes] | None = None,
+    on_progress: Callable[[float], None] | None = None,
+    *,
+    limits: ResourceLimits | None = None,
+    capture_stdout: bool = False,
+) -> bytes | None:
+    """
+    Runs ffmpeg command quietly under supervision, raising ffmpeg.Error if it fails
+    and CommandKilled if it exceeds its resource limits, see supervise.
+    If input_stream is specified, its blocks are written to stdin of the process.
+    If on_progress is specified, it is called with the number of seconds of the input
+    encoded so far, parsed from the -progress output of ffmpeg.
+    If capture_stdout is enabled, the output of the process is returned.
+    Limits default to those of the longest video, see get_media_limits.
+    """
+
+    read_stdout = None
+    if on_progress is not None:
+        command = command.global_args("-progress", "pipe:1", "-nostats")
+        read_stdout = partial(read_progress, on_progress=on_progress)
+    elif capture_stdout:
+        read_stdout = read_output
+
+    return run_supervised(
+        command.compile(),
+        limits or get_media_limits(),
+        input_stream=input_stream,
+        read_stdout=read_stdout,
+    )
+
+
+def read_output(output: IO[bytes]) -> bytes:
+    return output.read()
+
+
+def read_progress(output: IO[bytes], on_progress: Callable[[float], None]) -> None:
+    """
+    Read -progress output of ffmpeg until it ends, calling on_progress with the number
+    of seconds encoded at each report. The whole output is read even if on_progress fails,
+    otherwise ffmpeg blocks once the pipe is full.
+    """
+
+    failed = False
+
+    for line in output:
+        key, _, value = line.decode(errors="replace").strip().partition("=")
+        # out_time_us is in microseconds despite its name, and N/A until the first frame
+        if key != "out_time_us" or not value.isdigit() or failed:
+            continue
+
+        try:
+            on_progress(int(value) / 1_000_000)
+        except Exception:
+            failed = True
+
+
+def is_streamable(name: str) -> bool:
+    """
+    Checks whether the file in the default storage can be decoded from a pipe, without seeking.
+    MP4, MOV and 3GP files are streamable only if their moov box precedes the mdat box,
+    MPEG program streams always are. Only the box headers are read from the storage.
+    """
+
+    def read(offset: int, length: int) -> bytes:
+        return read_file_range(name, offset, length)
+
+    if read(0, 4) == MPEG_PS_PACK_START_CODE:
+        return True
+
+    return is_iso_media_file(read) and is_moov_before_mdat(read)
+
+
+def build_encoding_command(
+    input: Path | str,
+    output_dir: Path,
+    renditions: list[Rendition],
+    *,
+    has_audio: bool,
+    crop: bool,
+    thumbnail: bool,
+    first_frame: bool,
+    images: list[ImageVariant] | None = None,
+    sprites: bool = False,
+    chunk: VideoChunk | None = None,
+    threads: int | None = None,
+):
+    """
+    Builds ffmpeg command with a filter graph that optionally crops the video and
+    splits it into HLS renditions, thumbnail, first frame and its images, and
+    scrubbing preview sprite sheets. All images are created from the same decoded frame.
+    If chunk is specified, the input is treated as that chunk of the video and each
+    rendition is encoded into a single HLS segment instead of a complete playlist.
+    If threads is specified, the filter graph and each encoder use at most that many threads.
     """
 
     in_file = ffmpeg.input(str(input))
-    streams = []
 
-    if has_audio_stream(input):
-        streams.append(in_file.audio)
+    video = in_file.video
+    if crop:
+        video = crop_to_vertical(video)
+
+    images = images or []
+    image_count = int(thumbnail) + int(first_frame) + len(images)
+    branch_count = len(renditions) + int(image_count > 0) + int(sprites)
+    branches = video.split() if branch_count > 1 else None
+
+    def get_branch(index: int):
+        return branches[index] if branches is not None else video
+
+    outputs = []
+
+    for index, rendition in enumerate(renditions):
+        streams = [get_branch(index).filter("scale", rendition.width, rendition.height)]
+        if has_audio:
+            streams.append(in_file.audio)
+
+        if chunk is None:
+            output = output_dir / get_rendition_playlist_filename(rendition)
+            args = get_hls_output_args(rendition, output_dir)
+        else:
+            output = output_dir / get_rendition_segment_filename(rendition, chunk.index)
+            args = get_hls_segment_output_args(rendition, chunk)
+
+        if threads is not None:
+            args["threads"] = threads
+
+        outputs.append(ffmpeg.output(*streams, str(output), **args))
+
+    if image_count > 0:
+        frame = get_branch(len(renditions)).trim(end_frame=1)
+        frame_split = frame.split() if image_count > 1 else None
+        frames = iter(
+            [frame_split[index] for index in range(image_count)]
+            if frame_split is not None
+            else [frame]
+        )
+
+        if thumbnail:
+            outputs.append(
+                next(frames)
+                .filter("scale", THUMBNAIL_WIDTH, -1)
+                .output(
+                    str(output_dir / THUMBNAIL_FILENAME),
+                    vframes=1,
+                    format="image2",
+                    vcodec="mjpeg",
+                )
+            )
+
+        if first_frame:
+            outputs.append(
+                next(frames).output(
+                    str(output_dir / FIRST_FRAME_FILENAME),
+                    vframes=1,
+                    format="image2",
+                    vcodec="mjpeg",
+                )
+            )
+
+        for image in images:
+            outputs.append(
+                next(frames)
+                .filter("scale", image.width, image.height)
+                .output(
+                    str(output_dir / get_image_filename(image)),
+                    vframes=1,
+                    **get_image_output_args(image.format),
+                )
+            )
+
+    if sprites:
+        outputs.append(
+            get_branch(branch_count - 1)
+            .filter("fps", fps=f"1/{SPRITE_INTERVAL_SECONDS}")
+            .filter("scale", SPRITE_WIDTH, SPRITE_HEIGHT)
+            .filter("tile", f"{SPRITE_COLUMNS}x{SPRITE_ROWS}")
+            .output(
+                str(output_dir / get_sprite_sheet_pattern(chunk)),
+                format="image2",
+                vcodec="mjpeg",
+                start_number=0,
+            )
+        )
+
+    command = ffmpeg.merge_outputs(*outputs).overwrite_output()
+    if threads is not None:
+        command = command.global_args("-filter_complex_threads", str(threads))
+
+    return command
+
 
-    video = in_file.video.crop(
+def get_image_output_args(format: str) -> dict:
+    """Get ffmpeg output arguments encoding a single frame into an image of the format."""
+
+    if format == IMAGE_FORMAT_AVIF:
+        return {
+            "format": "avif",
+            "vcodec": "libaom-av1",
+            "crf": IMAGE_AVIF_CRF,
+            "still-picture": 1,
+            "pix_fmt": "yuv420p",
+        }
+    if format == IMAGE_FORMAT_WEBP:
+        return {
+            "format": "webp",
+            "vcodec": "libwebp",
+            "quality": IMAGE_WEBP_QUALITY,
+            "pix_fmt": "yuv420p",
+        }
+
+    raise ValueError(f"Unsupported image format: {format}")
+
+
+def get_image_filename(image: ImageVariant) -> str:
+    return f"image_{image.width}.{image.format}"
+
+
+def get_images(width: int, height: int) -> list[ImageVariant]:
+    """
+    Get responsive images of a frame of the given size, in each of IMAGE_FORMATS.
+    Frames are never scaled up, so smaller frames get fewer sizes.
+    """
+
+    widths = sorted({min(image_width, width) for image_width in IMAGE_WIDTHS})
+
+    return [
+        ImageVariant(
+            width=image_width,
+            # yuv420p requires dimensions to be even
+            height=max(round(height * image_width / width / 2) * 2, 2),
+            format=format,
+        )
+        for format in settings.IMAGE_FORMATS
+        for image_width in widths
+    ]
+
+
+def get_vertical_images(probe: dict) -> list[ImageVariant]:
+    """Get responsive images of the first frame of the probed video after cropping it to 9:16 aspect ratio."""
+
+    return get_images(*get_crop_size(*get_display_size(probe)))
+
+
+def get_stored_images(images: list[ImageVariant], output_dir: str) -> list[dict]:
+    """Get images with the paths of their files in output_dir, as stored in ProcessedVideo and Video."""
+
+    return [
+        {**asdict(image), "name": str(Path(output_dir) / get_image_filename(image))}
+        for image in images
+    ]
+
+
+def crop_to_vertical(video):
+    """Crops the ffmpeg video stream to 9:16 aspect ratio."""
+
+    return video.crop(
         "(iw - min(iw, ih / 16 * 9)) / 2",
         "(ih - min(ih, iw / 9 * 16)) / 2",
         "min(iw, ih / 16 * 9)",
         "min(ih, iw / 9 * 16)",
     )
 
+
+def get_hls_output_args(rendition: Rendition, output_dir: Path) -> dict:
+    """
+    Get ffmpeg output arguments for HLS rendition. With fmp4 HLS_SEGMENT_TYPE, the rendition
+    is written to a single fragmented MP4 file, including its initialization section, and its
+    playlist addresses the segments by byte ranges.
+    """
+
+    args = ffmpeg_streaming.Formats.h264().all
+    args.update(
+        {
+            "format": "hls",
+            "video_bitrate": rendition.video_bitrate,
+            "hls_list_size": 0,
+            "hls_time": HLS_SEGMENT_DURATION_SECONDS,
+            "hls_allow_cache": 1,
+        }
+    )
+
+    if settings.HLS_SEGMENT_TYPE == HLS_SEGMENT_TYPE_FMP4:
+        args.update(
+            {
+                "hls_segment_type": HLS_SEGMENT_TYPE_FMP4,
+                "hls_flags": "single_file",
+                "hls_playlist_type": "vod",
+                "hls_segment_filename": str(
+                    output_dir / get_rendition_single_filename(rendition)
+                ),
+            }
+        )
+    else:
+        args["hls_segment_filename"] = str(
+            output_dir / get_rendition_segment_filename_pattern(rendition)
+        )
+
+    if rendition.audio_bitrate:
+        args["audio_bitrate"] = rendition.audio_bitrate
+
+    return args
+
+
+def get_hls_segment_output_args(rendition: Rendition, chunk: VideoChunk) -> dict:
+    """Get ffmpeg output arguments for a single HLS segment of the rendition made from the chunk."""
+
+    args = ffmpeg_streaming.Formats.h264().all
+    args.update(
+        {
+            "format": "mpegts",
+            "video_bitrate": rendition.video_bitrate,
+            # keep timestamps continuous across segments encoded separately
+            "output_ts_offset": chunk.start,
+        }
+    )
+
+    if rendition.audio_bitrate:
+        args["audio_bitrate"] = rendition.audio_bitrate
+
+    return args
+
+
+def get_rendition_playlist_filename(rendition: Rendition) -> str:
+    return f"{Path(HLS_PLAYLIST_FILENAME).stem}_{rendition.height}p.m3u8"
+
+
+def get_rendition_single_filename(rendition: Rendition) -> str:
+    return f"{Path(HLS_PLAYLIST_FILENAME).stem}_{rendition.height}p.mp4"
+
+
+def get_rendition_segment_filename_pattern(rendition: Rendition) -> str:
+    return f"{Path(HLS_PLAYLIST_FILENAME).stem}_{rendition.height}p_%04d.ts"
+
+
+def get_rendition_segment_filename(rendition: Rendition, index: int) -> str:
+    return get_rendition_segment_filename_pattern(rendition) % index
+
+
+def write_hls_master_playlist(path: Path, renditions: list[Rendition]) -> None:
+    """Write HLS master playlist referencing playlists of the given renditions."""
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+
+    for rendition in renditions:
+        lines.append(
+            "#EXT-X-STREAM-INF:"
+            f"BANDWIDTH={rendition.bandwidth},"
+            f"RESOLUTION={rendition.width}x{rendition.height},"
+            f'NAME="{rendition.height}"'
+        )
+        lines.append(get_rendition_playlist_filename(rendition))
+
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def write_hls_media_playlist(
+    path: Path, segment_filenames: list[str], segment_durations: list[float]
+) -> None:
+    """Write HLS media playlist of a rendition from its segments."""
+
+    target_duration = math.ceil(max(segment_durations))
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+
+    for filename, duration in zip(segment_filenames, segment_durations):
+        lines.append(f"#EXTINF:{duration:.6f},")
+        lines.append(filename)
+
+    lines.append("#EXT-X-ENDLIST")
+
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def get_sprite_sheet_pattern(chunk: VideoChunk | None = None) -> str:
+    """Get filename pattern of sprite sheets of the video, or of the chunk of it."""
+
+    prefix = "sprites" if chunk is None else f"sprites_{chunk.index}"
+    return f"{prefix}_%d.jpg"
+
+
+def get_sprite_cues(duration: float, chunk: VideoChunk | None = None) -> list[str]:
+    """
+    Get WebVTT cues of the scrubbing preview frames of the video, or of the chunk of it.
+    Each cue references its frame in the sprite sheet with a media fragment.
+
+    Parameters:
+        duration (float): Duration of the video or chunk in seconds
+        chunk (VideoChunk | None): Chunk whose sprite sheets the cues reference
+    """
+
+    start = chunk.start if chunk is not None else 0
+    pattern = get_sprite_sheet_pattern(chunk)
+    frames_per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+
+    cues = []
+
+    for frame in range(math.ceil(duration / SPRITE_INTERVAL_SECONDS)):
+        sheet, position = divmod(frame, frames_per_sheet)
+        row, column = divmod(position, SPRITE_COLUMNS)
+
+        cue_start = start + frame * SPRITE_INTERVAL_SECONDS
+        cue_end = start + min((frame + 1) * SPRITE_INTERVAL_SECONDS, duration)
+
+        cues.append(
+            f"{format_vtt_time(cue_start)} --> {format_vtt_time(cue_end)}\n"
+            f"{pattern % sheet}#xywh={column * SPRITE_WIDTH},{row * SPRITE_HEIGHT},"
+            f"{SPRITE_WIDTH},{SPRITE_HEIGHT}"
+        )
+
+    return cues
+
+
+def format_vtt_time(seconds: float) -> str:
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
+
+
+def write_sprites_index(path: Path, cues: list[str]) -> None:
+    """Write WebVTT file indexing the scrubbing preview sprite sheets, see get_sprite_cues."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n\n".join(["WEBVTT", *cues]) + "\n", encoding="utf-8")
+
+
+def write_chunked_hls_playlists(
+    output_dir: Path, renditions: list[Rendition], chunks: list[VideoChunk]
+) -> None:
+    """
+    Write HLS master playlist and media playlists for video whose chunks were encoded
+    separately by encode_chunk, each chunk being one segment of every rendition.
+    """
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for rendition in renditions:
+        write_hls_media_playlist(
+            output_dir / get_rendition_playlist_filename(rendition),
+            [
+                get_rendition_segment_filename(rendition, chunk.index)
+                for chunk in chunks
+            ],
+            [chunk.duration for chunk in chunks],
+        )
+
+    write_hls_master_playlist(output_dir / HLS_PLAYLIST_FILENAME, renditions)
+
+
+def split_video_into_chunks(
+    input: Path | str,
+    output_dir: Path,
+    chunk_duration: float,
+    *,
+    has_audio: bool,
+    duration: float | None = None,
+) -> list[VideoChunk]:
+    """
+    Splits video into chunks of approximately chunk_duration seconds without re-encoding it.
+    Chunks are cut at keyframes, so each of them can be encoded independently.
+    Chunk files are written to local output_dir.
+
+    Parameters:
+        input (Path | str): Path or URL to video
+        output_dir (Path): Path to local output directory
+        chunk_duration (float): Desired duration of a chunk in seconds
+        has_audio (bool): Whether the input has audio stream
+        duration (float | None): Duration of the video in seconds, limits the time ffmpeg may take
+    """
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    chunk_list_path = output_dir / "chunks.csv"
+
+    in_file = ffmpeg.input(str(input))
+    streams = [in_file.video]
+    if has_audio:
+        streams.append(in_file.audio)
+
+    command = ffmpeg.output(
+        *streams,
+        str(output_dir / "chunk_%04d.mkv"),
+        format="segment",
+        codec="copy",
+        segment_time=chunk_duration,
+        reset_timestamps=1,
+        segment_list=str(chunk_list_path),
+        segment_list_type="csv",
+    ).overwrite_output()
+    run_command(command, limits=get_media_limits(duration))
+
+    with open(chunk_list_path, newline="") as file:
+        rows = list(csv.reader(file))
+
+    chunk_list_path.unlink()
+
+    return [
+        VideoChunk(
+            index=index,
+            path=str(output_dir / filename),
+            start=float(start),
+            duration=float(end) - float(start),
+        )
+        for index, (filename, start, end) in enumerate(rows)
+    ]
+
+
+def encode_chunk(
+    input: Path | str,
+    output_dir: Path,
+    renditions: list[Rendition],
+    chunk: VideoChunk,
+    *,
+    has_audio: bool,
+    thumbnail: bool,
+    first_frame: bool,
+    images: list[ImageVariant] | None = None,
+    sprites: bool = False,
+) -> None:
+    """
+    Crops the chunk to 9:16 aspect ratio and encodes it into one HLS segment per rendition
+    in a single ffmpeg run. The results are written to local output_dir.
+
+    Parameters:
+        input (Path | str): Path or URL to the chunk
+        output_dir (Path): Path to local output directory
+        renditions (list[Rendition]): HLS renditions to encode
+        chunk (VideoChunk): The chunk being encoded
+        has_audio (bool): Whether the input has audio stream
+        thumbnail (bool): Whether to create thumbnail
+        first_frame (bool): Whether to extract first frame
+        images (list[ImageVariant] | None): Images of the first frame of the chunk to create
+        sprites (bool): Whether to create scrubbing preview sprite sheets of the chunk
+    """
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    command = build_encoding_command(
+        input,
+        output_dir,
+        renditions,
+        has_audio=has_audio,
+        crop=True,
+        thumbnail=thumbnail,
+        first_frame=first_frame,
+        images=images,
+        sprites=sprites,
+        chunk=chunk,
+        threads=get_ffmpeg_threads(),
+    )
+    run_command(command, limits=get_media_limits(chunk.duration))
+
+
+def get_renditions(
+    width: int, height: int, probe: dict, *, area_ratio: float = 1
+) -> list[Rendition]:
+    """
+    Get HLS renditions for video of the given size, from its original size down to 144p.
+    Bitrates are derived from the bitrates of the probed input.
+
+    Parameters:
+        width (int): Width of the encoded video
+        height (int): Height of the encoded video
+        probe (dict): Result of ffprobe on the input
+        area_ratio (float): Ratio of the encoded area to the area of the input
+    """
+
+    overall_bitrate = int(probe["format"].get("bit_rate", 0))
+    if overall_bitrate == 0:
+        raise ValueError("Could not determine bitrate of the video")
+
+    video_bitrate = int(get_stream(probe, "video").get("bit_rate", 0))
+    audio_bitrate = int(get_stream(probe, "audio").get("bit_rate", 0))
+
+    bitrate = Bitrate(
+        int(video_bitrate * area_ratio),
+        audio_bitrate,
+        int((overall_bitrate - audio_bitrate) * area_ratio) + audio_bitrate,
+    )
+    representations = AutoRep(
+        Size(width, height), bitrate, ffmpeg_streaming.Formats.h264()
+    )
+
+    return [
+        Rendition(
+            width=representation.size.width,
+            height=representation.size.height,
+            video_bitrate=representation.bitrate.calc_video(convert=False),
+            audio_bitrate=representation.bitrate.audio_,
+        )
+        for representation in representations
+    ]
+
+
+def plan_renditions(
+    input: Path | str,
+    probe: dict,
+    width: int,
+    height: int,
+    *,
+    crop: bool,
+    area_ratio: float = 1,
+) -> list[Rendition]:
+    """
+    Plan per-title HLS renditions for video of the given size. Renditions of get_renditions
+    above the effective resolution of the source are dropped, and bitrates are lowered
+    to what the content needs, measured by a quick constant-quality encode of its beginning.
+
+    Parameters:
+        input (Path | str): Path or URL to original video
+        probe (dict): Result of ffprobe on the input
+        width (int): Width of the encoded video
+        height (int): Height of the encoded video
+        crop (bool): Whether the video is cropped to 9:16 aspect ratio when encoded
+        area_ratio (float): Ratio of the encoded area to the area of the input
+    """
+
+    renditions = get_renditions(width, height, probe, area_ratio=area_ratio)
+    sample = measure_complexity(input, probe, width, height, crop=crop)
+
+    return fit_renditions(renditions, probe, sample, area_ratio=area_ratio)
+
+
+def plan_vertical_renditions(input: Path | str, probe: dict) -> list[Rendition]:
+    """Plan per-title HLS renditions for the video after cropping it to 9:16 aspect ratio."""
+
+    width, height = get_crop_size(*get_display_size(probe))
+    return plan_renditions(
+        input,
+        probe,
+        width,
+        height,
+        crop=True,
+        area_ratio=get_crop_area_ratio(probe),
+    )
+
+
+def measure_complexity(
+    input: Path | str, probe: dict, width: int, height: int, *, crop: bool
+) -> ComplexitySample:
+    """
+    Encode the beginning of the video at constant quality in low resolution. The more complex
+    the content, e.g. the more motion and detail it has, the higher the resulting bitrate.
+
+    Parameters:
+        input (Path | str): Path or URL to original video
+        probe (dict): Result of ffprobe on the input
+        width (int): Width of the encoded video
+        height (int): Height of the encoded video
+        crop (bool): Whether to crop the video to 9:16 aspect ratio
+    """
+
+    sample_height = min(height, LADDER_ANALYSIS_HEIGHT)
+    sample_width = round(width * sample_height / height / 2) * 2
+    duration = min(get_duration(probe), LADDER_ANALYSIS_DURATION_SECONDS)
+
+    video = ffmpeg.input(str(input), t=duration).video
+    if crop:
+        video = crop_to_vertical(video)
+
+    command = video.filter("scale", sample_width, sample_height).output(
+        "pipe:",
+        format="h264",
+        vcodec="libx264",
+        preset="veryfast",
+        crf=LADDER_ANALYSIS_CRF,
+        pix_fmt="yuv420p",
+        threads=get_ffmpeg_threads(),
+    )
+    out = run_command(command, limits=get_media_limits(duration), capture_stdout=True)
+
+    return ComplexitySample(
+        width=sample_width,
+        height=sample_height,
+        bitrate=int(len(out) * 8 / duration),
+    )
+
+
+def fit_renditions(
+    renditions: list[Rendition],
+    probe: dict,
+    sample: ComplexitySample,
+    *,
+    area_ratio: float = 1,
+) -> list[Rendition]:
+    """
+    Fit renditions to the content of the video. Renditions for which the source has fewer than
+    LADDER_MIN_BITS_PER_PIXEL are dropped, except for the smallest one. Video bitrates are scaled
+    from the bitrate of the complexity sample, but never raised above the given ones.
+
+    Parameters:
+        renditions (list[Rendition]): Default renditions, see get_renditions
+        probe (dict): Result of ffprobe on the input
+        sample (ComplexitySample): Result of measure_complexity on the input
+        area_ratio (float): Ratio of the encoded area to the area of the input
+    """
+
+    source_bitrate = get_video_bitrate(probe) * area_ratio
+    frame_rate = get_frame_rate(probe)
+
+    def get_pixels(rendition: Rendition) -> int:
+        return rendition.width * rendition.height
+
+    def is_within_effective_resolution(rendition: Rendition) -> bool:
+        bits_per_pixel = source_bitrate / (get_pixels(rendition) * frame_rate)
+        return bits_per_pixel >= LADDER_MIN_BITS_PER_PIXEL
+
+    smallest_rendition = get_smallest_rendition(renditions)
+    sample_pixels = sample.width * sample.height
+
+    fitted_renditions = []
+
+    for rendition in renditions:
+        if rendition != smallest_rendition and not is_within_effective_resolution(
+            rendition
+        ):
+            continue
+
+        bitrate = int(
+            sample.bitrate
+            * (get_pixels(rendition) / sample_pixels) ** LADDER_BITRATE_SCALING_EXPONENT
+        )
+        bitrate = max(MINIMUM_BITRATE, min(bitrate, rendition.video_bitrate))
+        fitted_renditions.append(replace(rendition, video_bitrate=bitrate))
+
+    return fitted_renditions
+
+
+def get_vertical_renditions(probe: dict) -> list[Rendition]:
+    """Get HLS renditions for the probed video after cropping it to 9:16 aspect ratio."""
+
+    width, height = get_crop_size(*get_display_size(probe))
+    return get_renditions(width, height, probe, area_ratio=get_crop_area_ratio(probe))
+
+
+def get_largest_rendition(renditions: list[Rendition]) -> Rendition:
+    return max(renditions, key=lambda rendition: rendition.width * rendition.height)
+
+
+def get_smallest_rendition(renditions: list[Rendition]) -> Rendition:
+    return min(renditions, key=lambda rendition: rendition.width * rendition.height)
+
+
+def get_stream(probe: dict, codec_type: str) -> dict:
+    """Get first stream of the given type from ffprobe result, or empty dict if there is none."""
+
+    for stream in probe["streams"]:
+        if stream["codec_type"] == codec_type:
+            return stream
+
+    return {}
+
+
+def get_rotation(probe: dict) -> int:
+    """Get rotation of the video stream in degrees."""
+
+    stream = get_stream(probe, "video")
+
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(side_data["rotation"])
+
+    return int(stream.get("tags", {}).get("rotate", 0))
+
+
+def get_display_size(probe: dict) -> tuple[int, int]:
+    """Get size of the video as it is displayed, taking rotation into account."""
+
+    stream = get_stream(probe, "video")
+    width, height = int(stream["width"]), int(stream["height"])
+
+    if get_rotation(probe) % 180 != 0:
+        return height, width
+
+    return width, height
+
+
+def get_crop_size(width: int, height: int) -> tuple[int, int]:
+    """Get size of the video after cropping it to 9:16 aspect ratio."""
+
+    crop_width = int(min(width, height / 16 * 9))
+    crop_height = int(min(height, width / 9 * 16))
+
+    # yuv420p requires dimensions to be even
+    return crop_width - crop_width % 2, crop_height - crop_height % 2
+
+
+def get_crop_area_ratio(probe: dict) -> float:
+    """Get ratio of the area left after cropping the video to 9:16 to its original area."""
+
+    width, height = get_display_size(probe)
+    crop_width, crop_height = get_crop_size(width, height)
+
+    return (crop_width * crop_height) / (width * height)
+
+
+def get_video_bitrate(probe: dict) -> int:
+    """Get bitrate of the video stream, derived from the overall bitrate if it isn't known."""
+
+    video_bitrate = int(get_stream(probe, "video").get("bit_rate", 0))
+    if video_bitrate:
+        return video_bitrate
+
+    audio_bitrate = int(get_stream(probe, "audio").get("bit_rate", 0))
+    return max(int(probe["format"].get("bit_rate", 0)) - audio_bitrate, 0)
+
+
+def get_frame_rate(probe: dict) -> float:
+    """Get frame rate of the video stream, 30 if it isn't known."""
+
+    stream = get_stream(probe, "video")
+
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        numerator, _, denominator = stream.get(key, "0/0").partition("/")
+        if float(numerator) > 0 and float(denominator or 1) > 0:
+            return float(numerator) / float(denominator or 1)
+
+    return 30
+
+
+def get_duration(probe: dict) -> float:
+    """Get duration of the video in seconds from ffprobe result."""
+
+    return float(probe["format"]["duration"])
+
+
+def has_audio_stream_in_probe(probe: dict) -> bool:
+    """Checks if ffprobe result contains audio stream."""
+
+    return bool(get_stream(probe, "audio"))
+
+
+def create_vertical_video(
+    input: Path | str, output: Path, probe: dict | None = None
+) -> None:
+    """
+    Creates vertical video with 9:16 aspect ratio by cropping it.
+
+    Parameters:
+        input (Path | str): Path or URL to original video
+        output (Path): Path to output video
+        probe (dict | None): Result of ffprobe on the input, probed if not specified
+    """
+
+    in_file = ffmpeg.input(str(input))
+    streams = []
+
+    has_audio = (
+        has_audio_stream_in_probe(probe)
+        if probe is not None
+        else has_audio_stream(input)
+    )
+    if has_audio:
+        streams.append(in_file.audio)
+
+    video = crop_to_vertical(in_file.video)
     streams.append(video)
 
     output.parent.mkdir(parents=True, exist_ok=True)
-    ffmpeg.output(*streams, str(output)).run(quiet=True)
+    run_command(
+        ffmpeg.output(*streams, str(output)),
+        limits=get_media_limits(get_duration(probe) if probe is not None else None),
+    )
 
 
 def has_audio_stream(input: Path) -> bool:
@@ -51,16 +1257,16 @@ def has_audio_stream(input: Path) -> bool:
         input (Path): Path to video
     """
 
-    probe = ffmpeg.probe(str(input))
-
-    for stream in probe["streams"]:
-        if stream["codec_type"] == "audio":
-            return True
+    probe = probe_video(input)
+    return has_audio_stream_in_probe(probe)
 
-    return False
 
-
-def make_hls(input: Path, output_dir: str) -> str:
+def make_hls(
+    input: Path,
+    output_dir: str,
+    parallel: bool | None = None,
+    probe: dict | None = None,
+) -> str:
     """
     Packages video for HLS streaming.
     HLS playlist and all related files are written to output_dir in the default storage.
@@ -69,19 +1275,39 @@ def make_hls(input: Path, output_dir: str) -> str:
     Parameters:
         input (Path): Path to video
         output_dir (str): Path to output directory
+        parallel (bool | None): Whether to encode each rendition in a separate process,
+            defaults to HLS_PARALLEL_ENCODING setting
+        probe (dict | None): Result of ffprobe on the input, probed if not specified
     """
 
+    if parallel is None:
+        parallel = settings.HLS_PARALLEL_ENCODING
+
+    if probe is None:
+        probe = probe_video(input)
+
+    if settings.TRANSCODE_PER_TITLE_LADDER:
+        renditions = plan_renditions(input, probe, *get_display_size(probe), crop=False)
+    else:
+        renditions = get_renditions(*get_display_size(probe), probe)
+
     temp_output_dir: Path = settings.TEMP_DIR / get_random_string(20)
     shutil.rmtree(temp_output_dir, ignore_errors=True)
 
     try:
-        filename = "HLSPlaylist.m3u8"
-        video = ffmpeg_streaming.input(str(input))
-        hls = video.hls(ffmpeg_streaming.Formats.h264())
-        hls.auto_generate_representations()
-        hls.output(str(temp_output_dir / filename))
+        encode_video(
+            input,
+            temp_output_dir,
+            renditions,
+            has_audio=has_audio_stream_in_probe(probe),
+            crop=False,
+            thumbnail=False,
+            first_frame=False,
+            parallel=parallel,
+            duration=get_duration(probe),
+        )
         save_dir(temp_output_dir, output_dir)
-        return str(Path(output_dir) / filename)
+        return str(Path(output_dir) / HLS_PLAYLIST_FILENAME)
     finally:
         shutil.rmtree(temp_output_dir, ignore_errors=True)
 
@@ -97,17 +1323,15 @@ def create_thumbnail(input: Path, output_dir: str) -> str:
     """
 
     time = "00:00:00"  # first frame
-    width = "405"  # 405px x 720px (9:16 ratio)
-    file_name = "thumbnail.jpg"
 
-    output = str(Path(output_dir) / file_name)
+    output = str(Path(output_dir) / THUMBNAIL_FILENAME)
 
-    out, _ = (
+    command = (
         ffmpeg.input(str(input), ss=time)
-        .filter("scale", width, -1)
+        .filter("scale", THUMBNAIL_WIDTH, -1)
         .output("pipe:", vframes=1, format="image2", vcodec="mjpeg")
-        .run(capture_stdout=True, quiet=True)
     )
+    out = run_command(command, limits=get_probe_limits(), capture_stdout=True)
 
     default_storage.save(output, BytesIO(out))
 
@@ -125,15 +1349,13 @@ def extract_first_frame(input: Path, output_dir: str) -> str:
     """
 
     time = "00:00:00"  # first frame
-    file_name = "frame0.jpg"
 
-    output = str(Path(output_dir) / file_name)
+    output = str(Path(output_dir) / FIRST_FRAME_FILENAME)
 
-    out, _ = (
-        ffmpeg.input(str(input), ss=time)
-        .output("pipe:", vframes=1, format="image2", vcodec="mjpeg")
-        .run(capture_stdout=True, quiet=True)
+    command = ffmpeg.input(str(input), ss=time).output(
+        "pipe:", vframes=1, format="image2", vcodec="mjpeg"
     )
+    out = run_command(command, limits=get_probe_limits(), capture_stdout=True)
 
     default_storage.save(output, BytesIO(out))
 
@@ -149,7 +1371,19 @@ def get_video_duration(file: bytes | Generator[bytes, None, None]) -> float:
     """
 
     probe = ffprobe(file)
-    return float(probe["format"]["duration"])
+    return get_duration(probe)
+
+
+def probe_video(input: Path | str) -> dict:
+    """
+    Run ffprobe on the video under supervision, see get_probe_limits.
+    The result has the same structure as ffmpeg.probe output.
+
+    Parameters:
+        input (Path | str): Path or URL to video
+    """
+
+    return run_ffprobe(str(input))
 
 
 def ffprobe(file: bytes | Generator[bytes, None, None]) -> dict:
@@ -160,24 +1394,52 @@ def ffprobe(file: bytes | Generator[bytes, None, None]) -> dict:
         file (bytes | Generator[bytes, None, None]): Video as bytes or generator yielding chunks of it
     """
 
-    args = ["ffprobe", "-show_format", "-of", "json", r"pipe:"]
+    return run_ffprobe(r"pipe:", [file] if isinstance(file, bytes) else file)
 
-    process = subprocess.Popen(
-        args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+
+def run_ffprobe(input: str, input_stream: Iterable[bytes] | None = None) -> dict:
+    args = ["ffprobe", "-show_format", "-show_streams", "-of", "json", input]
+
+    output = run_supervised(
+        args, get_probe_limits(), input_stream=input_stream, read_stdout=read_output
     )
 
+    return json.loads(output)
+
+
+def get_header_duration(file: File) -> float | None:
+    """
+    Get duration of MP4, MOV or 3GP file in seconds from its container header, parsed in Python
+    without running ffprobe. Returns None if the file has no such header.
+
+    Parameters:
+        file (File): Video file, e.g. uploaded file
+    """
+
     try:
-        if isgenerator(file):
-            for chunk in file:
-                process.stdin.write(chunk)
-        else:
-            process.stdin.write(file)
-    except BrokenPipeError:
-        pass
+        return get_iso_media_duration(get_file_reader(file))
+    finally:
+        file.seek(0)
 
-    output, _ = process.communicate(timeout=10)
 
-    if process.returncode != 0:
-        raise Exception("ffprobe error")
+def probe_file(file: File) -> dict:
+    """
+    Run ffprobe on the Django File. Files stored on disk are probed by path, other files are piped
+    into ffprobe, in which case the file size and overall bitrate it can't determine are filled in.
+    The result has the same structure as ffmpeg.probe output.
 
-    return json.loads(output)
+    Parameters:
+        file (File): Video file, e.g. uploaded file
+    """
+
+    if hasattr(file, "temporary_file_path"):
+        return probe_video(file.temporary_file_path())
+
+    probe = ffprobe(file.chunks())
+
+    format = probe["format"]
+    format.setdefault("size", str(file.size))
+    if "bit_rate" not in format and float(format.get("duration", 0)) > 0:
+        format["bit_rate"] = str(int(file.size * 8 / float(format["duration"])))
+
+    return probe
@@ -0,0 +1,175 @@
+import logging
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Generator
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .constants import (
+    VIEW_BUFFER_EXPIRATION_SECONDS,
+    VIEW_BUFFER_LOCK_EXPIRATION_SECONDS,
+    VIEW_COUNT_COOLDOWN_SECONDS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# The buffer is a queue of numbered cache entries, positions are the numbers of the last entry
+# appended (tail), the last one removed (head), and the tail when the buffer was last flushed (settled).
+# An entry is written right after its number is taken from the tail, so a missing entry is
+# still being written, unless it was numbered before the buffer was last flushed.
+# The positions are stored without timeout, but the cache may still evict them. An evicted tail
+# starts again from the head, and entries are only added, so those not flushed yet are kept.
+VIEW_BUFFER_HEAD_KEY = "view_buffer:head"
+VIEW_BUFFER_TAIL_KEY = "view_buffer:tail"
+VIEW_BUFFER_SETTLED_KEY = "view_buffer:settled"
+VIEW_BUFFER_LOCK_KEY = "view_buffer:lock"
+
+
+@dataclass
+class BufferedView:
+    video_id: int
+    profile_id: int | None
+    session_id: str
+    # whether the view counts, views within the cooldown only add history entries
+    is_counted: bool
+    creation_date: datetime = field(default_factory=timezone.now)
+    # identifies the batch the view starts, see StoredViewBatch
+    id: str = field(default_factory=lambda: uuid4().hex)
+
+
+def get_view_cooldown_key(video_id: int, viewer: int | str) -> str:
+    return f"view_cooldown:{video_id}:{viewer}"
+
+
+def get_view_buffer_entry_key(position: int) -> str:
+    return f"view_buffer:{position}"
+
+
+def start_view_cooldown(video_id: int, profile_id: int | None, session_id: str) -> bool:
+    """
+    Start the cooldown of the viewer of the video, during which their views don't count.
+    Returns whether the view counts, i.e. the viewer wasn't already in the cooldown.
+
+    Parameters:
+        video_id (int): Id of the viewed video
+        profile_id (int | None): Id of the profile of the viewer, None if anonymous
+        session_id (str): Id of the session of the viewer, identifying anonymous viewers
+    """
+
+    viewer = profile_id if profile_id is not None else session_id
+    return cache.add(
+        get_view_cooldown_key(video_id, viewer), True, VIEW_COUNT_COOLDOWN_SECONDS
+    )
+
+
+def cancel_view_cooldown(
+    video_id: int, profile_id: int | None, session_id: str
+) -> None:
+    """Cancel the cooldown started for a view that couldn't be stored, see start_view_cooldown."""
+
+    viewer = profile_id if profile_id is not None else session_id
+    cache.delete(get_view_cooldown_key(video_id, viewer))
+
+
+def buffer_view(view: BufferedView) -> None:
+    """Append the view to the buffer, stored in the database by flush_buffered_views."""
+
+    while True:
+        position = take_view_buffer_position()
+        # the position is taken by an entry not flushed yet if the tail started again
+        if cache.add(
+            get_view_buffer_entry_key(position),
+            asdict(view),
+            VIEW_BUFFER_EXPIRATION_SECONDS,
+        ):
+            return
+
+
+def take_view_buffer_position() -> int:
+    try:
+        return cache.incr(VIEW_BUFFER_TAIL_KEY)
+    except ValueError:
+        # the tail is missing, before the first view or after being evicted
+        cache.add(
+            VIEW_BUFFER_TAIL_KEY, cache.get(VIEW_BUFFER_HEAD_KEY, 0), timeout=None
+        )
+        return cache.incr(VIEW_BUFFER_TAIL_KEY)
+
+
+def settle_view_buffer() -> int:
+    """
+    Returns the tail of the buffer when it was last settled, and settles it at its current tail.
+    Missing entries up to the returned position were given a whole flush interval to be written.
+    """
+
+    head = cache.get(VIEW_BUFFER_HEAD_KEY, 0)
+    tail = cache.get(VIEW_BUFFER_TAIL_KEY)
+    settled = cache.get(VIEW_BUFFER_SETTLED_KEY, 0)
+
+    if tail is None or tail < settled:
+        # the tail was evicted, positions after the head may be taken again, so none is settled
+        settled = head
+
+    cache.set(VIEW_BUFFER_SETTLED_KEY, tail if tail is not None else head, timeout=None)
+    return settled
+
+
+def get_buffered_views(
+    limit: int, settled: int
+) -> tuple[list[BufferedView], int | None]:
+    """
+    Returns up to limit views from the start of the buffer, and the position to pass to
+    remove_buffered_views once they are stored, None if there are no views to read.
+    Missing entries up to the settled position, never written or expired, are skipped.
+
+    Parameters:
+        limit (int): Maximum number of views
+        settled (int): Position returned by settle_view_buffer
+    """
+
+    head = cache.get(VIEW_BUFFER_HEAD_KEY, 0)
+    tail = cache.get(VIEW_BUFFER_TAIL_KEY, 0)
+
+    positions = range(head + 1, min(tail, head + limit) + 1)
+    entries = cache.get_many([get_view_buffer_entry_key(p) for p in positions])
+
+    views = []
+    end = head
+    for position in positions:
+        entry = entries.get(get_view_buffer_entry_key(position))
+        if entry is None:
+            if position > settled:
+                # still being written, read it next time
+                break
+            logger.warning("Skipped missing view buffer entry %s", position)
+        else:
+            views.append(BufferedView(**entry))
+        end = position
+
+    return views, end if end > head else None
+
+
+def remove_buffered_views(position: int) -> None:
+    """Remove views from the start of the buffer up to the position."""
+
+    head = cache.get(VIEW_BUFFER_HEAD_KEY, 0)
+    cache.delete_many(
+        [get_view_buffer_entry_key(p) for p in range(head + 1, position + 1)]
+    )
+    cache.set(VIEW_BUFFER_HEAD_KEY, position, timeout=None)
+
+
+@contextmanager
+def lock_view_buffer() -> Generator[bool, None, None]:
+    """Yield whether the buffer was locked, it isn't if another worker holds the lock."""
+
+    locked = cache.add(VIEW_BUFFER_LOCK_KEY, True, VIEW_BUFFER_LOCK_EXPIRATION_SECONDS)
+    try:
+        yield locked
+    finally:
+        if locked:
+            cache.delete(VIEW_BUFFER_LOCK_KEY)
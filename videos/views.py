@@ -1,27 +1,48 @@
-from datetime import timedelta
+import re
 from zoneinfo import ZoneInfoNotFoundError
 
+import ffmpeg
+from botocore.exceptions import ClientError
 from django.conf import settings
 from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.db import IntegrityError, transaction
 from django.db.models import Prefetch, Subquery
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.module_loading import import_string
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.exceptions import ParseError, PermissionDenied
+from rest_framework.exceptions import (
+    NotFound,
+    ParseError,
+    PermissionDenied,
+    ValidationError,
+)
 from rest_framework.filters import OrderingFilter
+from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from storages.backends.s3 import S3Storage
 
 from gorse_client import get_gorse_client
 
-from .constants import VIEW_COUNT_COOLDOWN_SECONDS
 from .filters import CommentFilter, VideoFilter
-from .models import CommentLike, HistoryEntry, Like, SavedVideo, Upload, View
+from .models import (
+    CommentLike,
+    HistoryEntry,
+    Like,
+    PresignedUpload,
+    SavedVideo,
+    Upload,
+    UploadSession,
+)
 from .pagination import (
     CommentPagination,
     HistoryPagination,
@@ -30,7 +51,9 @@ from .pagination import (
     VideoRecommendationPaginator,
     VideoSearchPagination,
 )
+from .parsers import UploadChunkParser, get_hashing_upload_handlers
 from .permissions import UserOwnsObjectOrReadOnly
+from .progress import get_upload_progress
 from .querysets import get_comment_queryset, get_video_queryset
 from .serializers import (
     CommentLikeSerializer,
@@ -41,19 +64,41 @@ from .serializers import (
     CreateEventSerializer,
     CreateHistoryEntrySerializer,
     CreateLikeSerializer,
+    CreatePresignedUploadSerializer,
     CreateReportSerializer,
     CreateSavedVideoSerializer,
     CreateUploadSerializer,
+    CreateUploadSessionSerializer,
     CreateViewSerializer,
+    FinalizePresignedUploadSerializer,
     HistoryEntrySerializer,
     LikeSerializer,
+    PresignedUploadSerializer,
     SavedVideoSerializer,
     UploadSerializer,
+    UploadSessionSerializer,
     VideoSerializer,
 )
 from .signals import view_created
-from .tasks import handle_upload
+from .storage import complete_multipart_upload
+from .tasks import (
+    assemble_upload_session,
+    get_storage_file_location,
+    get_upload_session_chunk_name,
+    handle_upload,
+)
 from .utils import get_objects_by_primary_keys, has_any_filter_applied
+from .validators import (
+    validate_video_duration_in_seconds,
+    validate_video_size_in_bytes,
+)
+from .video_processing import get_duration, probe_video
+from .view_buffer import (
+    BufferedView,
+    buffer_view,
+    cancel_view_cooldown,
+    start_view_cooldown,
+)
 
 
 PROFILE_QUERYSET_FACTORY = import_string(settings.PROFILE_QUERYSET_FACTORY)
@@ -195,6 +240,8 @@ class UploadViewSet(ModelViewSet):
 
     @transaction.atomic()
     def create(self, request: Request, *args, **kwargs):
+        # hash the file as it streams in, the handlers must be set before the body is parsed
+        request.upload_handlers = get_hashing_upload_handlers(request)
         serializer = CreateUploadSerializer(
             data=request.data, context={"profile_id": self.request.user.profile.id}
         )
@@ -206,50 +253,282 @@ class UploadViewSet(ModelViewSet):
         serializer = UploadSerializer(upload, context={"request": self.request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(
+        detail=True,
+        methods=["GET"],
+        url_path="status",
+        authentication_classes=[JWTStatelessUserAuthentication],
+    )
+    def upload_status(self, request: Request, pk=None):
+        """
+        Returns the stage of processing the upload and the percentage of the stage completed.
+        Unlike retrieving the upload, only the progress reported by the tasks is read,
+        without touching the database, so clients can poll it cheaply.
+        """
+
+        progress = get_upload_progress(int(pk)) if pk.isdigit() else None
+        if progress is None or progress["user_id"] != request.user.id:
+            raise NotFound()
+
+        return Response(
+            {
+                "stage": progress["stage"],
+                "percent": progress["percent"],
+                "video": progress["video"],
+            }
+        )
 
-class ViewViewSet(ModelViewSet):
-    http_method_names = ["post", "options"]
-    serializer_class = CreateViewSerializer
+    @action(detail=False, methods=["POST"])
+    def presigned(self, request: Request):
+        """
+        Starts an upload sent by the client straight to S3 storage. The client PUTs parts
+        of part_size bytes to part_urls in order, then finalizes the upload with their ETags.
+        """
+
+        if not isinstance(default_storage, S3Storage):
+            return Response(
+                {"detail": "Presigned uploads are not supported by the storage."},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
 
-    @transaction.atomic()
-    def create(self, request: Request, *args, **kwargs):
-        serializer = CreateViewSerializer(
-            data=request.data,
-            context={
-                "profile_id": (
-                    request.user.profile.id if request.user.is_authenticated else None
+        serializer = CreatePresignedUploadSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        presigned_upload: PresignedUpload = serializer.save()
+
+        serializer = PresignedUploadSerializer(presigned_upload)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path=r"presigned/(?P<presigned_upload_id>\d+)/finalize",
+    )
+    def finalize_presigned(self, request: Request, presigned_upload_id=None):
+        serializer = FinalizePresignedUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            presigned_upload: PresignedUpload = get_object_or_404(
+                PresignedUpload.objects.select_for_update().filter(
+                    profile_id=request.user.profile.id
                 ),
-                "session_id": self.request.session["id"],
-            },
+                pk=presigned_upload_id,
+            )
+
+            if presigned_upload.upload_id is not None:
+                serializer = UploadSerializer(
+                    presigned_upload.upload, context={"request": self.request}
+                )
+                return Response(serializer.data)
+
+            name = presigned_upload.name
+
+            try:
+                size = complete_multipart_upload(
+                    name,
+                    presigned_upload.multipart_upload_id,
+                    serializer.validated_data["etags"],
+                    default_storage,
+                )
+            except ClientError as error:
+                raise ValidationError({"etags": [error.response["Error"]["Message"]]})
+
+            try:
+                validate_video_size_in_bytes(size)
+                probe = probe_video(get_storage_file_location(name))
+                validate_video_duration_in_seconds(get_duration(probe))
+            except ffmpeg.Error:
+                default_storage.delete(name)
+                raise ValidationError({"file": ["File is not a valid video."]})
+            except DjangoValidationError as error:
+                default_storage.delete(name)
+                raise ValidationError({"file": error.messages})
+
+            upload = Upload.objects.create(
+                profile_id=presigned_upload.profile_id,
+                file=name,
+                filename=presigned_upload.filename,
+                probe=probe,
+            )
+            presigned_upload.upload = upload
+            presigned_upload.save()
+
+            handle_upload.delay_on_commit(upload.id, presigned_upload.profile_id)
+
+        serializer = UploadSerializer(upload, context={"request": self.request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
+    """
+    Resumable upload: create a session with the filename and size of the video,
+    PUT consecutive chunks to its chunks endpoint with a Content-Range header,
+    then finalize it to create the upload. Retrieving the session returns the offset to resume from,
+    and once finalized its upload or errors.
+    """
+
+    http_method_names = ["get", "post", "put", "head", "options"]
+    permission_classes = [IsAuthenticated]
+    serializer_class = UploadSessionSerializer
+
+    def get_serializer_context(self):
+        return {"request": self.request, "profile_id": self.request.user.profile.id}
+
+    def get_queryset(self):
+        profile = self.request.user.profile
+        return UploadSession.objects.filter(profile_id=profile.id)
+
+    def create(self, request: Request, *args, **kwargs):
+        serializer = CreateUploadSessionSerializer(
+            data=request.data, context=self.get_serializer_context()
         )
         serializer.is_valid(raise_exception=True)
+        session: UploadSession = serializer.save()
+
+        serializer = UploadSessionSerializer(session)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["PUT"], parser_classes=[UploadChunkParser])
+    def chunks(self, request: Request, pk=None):
+        data: bytes = request.data
+        start, end, size = parse_content_range(request.headers.get("Content-Range"))
+
+        if end - start + 1 != len(data):
+            raise ParseError("Content-Range does not match the length of the chunk")
+
+        session: UploadSession = get_object_or_404(self.get_queryset(), pk=pk)
+        conflict = check_chunk_range(session, start, end, size)
+        if conflict is not None:
+            return conflict
+
+        # the chunk is saved before locking the session, which is locked only to advance the offset
+        name = get_upload_session_chunk_name(session.id, start)
+        # a previous attempt might have saved the chunk without committing the offset
+        default_storage.delete(name)
+        saved_name = default_storage.save(name, ContentFile(data))
+
+        with transaction.atomic():
+            session = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+
+            conflict = check_chunk_range(session, start, end, size)
+            if saved_name != name:
+                # a concurrent request saved the same chunk meanwhile
+                default_storage.delete(saved_name)
+                conflict = conflict or Response(
+                    {"offset": session.offset}, status=status.HTTP_409_CONFLICT
+                )
+            if conflict is not None:
+                return conflict
+
+            session.offset = end + 1
+            session.save()
+
+        serializer = UploadSessionSerializer(session)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=["POST"])
+    def finalize(self, request: Request, pk=None):
+        """
+        Starts assembling the chunks into the file of the upload in assemble_upload_session,
+        as copying and probing the file would hold the web worker. Responds with the session,
+        which is retrieved until its upload or errors are set.
+        """
+
+        with transaction.atomic():
+            session: UploadSession = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=pk
+            )
 
-        video_id = serializer.validated_data["video"]
+            if session.upload_id is not None:
+                serializer = UploadSerializer(
+                    session.upload, context={"request": self.request}
+                )
+                return Response(serializer.data)
 
-        if not has_viewed_video(
-            request, video_id, timedelta(seconds=VIEW_COUNT_COOLDOWN_SECONDS)
-        ):
-            serializer.save()
+            if session.errors is not None:
+                raise ValidationError(session.errors)
 
-        view_created.send(self, request=request)
+            if session.offset != session.size:
+                return Response(
+                    {"offset": session.offset}, status=status.HTTP_409_CONFLICT
+                )
 
-        return Response(status=status.HTTP_200_OK)
+            if not session.is_finalizing:
+                session.is_finalizing = True
+                session.save()
 
+                assemble_upload_session.delay_on_commit(session.id)
 
-def has_viewed_video(request: Request, video_id: int, period: timedelta) -> bool:
-    """Check if the sender of the request has viewed a video over a given period of time."""
+        serializer = UploadSessionSerializer(session)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-    views = View.objects.filter(
-        video_id=video_id,
-        creation_date__range=(timezone.now() - period, timezone.now()),
-    )
 
-    user = request.user
-    if user.is_authenticated:
-        return views.filter(profile_id=user.profile.id).exists()
+def check_chunk_range(
+    session: UploadSession, start: int, end: int, size: int
+) -> Response | None:
+    """Raises if the chunk doesn't fit the session, returns the 409 response if it isn't the next chunk."""
 
-    session_id = request._request.session["id"]
-    return views.filter(session_id=session_id).exists()
+    if session.upload_id is not None or session.is_finalizing:
+        raise ValidationError("Upload session is already finalized")
+    if size != session.size or end >= session.size:
+        raise ParseError("Content-Range does not match the size of the upload")
+    if start != session.offset:
+        return Response({"offset": session.offset}, status=status.HTTP_409_CONFLICT)
+
+    return None
+
+
+def parse_content_range(header: str | None) -> tuple[int, int, int]:
+    """Parses Content-Range header of the form "bytes start-end/size"."""
+
+    match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+)", (header or "").strip())
+    if match is None:
+        raise ParseError(
+            'Content-Range header must be of the form "bytes start-end/size"'
+        )
+
+    start, end, size = (int(value) for value in match.groups())
+    if start > end:
+        raise ParseError("Content-Range start cannot be greater than its end")
+
+    return start, end, size
+
+
+class ViewViewSet(ModelViewSet):
+    http_method_names = ["post", "options"]
+    serializer_class = CreateViewSerializer
+
+    def create(self, request: Request, *args, **kwargs):
+        profile_id = request.user.profile.id if request.user.is_authenticated else None
+        session_id = self.request.session["id"]
+
+        serializer = CreateViewSerializer(
+            data=request.data,
+            context={"profile_id": profile_id, "session_id": session_id},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        video = serializer.validated_data["video"]
+        is_counted = start_view_cooldown(video.id, profile_id, session_id)
+
+        try:
+            if settings.VIEW_WRITE_BEHIND:
+                buffer_view(BufferedView(video.id, profile_id, session_id, is_counted))
+            else:
+                with transaction.atomic():
+                    if is_counted:
+                        serializer.save()
+
+                    view_created.send(self, request=request)
+        except Exception:
+            # otherwise the next views would be dropped for a view that was never stored
+            if is_counted:
+                cancel_view_cooldown(video.id, profile_id, session_id)
+            raise
+
+        return Response(status=status.HTTP_200_OK)
 
 
 class HistoryViewSet(GenericViewSet):